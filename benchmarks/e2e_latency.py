@@ -0,0 +1,274 @@
+"""
+End-to-end latency benchmark of /create-new-game and /next-turn.
+
+Boots main.app with uvicorn against benchmarks.fake_openai_server, plays full
+games concurrently and writes per-endpoint latency percentiles, throughput
+and server RSS as JSON. With --baseline the run fails when p95 latency or
+throughput regress by more than --max-regression.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+from typing import Optional
+
+import httpx
+import numpy as np
+
+ROOT_DIR = Path(__file__).parent.parent
+API_KEY = "benchmark-api-key"
+CREATE_NEW_GAME = "/create-new-game"
+NEXT_TURN = "/next-turn"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n-games", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument(
+        "--latency-distribution",
+        choices=("constant", "normal", "lognormal"),
+        default="lognormal",
+    )
+    parser.add_argument("--latency-mean-ms", type=float, default=400)
+    parser.add_argument("--latency-jitter-ms", type=float, default=150)
+    parser.add_argument("--output", type=Path, default=Path("bench.json"))
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    fake_port, app_port = _free_port(), _free_port()
+    fake_server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.fake_openai_server",
+            "--port",
+            str(fake_port),
+            "--latency-distribution",
+            args.latency_distribution,
+            "--latency-mean-ms",
+            str(args.latency_mean_ms),
+            "--latency-jitter-ms",
+            str(args.latency_jitter_ms),
+        ],
+        cwd=ROOT_DIR,
+    )
+    app_server: Optional[subprocess.Popen] = None
+    try:
+        _wait_until_listening(fake_port)
+        fake_url = f"http://127.0.0.1:{fake_port}"
+        app_server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "main:app",
+                "--port",
+                str(app_port),
+                "--log-level",
+                "warning",
+            ],
+            cwd=ROOT_DIR,
+            env={
+                **os.environ,
+                "X_API_KEY": API_KEY,
+                "OPENAI_API_KEY": "sk-benchmark",
+                "OPENAI_BASE_URL": f"{fake_url}/v1",
+                "VERCEL_BLOB_URL": fake_url,
+            },
+        )
+        _wait_until_listening(app_port)
+        results = asyncio.run(
+            _run_benchmark(
+                f"http://127.0.0.1:{app_port}",
+                app_server.pid,
+                args.n_games,
+                args.concurrency,
+            )
+        )
+    finally:
+        for process in (app_server, fake_server):
+            if process is not None:
+                process.terminate()
+                process.wait()
+    results["config"] = {key: str(value) for key, value in vars(args).items()}
+    args.output.write_text(json.dumps(results, indent=2))
+    print(json.dumps(results, indent=2))
+    if args.baseline is not None:
+        regressions = compare(
+            json.loads(args.baseline.read_text()),
+            results,
+            args.max_regression,
+        )
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+def compare(
+    baseline: dict[str, Any], results: dict[str, Any], max_regression: float
+) -> list[str]:
+    regressions = []
+    for endpoint, stats in results["endpoints"].items():
+        baseline_stats = baseline["endpoints"].get(endpoint)
+        if baseline_stats is None:
+            continue
+        if stats["p95_ms"] > baseline_stats["p95_ms"] * (1 + max_regression):
+            regressions.append(
+                f"{endpoint} p95 {stats['p95_ms']:.1f} ms >"
+                f" baseline {baseline_stats['p95_ms']:.1f} ms"
+            )
+        if stats["throughput_rps"] < baseline_stats["throughput_rps"] * (
+            1 - max_regression
+        ):
+            regressions.append(
+                f"{endpoint} throughput {stats['throughput_rps']:.1f} rps <"
+                f" baseline {baseline_stats['throughput_rps']:.1f} rps"
+            )
+    return regressions
+
+
+async def _run_benchmark(
+    base_url: str, server_pid: int, n_games: int, concurrency: int
+) -> dict[str, Any]:
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    rss_samples: list[int] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    sampler = asyncio.create_task(_sample_rss(server_pid, rss_samples))
+    start = time.perf_counter()
+    async with httpx.AsyncClient(
+        base_url=base_url, headers={"X_API_KEY": API_KEY}, timeout=120
+    ) as client:
+
+        async def play_game(game_index: int) -> None:
+            async with semaphore:
+                await _play_game(client, game_index, latencies, errors)
+
+        await asyncio.gather(*map(play_game, range(n_games)))
+    wall_time = time.perf_counter() - start
+    sampler.cancel()
+    return {
+        "wall_time_s": wall_time,
+        "n_games": n_games,
+        "concurrency": concurrency,
+        "endpoints": {
+            endpoint: {
+                "n_requests": len(endpoint_latencies),
+                "n_errors": errors[endpoint],
+                "p50_ms": float(np.percentile(endpoint_latencies, 50)),
+                "p95_ms": float(np.percentile(endpoint_latencies, 95)),
+                "p99_ms": float(np.percentile(endpoint_latencies, 99)),
+                "mean_ms": float(np.mean(endpoint_latencies)),
+                "throughput_rps": len(endpoint_latencies) / wall_time,
+            }
+            for endpoint, endpoint_latencies in latencies.items()
+        },
+        "rss_bytes": {
+            "max": max(rss_samples, default=0),
+            "final": rss_samples[-1] if rss_samples else 0,
+            "samples": rss_samples,
+        },
+    }
+
+
+async def _play_game(
+    client: httpx.AsyncClient,
+    game_index: int,
+    latencies: dict[str, list[float]],
+    errors: dict[str, int],
+) -> None:
+    state = await _timed_post(
+        client,
+        CREATE_NEW_GAME,
+        {
+            "gender": random.choice(("male", "female")),
+            "goal": "Benchmark",
+            "name": f"Player {game_index}",
+        },
+        latencies,
+        errors,
+    )
+    while state is not None and not state["is_game_finished"]:
+        state = await _timed_post(
+            client,
+            NEXT_TURN,
+            {
+                "state_id": state["id"],
+                "chosen_action_references": _choose_references(state),
+            },
+            latencies,
+            errors,
+        )
+
+
+async def _timed_post(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    body: dict[str, Any],
+    latencies: dict[str, list[float]],
+    errors: dict[str, int],
+) -> Optional[dict[str, Any]]:
+    start = time.perf_counter()
+    response = await client.post(endpoint, json=body)
+    latencies[endpoint].append((time.perf_counter() - start) * 1000)
+    if response.status_code not in (200, 201):
+        errors[endpoint] += 1
+        return None
+    return response.json()
+
+
+def _choose_references(state: dict[str, Any]) -> list:
+    big_action = random.choice(state["big_actions"])
+    small_actions = random.sample(state["small_actions"], random.randint(0, 2))
+    return [
+        random.choice(state["random_event"]["reactions"])["id"],
+        big_action["name"],
+        *(a["name"] for a in small_actions),
+    ]
+
+
+async def _sample_rss(pid: int, rss_samples: list[int]) -> None:
+    status_path = Path(f"/proc/{pid}/status")
+    while True:
+        try:
+            rss_kib = next(
+                int(line.split()[1])
+                for line in status_path.read_text().splitlines()
+                if line.startswith("VmRSS:")
+            )
+        except (OSError, StopIteration):
+            return
+        rss_samples.append(rss_kib * 1024)
+        await asyncio.sleep(0.5)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_listening(port: int, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise TimeoutError(f"Nothing is listening on port {port}")
+
+
+if __name__ == "__main__":
+    main()
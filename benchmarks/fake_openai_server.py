@@ -0,0 +1,151 @@
+"""
+Local stand-in for the OpenAI chat completions API and Vercel Blob.
+
+Answers with configurable latency so that the game server can be benchmarked
+without network access or spend. Catalog sheets are served from resources/.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi import HTTPException
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from pydantic import NonNegativeFloat
+
+RESOURCES_DIR = Path(__file__).parent.parent / "resources"
+
+_NARRATIVE = " ".join(
+    12 * ["Minęło pięć lat pełnych decyzji, które ukształtowały Twoje życie."]
+)
+_ACTION_NAME_PATTERN = re.compile(r'"name": "([^"]+)"')
+
+
+class LatencyDistribution(str, Enum):
+    CONSTANT = "constant"
+    NORMAL = "normal"
+    LOGNORMAL = "lognormal"
+
+
+class LatencyConfig(BaseModel):
+    distribution: LatencyDistribution = LatencyDistribution.LOGNORMAL
+    mean_ms: NonNegativeFloat = 400
+    jitter_ms: NonNegativeFloat = 150
+
+    def sample_seconds(self) -> float:
+        if self.distribution == LatencyDistribution.CONSTANT:
+            latency_ms = self.mean_ms
+        elif self.distribution == LatencyDistribution.NORMAL:
+            latency_ms = random.gauss(self.mean_ms, self.jitter_ms)
+        elif self.mean_ms == 0:
+            latency_ms = 0
+        else:
+            sigma2 = math.log(1 + (self.jitter_ms / self.mean_ms) ** 2)
+            latency_ms = random.lognormvariate(
+                math.log(self.mean_ms) - sigma2 / 2, math.sqrt(sigma2)
+            )
+        return max(latency_ms, 0) / 1000
+
+
+def create_fake_openai_app(latency: LatencyConfig) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency.sample_seconds())
+        prompt = "\n".join(
+            str(message.get("content", "")) for message in body["messages"]
+        )
+        message: dict[str, Any] = {"role": "assistant", "content": None}
+        if body.get("tools"):
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{uuid.uuid4().hex}",
+                    "type": "function",
+                    "function": {
+                        "name": body["tools"][0]["function"]["name"],
+                        "arguments": json.dumps(_structured_output(prompt)),
+                    },
+                }
+            ]
+        elif body.get("response_format", {}).get("type") == "json_schema":
+            message["content"] = json.dumps(_structured_output(prompt))
+        else:
+            message["content"] = _NARRATIVE
+        completion_text = message["content"] or json.dumps(
+            message.get("tool_calls")
+        )
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(completion_text) // 4
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [
+                {"index": 0, "message": message, "finish_reason": "stop"}
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.get("/{filename:path}")
+    async def download_blob(filename: str):
+        path = RESOURCES_DIR / filename.lstrip("/")
+        if path.parent != RESOURCES_DIR or not path.is_file():
+            raise HTTPException(status_code=404, detail=filename)
+        return PlainTextResponse(path.read_text())
+
+    return app
+
+
+def _structured_output(prompt: str) -> dict[str, Any]:
+    action_names = _ACTION_NAME_PATTERN.findall(prompt)
+    return {
+        "actions_with_weights": [
+            {"action_name": name, "action_weight": random.randint(1, 10)}
+            for name in random.sample(action_names, min(10, len(action_names)))
+        ]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument(
+        "--latency-distribution",
+        type=LatencyDistribution,
+        default=LatencyDistribution.LOGNORMAL,
+    )
+    parser.add_argument("--latency-mean-ms", type=float, default=400)
+    parser.add_argument("--latency-jitter-ms", type=float, default=150)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_fake_openai_app(
+            LatencyConfig(
+                distribution=args.latency_distribution,
+                mean_ms=args.latency_mean_ms,
+                jitter_ms=args.latency_jitter_ms,
+            )
+        ),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
@@ -0,0 +1,210 @@
+"""
+Micro-benchmarks of the action selection, state update and response
+compression hot paths.
+
+The LLM weighter is replaced with uniform_weighter and catalogs are parsed
+from the sheets in resources/, so only local work is measured. Run with
+pytest-benchmark, e.g. through `make micro_benchmark`, which fails when the
+mean time regresses against the last saved run by more than
+BENCHMARK_MAX_REGRESSION. Compression benchmarks also save the
+compressed and uncompressed sizes of the state in extra_info.
+"""
+
+import asyncio
+import random
+import uuid
+from pathlib import Path
+
+import pytest
+from runthroughlinehackathor.action_selection import action_list as actions
+from runthroughlinehackathor.action_selection import (
+    random_events_list as events,
+)
+from runthroughlinehackathor.action_selection.action_list import action_list
+from runthroughlinehackathor.action_selection.random_events_list import (
+    random_events,
+)
+from runthroughlinehackathor.action_selection.select_actions import (
+    _can_add_action,
+)
+from runthroughlinehackathor.action_selection.select_actions import (
+    get_valid_actions,
+)
+from runthroughlinehackathor.action_selection.select_actions import (
+    sample_actions,
+)
+from runthroughlinehackathor.action_selection.select_actions import (
+    select_actions,
+)
+from runthroughlinehackathor.action_selection.select_actions import (
+    uniform_weighter,
+)
+from runthroughlinehackathor.action_selection.select_random_event import (
+    select_random_event,
+)
+from runthroughlinehackathor.compression.codecs import compress
+from runthroughlinehackathor.compression.codecs import encodings
+from runthroughlinehackathor.models.gender import Gender
+from runthroughlinehackathor.models.parameters import Parameters
+from runthroughlinehackathor.models.stage import Stage
+from runthroughlinehackathor.models.state import State
+from runthroughlinehackathor.state_update.apply_action import apply_action
+from runthroughlinehackathor.state_update.state_increment import StateIncrement
+from starlette.responses import JSONResponse
+
+GAME_TURNS = (1, 10, 100, 500)
+RESOURCES_DIR = Path(__file__).parent.parent / "resources"
+
+
+@pytest.fixture(scope="module")
+def event_loop_runner():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+def _build_state(game_turns: int) -> State:
+    rng = random.Random(game_turns)
+    repeatable_actions = [a for a in action_list if not a.is_unique]
+    history = []
+    for game_turn in range(game_turns):
+        random_event = random_events[game_turn % len(random_events)]
+        if game_turn < len(random_events) - 1:
+            history.append(random_event)
+        history += [
+            rng.choice(random_event.reactions),
+            *rng.sample(repeatable_actions, 3),
+        ]
+    return State(
+        id=uuid.uuid4(),
+        parameters=Parameters(career=50, relations=50, health=50, money=50),
+        history=history,
+        turn_descriptions=[2000 * "x"] * (game_turns + 1),
+        current_stage=Stage.THIRD,
+        game_turn=game_turns,
+        gender=Gender.MALE,
+        name="Benchmark",
+        goal="Benchmark",
+        big_actions=list(action_list[:3]),
+        small_actions=list(action_list[3:8]),
+        random_event=random_events[0],
+    )
+
+
+@pytest.mark.parametrize("game_turns", GAME_TURNS)
+def test_get_valid_actions(benchmark, game_turns):
+    history = _build_state(game_turns).history
+    benchmark(get_valid_actions, history, Stage.SECOND)
+
+
+def test_sample_actions(benchmark):
+    valid_actions = get_valid_actions([], Stage.FIRST)
+    benchmark(sample_actions, valid_actions, {})
+
+
+def test_can_add_action(benchmark):
+    chosen_actions = sample_actions(action_list, {})[:-1]
+    action = next(a for a in action_list if a not in chosen_actions)
+    benchmark(_can_add_action, action, chosen_actions)
+
+
+@pytest.mark.parametrize("game_turns", GAME_TURNS)
+def test_select_actions(benchmark, event_loop_runner, game_turns):
+    state = _build_state(game_turns)
+    benchmark(
+        lambda: event_loop_runner(
+            select_actions(
+                state.history,
+                Stage.FIRST,
+                state.parameters,
+                weighter=uniform_weighter,
+            )
+        )
+    )
+
+
+@pytest.mark.parametrize("game_turns", GAME_TURNS)
+def test_select_random_event(benchmark, event_loop_runner, game_turns):
+    history = _build_state(game_turns).history
+    benchmark(lambda: event_loop_runner(select_random_event(history)))
+
+
+def test_chosen_actions(benchmark):
+    random_event = random_events[0]
+    state_increment = StateIncrement(
+        state_id=uuid.uuid4(),
+        chosen_action_references=[
+            random_event.reactions[0].id,
+            *(a.name for a in action_list[:4]),
+        ],
+    )
+    benchmark(lambda: state_increment.chosen_actions)
+
+
+def test_state_increment_parsing(benchmark):
+    body = {
+        "state_id": str(uuid.uuid4()),
+        "chosen_action_references": [
+            random_events[0].reactions[0].id,
+            *(a.name for a in action_list[:4]),
+        ],
+    }
+    benchmark(StateIncrement.model_validate, body)
+
+
+def test_apply_action(benchmark):
+    state = _build_state(1)
+    action = action_list[0]
+
+    def apply_and_rewind():
+        apply_action(state, action)
+        state.history.pop()
+
+    benchmark(apply_and_rewind)
+
+
+def test_parameters_add(benchmark):
+    parameters = Parameters(career=50, relations=50, health=50, money=50)
+    benchmark(parameters.__add__, action_list[0].parameter_change)
+
+
+@pytest.mark.parametrize("game_turns", GAME_TURNS)
+def test_state_model_dump(benchmark, game_turns):
+    state = _build_state(game_turns)
+    benchmark(state.model_dump, mode="json")
+
+
+@pytest.mark.parametrize("encoding", encodings)
+@pytest.mark.parametrize("game_turns", GAME_TURNS)
+def test_compress_state(benchmark, game_turns, encoding):
+    body = JSONResponse(_build_state(game_turns).model_dump(mode="json")).body
+    compressed_body = benchmark(compress, body, encoding)
+    benchmark.extra_info["uncompressed_bytes"] = len(body)
+    benchmark.extra_info["compressed_bytes"] = len(compressed_body)
+
+
+@pytest.mark.parametrize("game_turns", GAME_TURNS)
+def test_state_deep_copy(benchmark, game_turns):
+    state = _build_state(game_turns)
+    benchmark(state.model_copy, deep=True)
+
+
+def test_catalog_load(benchmark, monkeypatch):
+    # Parse the local copies of the sheets, so no round downloads them
+    for module in (actions, events):
+        monkeypatch.setattr(
+            module, "download_from_vercel_blob", _read_local_sheet
+        )
+
+    def reload_catalog():
+        actions.load_action_list.cache_clear()
+        events.load_reactions.cache_clear()
+        events.load_random_events.cache_clear()
+        actions.load_action_list()
+        events.load_random_events()
+
+    benchmark.pedantic(reload_catalog, rounds=5, iterations=1)
+
+
+def _read_local_sheet(filename: str) -> str:
+    return (RESOURCES_DIR / filename).read_text()
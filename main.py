@@ -3,36 +3,110 @@ import logging
 import os
 import traceback
 import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any
+from typing import Optional
 
-import uvicorn
 from fastapi import Depends
 from fastapi import FastAPI
 from fastapi import HTTPException
+from fastapi import Query
+from fastapi import Request
+from fastapi import status
+from fastapi import WebSocket
 from fastapi.responses import JSONResponse
 from fastapi.responses import Response
 from fastapi.security import APIKeyHeader
 from pydantic import BaseModel
+from pydantic import Field
+from pydantic import ValidationError
 from runthroughlinehackathor.action_selection.select_actions import (
     select_actions,
 )
 from runthroughlinehackathor.action_selection.select_random_event import (
     select_random_event,
 )
+from runthroughlinehackathor.catalog.catalog import load_catalog
+from runthroughlinehackathor.catalog.compact_state import compact_state
+from runthroughlinehackathor.compression.codecs import compress_immutable
+from runthroughlinehackathor.compression.codecs import negotiate_encoding
+from runthroughlinehackathor.compression.compression_middleware import (
+    CompressionMiddleware,
+)
+from runthroughlinehackathor.game_session.game_session import GameSession
+from runthroughlinehackathor.llm.llm_admission import llm_admission
+from runthroughlinehackathor.llm.llm_usage import game_llm_usage
+from runthroughlinehackathor.llm.llm_usage import GameLlmUsage
 from runthroughlinehackathor.models.gender import Gender
 from runthroughlinehackathor.models.parameters import Parameters
 from runthroughlinehackathor.models.stage import Stage
 from runthroughlinehackathor.models.state import State
+from runthroughlinehackathor.monitoring.memory_accounting import (
+    MemorySampler,
+)
+from runthroughlinehackathor.monitoring.metrics import registry
+from runthroughlinehackathor.monitoring.profiling import request_profiler
+from runthroughlinehackathor.monitoring.timing import format_server_timing
+from runthroughlinehackathor.monitoring.timing import start_request_timing
+from runthroughlinehackathor.monitoring.timing import timed
+from runthroughlinehackathor.run_server import run_server
 from runthroughlinehackathor.settings import settings
+from runthroughlinehackathor.state_update.narrative_worker_pool import (
+    narrative_worker_pool,
+)
+from runthroughlinehackathor.state_update.narrative_worker_pool import (
+    NarrativeStatus,
+)
 from runthroughlinehackathor.state_update.state_increment import StateIncrement
+from runthroughlinehackathor.state_update.update_state import previous_states
 from runthroughlinehackathor.state_update.update_state import update_state
+from runthroughlinehackathor.warm_up import warm_up
 from starlette.responses import PlainTextResponse
 from starlette.responses import RedirectResponse
 
 _logger = logging.getLogger(__name__)
-app = FastAPI()
 
 
-states: list[State] = []
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.warm_up = asyncio.create_task(_warm_up())
+    if settings.warm_up_before_serving:
+        await app.state.warm_up
+    memory_sampler.start()
+    yield
+    await _drain()
+    await memory_sampler.stop()
+    await narrative_worker_pool.stop()
+
+
+async def _warm_up() -> None:
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception:
+        _logger.exception("Warm-up failed")
+        raise
+
+
+async def _drain() -> None:
+    try:
+        async with asyncio.timeout(settings.shutdown_drain_seconds):
+            await narrative_worker_pool.drain()
+            await llm_admission.drain()
+    except TimeoutError:
+        _logger.warning("Shutting down with LLM calls still in flight")
+    _logger.info("Shutting down with %d games in memory", len(states))
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(
+    CompressionMiddleware, minimum_size=settings.compression_minimum_size
+)
+
+
+states: dict[uuid.UUID, State] = {}
+_PROFILED_PATHS = frozenset(("/create-new-game", "/next-turn"))
+memory_sampler = MemorySampler(states.values(), previous_states)
 
 
 class _CreateNewGameInput(BaseModel):
@@ -41,11 +115,62 @@ class _CreateNewGameInput(BaseModel):
     name: str
 
 
+class _NextTurnBatchInput(BaseModel):
+    # Validated one by one, so a bad item fails only its own position
+    state_increments: list[dict[str, Any]] = Field(
+        max_length=settings.max_turn_batch_size
+    )
+
+
+if settings.timing_enabled:
+
+    @app.middleware("http")
+    async def add_server_timing(request: Request, call_next):
+        phase_durations = start_request_timing()
+        response = await call_next(request)
+        if phase_durations:
+            response.headers["Server-Timing"] = format_server_timing(
+                phase_durations
+            )
+        return response
+
+
+if settings.profiling_enabled or settings.profiling_admin_key is not None:
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if request.url.path not in _PROFILED_PATHS or not (
+            request_profiler.should_profile(request.headers.get("X_PROFILE"))
+        ):
+            return await call_next(request)
+        async with request_profiler.profile(request.url.path.strip("/")):
+            return await call_next(request)
+
+
 @app.get("/ping")
 async def ping():
     return Response("pong")
 
 
+@app.get("/ready")
+async def ready(request: Request):
+    warm_up_task: Optional[asyncio.Task] = getattr(
+        request.app.state, "warm_up", None
+    )
+    if warm_up_task is None or not warm_up_task.done():
+        return PlainTextResponse("warming up", status_code=503)
+    if warm_up_task.cancelled() or warm_up_task.exception() is not None:
+        return PlainTextResponse("warm-up failed", status_code=503)
+    return Response("ready")
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 X_API_KEY = APIKeyHeader(name="X_API_KEY")
 
 
@@ -57,9 +182,45 @@ def api_key_auth(x_api_key: str = Depends(X_API_KEY)):
         )
 
 
-@app.post("/create-new-game", dependencies=[Depends(api_key_auth)])
-async def create_new_game(create_new_game_input: _CreateNewGameInput):
+async def warm_up_check(request: Request):
+    # Early requests wait rather than download the catalogs on the loop
+    if not await _wait_for_warm_up(request.app):
+        raise HTTPException(status_code=503, detail="Warm-up failed")
+
+
+async def _wait_for_warm_up(app: FastAPI) -> bool:
+    warm_up_task: Optional[asyncio.Task] = getattr(app.state, "warm_up", None)
+    if warm_up_task is None:
+        return True
+    try:
+        await asyncio.shield(warm_up_task)
+    except Exception:
+        return False
+    return True
+
+
+def llm_admission_check():
+    if llm_admission.is_saturated():
+        raise HTTPException(
+            status_code=503,
+            detail="Too many games are waiting for the LLM",
+            headers={"Retry-After": str(llm_admission.retry_after_seconds())},
+        )
+
+
+@app.post(
+    "/create-new-game",
+    dependencies=[
+        Depends(api_key_auth),
+        Depends(warm_up_check),
+        Depends(llm_admission_check),
+    ],
+)
+async def create_new_game(
+    create_new_game_input: _CreateNewGameInput, compact: bool = False
+):
     try:
+        state_id = uuid.uuid4()
         history = []
         current_stage = Stage.FIRST
         parameters = Parameters(
@@ -73,11 +234,14 @@ async def create_new_game(create_new_game_input: _CreateNewGameInput):
                 history=history,
                 current_stage=current_stage,
                 parameters=parameters,
+                state_id=state_id,
+            ),
+            select_random_event(
+                history, current_stage=current_stage, state_id=state_id
             ),
-            select_random_event(history),
         )
         new_state = State(
-            id=uuid.uuid4(),
+            id=state_id,
             parameters=parameters,
             history=[random_event],
             turn_descriptions=[
@@ -102,39 +266,288 @@ async def create_new_game(create_new_game_input: _CreateNewGameInput):
             ),
             random_event=random_event,
         )
-        states.append(new_state)
-        return JSONResponse(
-            content=new_state.model_dump(mode="json"), status_code=201
-        )
+        states[new_state.id] = new_state
+        with timed("serialization"):
+            return JSONResponse(
+                content=_serialize_state(new_state, compact),
+                status_code=201,
+            )
     except Exception:
         _logger.error(traceback.format_exc())
         return PlainTextResponse(traceback.format_exc(), status_code=500)
 
 
-@app.post("/next-turn", dependencies=[Depends(api_key_auth)])
-async def get_next_state(state_update: StateIncrement):
+@app.post(
+    "/next-turn",
+    dependencies=[
+        Depends(api_key_auth),
+        Depends(warm_up_check),
+        Depends(llm_admission_check),
+    ],
+)
+async def get_next_state(
+    state_update: StateIncrement,
+    defer_narrative: bool = Query(settings.deferred_narrative),
+    compact: bool = False,
+):
     try:
-        state = next(
-            (s for s in states if s.id == state_update.state_id), None
-        )
+        state = _find_state(state_update.state_id)
         if state is None:
             return HTTPException(
                 detail=f"No state with id={state_update.state_id}",
                 status_code=404,
             )
-        await update_state(state, state_update)
-        return JSONResponse(
-            content=state.model_dump(mode="json"), status_code=200
-        )
+        try:
+            state_update.verify_offered(state)
+        except ValueError as e:
+            raise HTTPException(detail=str(e), status_code=422)
+        await update_state(state, state_update, defer_narrative)
+        with timed("serialization"):
+            return JSONResponse(
+                content=_serialize_state(state, compact), status_code=200
+            )
+    except HTTPException:
+        raise
     except Exception:
         _logger.error(traceback.format_exc())
         return PlainTextResponse(traceback.format_exc(), status_code=500)
 
 
+@app.post(
+    "/next-turn/batch",
+    dependencies=[Depends(api_key_auth), Depends(warm_up_check)],
+)
+async def get_next_states(
+    batch_input: _NextTurnBatchInput, compact: bool = False
+):
+    items = batch_input.state_increments
+    semaphore = asyncio.Semaphore(settings.turn_batch_concurrency)
+    results: list[Optional[dict[str, Any]]] = [None] * len(items)
+    state_increments: list[Optional[StateIncrement]] = [None] * len(items)
+    state_id_to_positions: dict[uuid.UUID, list[int]] = defaultdict(list)
+    for position, item in enumerate(items):
+        try:
+            state_update = StateIncrement.model_validate(item)
+        except ValidationError as e:
+            results[position] = {
+                "state_id": item.get("state_id"),
+                "status_code": 422,
+                "state": None,
+                "detail": e.errors(include_url=False, include_context=False),
+            }
+            continue
+        state_increments[position] = state_update
+        state_id_to_positions[state_update.state_id].append(position)
+
+    async def play_game(positions: list[int]) -> None:
+        for position in positions:
+            async with semaphore:
+                results[position] = await _play_batched_turn(
+                    state_increments[position], compact
+                )
+
+    await asyncio.gather(*map(play_game, state_id_to_positions.values()))
+    return JSONResponse(content=results, status_code=200)
+
+
+async def _play_batched_turn(
+    state_update: StateIncrement, compact: bool
+) -> dict[str, Any]:
+    result = {
+        "state_id": str(state_update.state_id),
+        "status_code": 200,
+        "state": None,
+        "detail": None,
+    }
+    state = _find_state(state_update.state_id)
+    if state is None:
+        return result | {
+            "status_code": 404,
+            "detail": f"No state with id={state_update.state_id}",
+        }
+    try:
+        state_update.verify_offered(state)
+    except ValueError as e:
+        return result | {"status_code": 422, "detail": str(e)}
+    if llm_admission.is_saturated():
+        return result | {
+            "status_code": 503,
+            "detail": "Too many games are waiting for the LLM",
+        }
+    try:
+        await update_state(state, state_update, settings.deferred_narrative)
+    except Exception:
+        _logger.error(traceback.format_exc())
+        return result | {
+            "status_code": 500,
+            "detail": traceback.format_exc(),
+        }
+    with timed("serialization"):
+        return result | {"state": _serialize_state(state, compact)}
+
+
+def _find_state(state_id: uuid.UUID) -> Optional[State]:
+    return states.get(state_id)
+
+
+def _serialize_state(state: State, compact: bool) -> dict[str, Any]:
+    return compact_state(state) if compact else state.model_dump(mode="json")
+
+
+def _is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is None:
+        return False
+    etags = [e.strip().removeprefix("W/") for e in if_none_match.split(",")]
+    return "*" in etags or etag.removeprefix("W/") in etags
+
+
+def _catalog_response(request: Request, cache_control: str) -> Response:
+    catalog = load_catalog()
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+    # Every encoding is a different representation with its own strong ETag
+    etag = f'"{catalog.version}{"" if encoding is None else "-" + encoding}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if _is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    body = catalog.body
+    if encoding is not None:
+        body = compress_immutable(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get("/catalog", dependencies=[Depends(warm_up_check)])
+async def get_catalog(request: Request):
+    return _catalog_response(request, "no-cache")
+
+
+@app.get("/catalog/{version}", dependencies=[Depends(warm_up_check)])
+async def get_catalog_version(request: Request, version: str):
+    if version != load_catalog().version:
+        raise HTTPException(
+            detail=f"No catalog with version={version}", status_code=404
+        )
+    return _catalog_response(
+        request,
+        f"public, max-age={settings.catalog_max_age_seconds}, immutable",
+    )
+
+
+@app.get(
+    "/games/{state_id}",
+    dependencies=[Depends(api_key_auth), Depends(warm_up_check)],
+)
+async def get_game(
+    request: Request, state_id: uuid.UUID, compact: bool = False
+):
+    state = _find_state(state_id)
+    if state is None:
+        raise HTTPException(
+            detail=f"No state with id={state_id}", status_code=404
+        )
+    if state.is_updating:
+        # A turn is being applied, the state has no stable version yet
+        with timed("serialization"):
+            return JSONResponse(
+                content=_serialize_state(state, compact),
+                status_code=200,
+                headers={"Cache-Control": "no-store"},
+            )
+    # Weak, as the body is the same JSON whatever the content encoding
+    etag = f'W/"{state.id}-{state.version}{"-compact" if compact else ""}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    with timed("serialization"):
+        return JSONResponse(
+            content=_serialize_state(state, compact),
+            status_code=200,
+            headers=headers,
+        )
+
+
+@app.get("/games/{state_id}/llm-usage", dependencies=[Depends(api_key_auth)])
+async def get_game_llm_usage(state_id: uuid.UUID):
+    if _find_state(state_id) is None:
+        raise HTTPException(
+            detail=f"No state with id={state_id}", status_code=404
+        )
+    return JSONResponse(
+        content=game_llm_usage.get(state_id, GameLlmUsage()).model_dump(
+            mode="json"
+        ),
+        status_code=200,
+    )
+
+
+@app.get("/games/{state_id}/narrative", dependencies=[Depends(api_key_auth)])
+async def get_game_narrative(
+    state_id: uuid.UUID,
+    game_turn: Optional[int] = None,
+    wait_seconds: float = Query(
+        0, ge=0, le=settings.narrative_max_wait_seconds
+    ),
+):
+    narrative = await narrative_worker_pool.wait(
+        state_id, game_turn, wait_seconds
+    )
+    if narrative is None:
+        raise HTTPException(
+            detail=f"No deferred narrative for state id={state_id}",
+            status_code=404,
+        )
+    return JSONResponse(
+        content=narrative.model_dump(mode="json"),
+        status_code=(
+            200 if narrative.status != NarrativeStatus.PENDING else 202
+        ),
+    )
+
+
+@app.websocket("/games/{state_id}/session")
+async def play_game_session(
+    websocket: WebSocket,
+    state_id: uuid.UUID,
+    defer_narrative: bool = Query(settings.deferred_narrative),
+    compact: bool = False,
+):
+    if websocket.headers.get("X_API_KEY") != os.environ["X_API_KEY"]:
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION, reason="Invalid api key"
+        )
+        return
+    if not await _wait_for_warm_up(websocket.app):
+        await websocket.close(
+            code=status.WS_1013_TRY_AGAIN_LATER, reason="Warm-up failed"
+        )
+        return
+    state = _find_state(state_id)
+    if state is None:
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION,
+            reason=f"No state with id={state_id}",
+        )
+        return
+    await GameSession(websocket, state, defer_narrative, compact).run()
+
+
+@app.get("/diagnostics/memory", dependencies=[Depends(api_key_auth)])
+async def get_memory_report(n_largest_games: int = Query(10, ge=0)):
+    report = await memory_sampler.report(n_largest_games)
+    return JSONResponse(
+        content=report.model_dump(mode="json"), status_code=200
+    )
+
+
 @app.get("/")
 async def redirect_root_to_docs():
     return RedirectResponse("/docs")
 
 
 if __name__ == "__main__":
-    uvicorn.run(app)
+    run_server()
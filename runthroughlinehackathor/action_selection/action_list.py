@@ -1,4 +1,6 @@
 import csv
+from functools import cache
+from typing import Any
 
 from runthroughlinehackathor.action_selection._download_from_vercel_blob import (
     download_from_vercel_blob,
@@ -16,29 +18,49 @@ type_mapper = {
     "Zdrowie": ActionType.HEALTH,
     "Relacje": ActionType.RELATIONS,
 }
-action_list: tuple[Action, ...] = tuple(
-    Action(
-        name=action_name,
-        description=description,
-        image_url=image_url,
-        parameter_change=Parameters(
-            career=career or 0,
-            relations=relations or 0,
-            health=health or 0,
-            money=money or 0,
-        ),
-        allowed_stages=bool_mapper[valid_at_stage_1] * [Stage.FIRST]
-        + bool_mapper[valid_at_stage_2] * [Stage.SECOND]
-        + bool_mapper[valid_at_stage_3] * [Stage.THIRD],
-        type=type_mapper[type_.strip()],
-        time_cost=time_cost,
-        is_unique=bool_mapper[unique],
-        prerequisite_names=list(filter(None, prerequisites.split(","))),
-    )
-    for action_name, unique, valid_at_stage_1, valid_at_stage_2, valid_at_stage_3, time_cost, career, health, money, relations, type_, description, prerequisites, image_url in csv.reader(
-        download_from_vercel_blob(settings.actions_file).splitlines()[1:]
+
+
+@cache
+def load_action_list() -> tuple[Action, ...]:
+    """Download the actions on first use, so importing stays cheap."""
+    return tuple(
+        Action(
+            name=action_name,
+            description=description,
+            image_url=image_url,
+            parameter_change=Parameters(
+                career=career or 0,
+                relations=relations or 0,
+                health=health or 0,
+                money=money or 0,
+            ),
+            allowed_stages=bool_mapper[valid_at_stage_1] * [Stage.FIRST]
+            + bool_mapper[valid_at_stage_2] * [Stage.SECOND]
+            + bool_mapper[valid_at_stage_3] * [Stage.THIRD],
+            type=type_mapper[type_.strip()],
+            time_cost=time_cost,
+            is_unique=bool_mapper[unique],
+            prerequisite_names=list(filter(None, prerequisites.split(","))),
+        )
+        for action_name, unique, valid_at_stage_1, valid_at_stage_2, valid_at_stage_3, time_cost, career, health, money, relations, type_, description, prerequisites, image_url in csv.reader(
+            download_from_vercel_blob(settings.actions_file).splitlines()[1:]
+        )
     )
-)
-name_to_action: dict[str, Action] = {a.name: a for a in action_list}
+
+
+@cache
+def _load_name_to_action() -> dict[str, Action]:
+    return {a.name: a for a in load_action_list()}
+
+
+def __getattr__(name: str) -> Any:
+    # action_list and name_to_action are loaded on first access
+    if name == "action_list":
+        return load_action_list()
+    if name == "name_to_action":
+        return _load_name_to_action()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
     pass
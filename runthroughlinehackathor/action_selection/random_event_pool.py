@@ -0,0 +1,74 @@
+import random
+from collections.abc import Iterable
+from typing import Optional
+
+from runthroughlinehackathor.models.random_event import RandomEvent
+from runthroughlinehackathor.models.stage import Stage
+
+
+class RandomEventPool:
+    """
+    Per-game pool of random events that were not drawn yet.
+
+    Every stage keeps a list of catalog indices together with the position of
+    each index in that list, so drawing and discarding are O(1) swap-removes.
+    Weighted events are sampled with rejection against the catalog's maximal
+    weight, which keeps the expected cost constant for a fixed catalog.
+    """
+
+    def __init__(self, events: tuple[RandomEvent, ...]):
+        self._events = events
+        self._name_to_index = {
+            event.name: index for index, event in enumerate(events)
+        }
+        self._max_weight = max((event.weight for event in events), default=1)
+        self._remaining: dict[Stage, list[int]] = {
+            stage: [] for stage in Stage
+        }
+        self._positions: dict[Stage, dict[int, int]] = {
+            stage: {} for stage in Stage
+        }
+        self._n_remaining = 0
+        for index, event in enumerate(events):
+            self._n_remaining += bool(event.allowed_stages)
+            for stage in event.allowed_stages:
+                self._positions[stage][index] = len(self._remaining[stage])
+                self._remaining[stage].append(index)
+
+    def __len__(self) -> int:
+        return self._n_remaining
+
+    def draw(self, current_stage: Stage) -> RandomEvent:
+        remaining = self._remaining[current_stage]
+        if not remaining:
+            raise IndexError(f"No random events left for {current_stage}")
+        while True:
+            index = remaining[random.randrange(len(remaining))]
+            event = self._events[index]
+            if random.random() * self._max_weight < event.weight:
+                break
+        self._discard_index(index)
+        return event
+
+    def discard(self, events: Iterable[object]) -> None:
+        for event in events:
+            if not isinstance(event, RandomEvent):
+                continue
+            index = self._name_to_index.get(event.name)
+            if index is not None:
+                self._discard_index(index)
+
+    def _discard_index(self, index: int) -> None:
+        was_remaining = False
+        for stage in Stage:
+            positions = self._positions[stage]
+            position: Optional[int] = positions.pop(index, None)
+            if position is None:
+                continue
+            was_remaining = True
+            remaining = self._remaining[stage]
+            last_index = remaining.pop()
+            if last_index != index:
+                remaining[position] = last_index
+                positions[last_index] = position
+        self._n_remaining -= was_remaining
@@ -1,47 +1,87 @@
 import csv
+from functools import cache
+from typing import Any
 
 from runthroughlinehackathor.action_selection._download_from_vercel_blob import (
     download_from_vercel_blob,
 )
+from runthroughlinehackathor.action_selection.action_list import bool_mapper
 from runthroughlinehackathor.models.action.reaction import Reaction
 from runthroughlinehackathor.models.parameters import Parameters
 from runthroughlinehackathor.models.random_event import RandomEvent
+from runthroughlinehackathor.models.stage import Stage
 from runthroughlinehackathor.settings import settings
 
-reactions: dict[int, Reaction] = dict(
-    (
-        int(id_),
-        Reaction(
-            id=id_,
-            description=description,
-            image_url=image_url,
-            parameter_change=Parameters(
-                career=career or 0,
-                relations=relations or 0,
-                health=health or 0,
-                money=money or 0,
+
+@cache
+def load_reactions() -> dict[int, Reaction]:
+    """Download the reactions on first use, so importing stays cheap."""
+    return dict(
+        (
+            int(id_),
+            Reaction(
+                id=id_,
+                description=description,
+                image_url=image_url,
+                parameter_change=Parameters(
+                    career=career or 0,
+                    relations=relations or 0,
+                    health=health or 0,
+                    money=money or 0,
+                ),
+                result=result,
             ),
-            result=result,
-        ),
-    )
-    for id_, description, career, health, money, relations, result, image_url in csv.reader(
-        download_from_vercel_blob(settings.reactions_file).splitlines()[1:]
+        )
+        for id_, description, career, health, money, relations, result, image_url in csv.reader(
+            download_from_vercel_blob(settings.reactions_file).splitlines()[1:]
+        )
     )
-)
 
-random_events: tuple[RandomEvent, ...] = tuple(
-    RandomEvent(
+
+def _parse_random_event(
+    name: str,
+    description: str,
+    reaction_1_id: str,
+    reaction_2_id: str,
+    weight: str = "",
+    valid_at_stage_1: str = "TRUE",
+    valid_at_stage_2: str = "TRUE",
+    valid_at_stage_3: str = "TRUE",
+) -> RandomEvent:
+    return RandomEvent(
         name=name,
         description=description,
         reactions=[
-            reactions[int(reaction_1_id)],
-            reactions[int(reaction_2_id)],
+            load_reactions()[int(reaction_1_id)],
+            load_reactions()[int(reaction_2_id)],
         ],
+        weight=weight or 1,
+        allowed_stages=bool_mapper[valid_at_stage_1] * [Stage.FIRST]
+        + bool_mapper[valid_at_stage_2] * [Stage.SECOND]
+        + bool_mapper[valid_at_stage_3] * [Stage.THIRD],
     )
-    for name, description, reaction_1_id, reaction_2_id in csv.reader(
-        download_from_vercel_blob(settings.random_events_file).splitlines()[1:]
+
+
+@cache
+def load_random_events() -> tuple[RandomEvent, ...]:
+    """Download the random events on first use, with their reactions."""
+    return tuple(
+        _parse_random_event(*row)
+        for row in csv.reader(
+            download_from_vercel_blob(
+                settings.random_events_file
+            ).splitlines()[1:]
+        )
     )
-)
+
+
+def __getattr__(name: str) -> Any:
+    # random_events and reactions are loaded on first access
+    if name == "random_events":
+        return load_random_events()
+    if name == "reactions":
+        return load_reactions()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Mapping
+from functools import cached_property
+from types import MappingProxyType
+from typing import Union
+
+from runthroughlinehackathor.action_selection import action_list
+from runthroughlinehackathor.action_selection import random_events_list
+from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.models.action.reaction import Reaction
+
+ActionReference = Union[str, int]
+
+
+class ReferenceIndex:
+    """
+    Immutable lookup of action names and reaction ids built once per catalog.
+
+    The lookup is built on first use from the mappings returned by
+    load_catalog, so the catalog is not downloaded at import. Resolved
+    references are ordered with reactions first, matching the order in
+    which update_state applies them.
+    """
+
+    def __init__(
+        self,
+        load_catalog: Callable[
+            [], tuple[Mapping[str, Action], Mapping[int, Reaction]]
+        ],
+    ):
+        self._load_catalog = load_catalog
+
+    @cached_property
+    def _references(
+        self,
+    ) -> Mapping[ActionReference, Union[Action, Reaction]]:
+        name_to_action, reactions = self._load_catalog()
+        return MappingProxyType({**name_to_action, **reactions})
+
+    def load(self) -> None:
+        """Build the lookup now instead of on first use."""
+        self._references
+
+    def __contains__(self, reference: ActionReference) -> bool:
+        return reference in self._references
+
+    def resolve(
+        self, references: Iterable[ActionReference]
+    ) -> tuple[Union[Action, Reaction], ...]:
+        references = sorted(
+            references, key=lambda reference: isinstance(reference, str)
+        )
+        unknown_references = [r for r in references if r not in self]
+        if unknown_references:
+            raise ValueError(f"Unknown references {unknown_references}")
+        return tuple(map(self._references.__getitem__, references))
+
+
+reference_index = ReferenceIndex(
+    lambda: (action_list.name_to_action, random_events_list.reactions)
+)
@@ -1,40 +1,90 @@
+import logging
 import random
-from collections.abc import Iterable
+from collections.abc import Callable
+from collections.abc import Mapping
 from itertools import chain
 from itertools import cycle
 from itertools import islice
+from typing import Optional
+from uuid import UUID
 
-from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel
 from pydantic import Field
 from pydantic import PositiveInt
-from runthroughlinehackathor.action_selection.action_list import action_list
+from runthroughlinehackathor.action_selection.action_list import (
+    load_action_list,
+)
+from runthroughlinehackathor.llm.invoke_llm import invoke_structured_llm
+from runthroughlinehackathor.llm.llm_admission import LlmOverloadedError
+from runthroughlinehackathor.llm.prompt_type import PromptType
 from runthroughlinehackathor.models.action.action import Action
 from runthroughlinehackathor.models.action.action_type import ActionType
 from runthroughlinehackathor.models.parameters import Parameters
 from runthroughlinehackathor.models.stage import Stage
 from runthroughlinehackathor.models.state import HistoryElement
+from runthroughlinehackathor.monitoring.timing import timed
 from runthroughlinehackathor.settings import settings
 
+_logger = logging.getLogger(__name__)
+
+ActionWeighter = Callable[
+    [Parameters, list[HistoryElement], tuple[Action, ...]],
+    Mapping[str, PositiveInt],
+]
+
 
 async def select_actions(
-    history: list[HistoryElement], current_stage: Stage, parameters: Parameters
+    history: list[HistoryElement],
+    current_stage: Stage,
+    parameters: Parameters,
+    weighter: Optional[ActionWeighter] = None,
+    state_id: Optional[UUID] = None,
 ) -> list[Action]:
-    valid_actions = tuple(
+    with timed("action_filtering"):
+        valid_actions = get_valid_actions(history, current_stage)
+    with timed("action_weighting"):
+        if weighter is None:
+            try:
+                name_to_weight = await _weight_actions_with_llm(
+                    parameters, history, valid_actions, state_id=state_id
+                )
+            except LlmOverloadedError:
+                _logger.warning("LLM overloaded, using uniform weights")
+                name_to_weight = uniform_weighter(
+                    parameters, history, valid_actions
+                )
+        else:
+            name_to_weight = weighter(parameters, history, valid_actions)
+    with timed("action_sampling"):
+        return sample_actions(valid_actions, name_to_weight)
+
+
+def get_valid_actions(
+    history: list[HistoryElement], current_stage: Stage
+) -> tuple[Action, ...]:
+    history_names = frozenset(
+        elem.name for elem in history if isinstance(elem, Action)
+    )
+    return tuple(
         action
-        for action in action_list
-        if (not action.is_unique or action not in history)
+        for action in load_action_list()
+        if (not action.is_unique or action.name not in history_names)
         and current_stage in action.allowed_stages
-        and all(
-            prerequisite in history for prerequisite in action.prerequisites
-        )
+        and history_names.issuperset(action.prerequisite_names)
     )
-    action_stream = await _shuffle_actions_with_weight(
-        parameters, history, valid_actions
+
+
+def sample_actions(
+    valid_actions: tuple[Action, ...], name_to_weight: Mapping[str, int]
+) -> list[Action]:
+    actions_with_weights = list(
+        chain.from_iterable(
+            name_to_weight.get(a.name, 1) * (a,) for a in valid_actions
+        )
     )
+    random.shuffle(actions_with_weights)
     chosen_actions = []
-    for action in islice(action_stream, 1000):
+    for action in islice(cycle(actions_with_weights), 1000):
         if _can_add_action(action, chosen_actions):
             chosen_actions.append(action)
         if len(chosen_actions) == settings.n_actions:
@@ -42,6 +92,14 @@ async def select_actions(
     raise ValueError("Not enough actions to satisfy conditions")
 
 
+def uniform_weighter(
+    parameters: Parameters,
+    history: list[HistoryElement],
+    valid_actions: tuple[Action, ...],
+) -> Mapping[str, PositiveInt]:
+    return {}
+
+
 def _can_add_action(action: Action, chosen_actions: list[Action]) -> bool:
     if action in chosen_actions:
         return False
@@ -64,48 +122,38 @@ def _can_add_action(action: Action, chosen_actions: list[Action]) -> bool:
     return True
 
 
-async def _shuffle_actions_with_weight(
+async def _weight_actions_with_llm(
     parameters: Parameters,
     history: list[HistoryElement],
-    valid_actions: Iterable[Action],
-) -> Iterable[Action]:
-    class ActionsWithWeights(BaseModel):
-        actions_with_weights: list[_ActionWeight] = Field(
-            description="Return up to 10 actions", max_length=10
-        )
-
-    model = ChatOpenAI(
-        model="gpt-4o-mini", temperature=0, api_key=settings.openai_api_key
-    ).with_structured_output(ActionsWithWeights)
-    action_weights: list[_ActionWeight] = (
-        await model.ainvoke(
-            [
-                HumanMessage(
-                    settings.action_weight_prompt.format(
-                        parameters=parameters.model_dump_json(indent=2),
-                        history="\n".join(
-                            elem.model_dump_json(indent=2) for elem in history
-                        ),
-                        actions="\n".join(
-                            action.model_dump_json(indent=2)
-                            for action in valid_actions
-                        ),
-                    )
-                )
-            ]
+    valid_actions: tuple[Action, ...],
+    state_id: Optional[UUID] = None,
+) -> Mapping[str, PositiveInt]:
+    action_weights = (
+        await invoke_structured_llm(
+            PromptType.ACTION_WEIGHT,
+            settings.action_weight_prompt.format(
+                parameters=parameters.model_dump_json(indent=2),
+                history="\n".join(
+                    elem.model_dump_json(indent=2) for elem in history
+                ),
+                actions="\n".join(
+                    action.model_dump_json(indent=2)
+                    for action in valid_actions
+                ),
+            ),
+            ActionsWithWeights,
+            state_id=state_id,
         )
     ).actions_with_weights
-    name_to_weight = {a.action_name: a.action_weight for a in action_weights}
-    action_weight_pairs = tuple(
-        (a, name_to_weight.get(a.name, 1)) for a in valid_actions
-    )
-    actions_with_weights = list(
-        chain.from_iterable(w * (a,) for a, w in action_weight_pairs)
-    )
-    random.shuffle(actions_with_weights)
-    return cycle(actions_with_weights)
+    return {a.action_name: a.action_weight for a in action_weights}
 
 
 class _ActionWeight(BaseModel):
     action_name: str
     action_weight: PositiveInt = Field(descriprion="1 to 10", le=10)
+
+
+class ActionsWithWeights(BaseModel):
+    actions_with_weights: list[_ActionWeight] = Field(
+        description="Return up to 10 actions", max_length=10
+    )
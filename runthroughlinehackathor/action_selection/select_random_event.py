@@ -1,13 +1,36 @@
-import random
+from collections import OrderedDict
+from typing import Optional
+from uuid import UUID
 
+from runthroughlinehackathor.action_selection.random_event_pool import (
+    RandomEventPool,
+)
 from runthroughlinehackathor.action_selection.random_events_list import (
-    random_events,
+    load_random_events,
 )
 from runthroughlinehackathor.models.random_event import RandomEvent
+from runthroughlinehackathor.models.stage import Stage
 from runthroughlinehackathor.models.state import HistoryElement
+from runthroughlinehackathor.settings import settings
+
+# Least recently used games are dropped beyond random_event_pool_max_games;
+# a dropped pool is rebuilt from the game's history on its next draw
+random_event_pools: OrderedDict[UUID, RandomEventPool] = OrderedDict()
 
 
-async def select_random_event(history: list[HistoryElement]) -> RandomEvent:
-    return random.choice(
-        tuple(filter(lambda e: e not in history, random_events))
-    )
+async def select_random_event(
+    history: list[HistoryElement],
+    current_stage: Stage = Stage.FIRST,
+    state_id: Optional[UUID] = None,
+) -> RandomEvent:
+    pool = random_event_pools.get(state_id) if state_id is not None else None
+    if pool is None:
+        pool = RandomEventPool(load_random_events())
+        pool.discard(history)
+        if state_id is not None:
+            random_event_pools[state_id] = pool
+    if state_id is not None:
+        random_event_pools.move_to_end(state_id)
+        while len(random_event_pools) > settings.random_event_pool_max_games:
+            random_event_pools.popitem(last=False)
+    return pool.draw(current_stage)
@@ -0,0 +1,76 @@
+import hashlib
+from collections.abc import Iterable
+from functools import cache
+
+from pydantic import BaseModel
+from pydantic import Field
+from pydantic import PositiveInt
+from runthroughlinehackathor.action_selection.action_list import (
+    load_action_list,
+)
+from runthroughlinehackathor.action_selection.random_events_list import (
+    load_random_events,
+)
+from runthroughlinehackathor.action_selection.random_events_list import (
+    load_reactions,
+)
+from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.models.action.reaction import Reaction
+from runthroughlinehackathor.models.random_event import RandomEvent
+from runthroughlinehackathor.models.stage import Stage
+
+
+class CatalogRandomEvent(BaseModel):
+    name: str
+    description: str
+    reaction_ids: list[int]
+    weight: PositiveInt
+    allowed_stages: list[Stage]
+
+
+class Catalog(BaseModel):
+    """
+    Actions, random events and reactions the games are played with.
+
+    The version is a hash of the content, so it changes exactly when the
+    catalog does and can be used as an ETag and in cacheable URLs.
+    """
+
+    version: str = ""
+    actions: list[Action]
+    random_events: list[CatalogRandomEvent]
+    reactions: list[Reaction]
+    body: bytes = Field(b"", exclude=True)
+
+
+def build_catalog(
+    actions: Iterable[Action],
+    random_events: Iterable[RandomEvent],
+    reactions: Iterable[Reaction],
+) -> Catalog:
+    catalog = Catalog(
+        actions=list(actions),
+        random_events=[
+            CatalogRandomEvent(
+                **e.model_dump(exclude={"reactions"}),
+                reaction_ids=[r.id for r in e.reactions],
+            )
+            for e in random_events
+        ],
+        reactions=list(reactions),
+    )
+    # Serialized once; the version is spliced in as the first field
+    content = catalog.model_dump_json(exclude={"version"}).encode()
+    catalog.version = hashlib.sha256(content).hexdigest()[:16]
+    catalog.body = b'{"version":"%s",%s' % (
+        catalog.version.encode(),
+        content[1:],
+    )
+    return catalog
+
+
+@cache
+def load_catalog() -> Catalog:
+    return build_catalog(
+        load_action_list(), load_random_events(), load_reactions().values()
+    )
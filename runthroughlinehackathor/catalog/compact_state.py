@@ -0,0 +1,38 @@
+from typing import Any
+from typing import Union
+
+from runthroughlinehackathor.catalog.catalog import load_catalog
+from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.models.action.reaction import Reaction
+from runthroughlinehackathor.models.random_event import RandomEvent
+from runthroughlinehackathor.models.state import HistoryElement
+from runthroughlinehackathor.models.state import State
+
+_CATALOG_FIELDS = {"history", "big_actions", "small_actions", "random_event"}
+
+
+def compact_state(state: State) -> dict[str, Any]:
+    """
+    Serialize the state with catalog items referenced instead of embedded.
+
+    Actions are referenced by name, reactions by id and random events by
+    name, as in the catalog of catalog_version. History elements are tagged
+    with their kind, e.g. {"reaction": 3}.
+    """
+    return state.model_dump(mode="json", exclude=_CATALOG_FIELDS) | {
+        "catalog_version": load_catalog().version,
+        "history": list(map(_history_reference, state.history)),
+        "big_actions": [a.name for a in state.big_actions],
+        "small_actions": [a.name for a in state.small_actions],
+        "random_event": state.random_event.name,
+    }
+
+
+def _history_reference(element: HistoryElement) -> dict[str, Union[str, int]]:
+    if isinstance(element, Reaction):
+        return {"reaction": element.id}
+    if isinstance(element, RandomEvent):
+        return {"random_event": element.name}
+    if isinstance(element, Action):
+        return {"action": element.name}
+    raise TypeError(f"Unknown history element {element!r}")
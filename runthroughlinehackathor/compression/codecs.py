@@ -0,0 +1,82 @@
+import gzip
+from collections.abc import Callable
+from functools import lru_cache
+from typing import Optional
+
+from runthroughlinehackathor.settings import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _gzip(body: bytes, best: bool) -> bytes:
+    level = 9 if best else settings.compression_gzip_level
+    return gzip.compress(body, level, mtime=0)
+
+
+def _brotli(body: bytes, best: bool) -> bytes:
+    quality = 11 if best else settings.compression_brotli_quality
+    return brotli.compress(body, quality=quality)
+
+
+def _zstd(body: bytes, best: bool) -> bytes:
+    level = 19 if best else settings.compression_zstd_level
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+# Ordered by preference, brotli and zstd only when their package is installed
+_COMPRESSORS: dict[str, Callable[[bytes, bool], bytes]] = {
+    encoding: compressor
+    for encoding, compressor, module in (
+        ("zstd", _zstd, zstandard),
+        ("br", _brotli, brotli),
+        ("gzip", _gzip, gzip),
+    )
+    if module is not None
+}
+encodings: tuple[str, ...] = tuple(_COMPRESSORS)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Choose the content encoding for an Accept-Encoding header.
+
+    The available encoding with the highest quality value wins, ties are
+    broken by the server preference of zstd, br and gzip. Returns None when
+    the response should not be compressed.
+    """
+    qualities: dict[str, float] = {}
+    for element in accept_encoding.split(","):
+        encoding, _, parameters = element.partition(";")
+        quality = 1.0
+        name, _, value = parameters.partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                continue
+        qualities[encoding.strip().lower()] = quality
+    default_quality = qualities.get("*", 0)
+    encoding_qualities = {
+        encoding: qualities.get(encoding, default_quality)
+        for encoding in _COMPRESSORS
+    }
+    encoding = max(encoding_qualities, key=encoding_qualities.__getitem__)
+    return encoding if encoding_qualities[encoding] > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a response body at the configured, fast level."""
+    return _COMPRESSORS[encoding](body, False)
+
+
+@lru_cache(maxsize=32)
+def compress_immutable(body: bytes, encoding: str) -> bytes:
+    """Compress and cache an immutable body at the best level."""
+    return _COMPRESSORS[encoding](body, True)
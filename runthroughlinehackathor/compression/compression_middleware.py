@@ -0,0 +1,87 @@
+from runthroughlinehackathor.compression.codecs import compress
+from runthroughlinehackathor.compression.codecs import negotiate_encoding
+from runthroughlinehackathor.monitoring.metrics import registry
+from starlette.datastructures import Headers
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+_COMPRESSIBLE_MEDIA_TYPES = ("application/json", "text/")
+
+input_bytes = registry.counter(
+    "response_compression_input_bytes_total",
+    "Response body bytes before compression",
+)
+output_bytes = registry.counter(
+    "response_compression_output_bytes_total",
+    "Response body bytes after compression",
+)
+
+
+class CompressionMiddleware:
+    """
+    Compress JSON and text responses with a negotiated content encoding.
+
+    Only responses sent in one body message of at least minimum_size bytes
+    are compressed. Responses that already carry a Content-Encoding, such
+    as pre-compressed immutable payloads, are passed through. A strong ETag
+    of a compressed response is made weak, as it no longer identifies the
+    exact bytes sent.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("Accept-Encoding", "")
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start_message = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            if not message.get("more_body", False) and self._is_compressible(
+                headers, body
+            ):
+                compressed_body = compress(body, encoding)
+                input_bytes.inc(len(body), encoding=encoding)
+                output_bytes.inc(len(compressed_body), encoding=encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed_body))
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("ETag")
+                if etag is not None and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                message = {**message, "body": compressed_body}
+            await send(start_message)
+            start_message = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    def _is_compressible(self, headers: MutableHeaders, body: bytes) -> bool:
+        return (
+            len(body) >= self.minimum_size
+            and "Content-Encoding" not in headers
+            and headers.get("Content-Type", "").startswith(
+                _COMPRESSIBLE_MEDIA_TYPES
+            )
+        )
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import traceback
+from typing import Any
+from typing import Literal
+
+from pydantic import BaseModel
+from runthroughlinehackathor.action_selection.reference_index import (
+    ActionReference,
+)
+from runthroughlinehackathor.catalog.compact_state import compact_state
+from runthroughlinehackathor.game_session.state_delta import state_delta
+from runthroughlinehackathor.llm.llm_admission import llm_admission
+from runthroughlinehackathor.models.state import State
+from runthroughlinehackathor.monitoring.metrics import registry
+from runthroughlinehackathor.monitoring.timing import timed
+from runthroughlinehackathor.settings import settings
+from runthroughlinehackathor.state_update.narrative_worker_pool import (
+    NarrativeStatus,
+)
+from runthroughlinehackathor.state_update.narrative_worker_pool import (
+    narrative_worker_pool,
+)
+from runthroughlinehackathor.state_update.state_increment import StateIncrement
+from runthroughlinehackathor.state_update.update_state import update_state
+from starlette.websockets import WebSocket
+from starlette.websockets import WebSocketDisconnect
+
+_logger = logging.getLogger(__name__)
+
+open_sessions = registry.gauge(
+    "game_sessions_open", "Game sessions with an open WebSocket"
+)
+
+
+class TurnMessage(BaseModel):
+    type: Literal["turn"] = "turn"
+    chosen_action_references: list[ActionReference]
+
+
+class GameSession:
+    """
+    One game played over a WebSocket.
+
+    The session starts with a "state" message carrying the full state.
+    Every "turn" message from the client is answered with a "delta"
+    message relative to the last state sent, or an "error" message with
+    the status code the HTTP endpoints would use. With compact, states
+    reference catalog items as compact_state does. Deferred narratives are
+    pushed as "narrative" messages, which carry a delta as well. Turns and
+    pushes are serialized, so every delta applies to the previous one.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        state: State,
+        defer_narrative: bool,
+        compact: bool = False,
+    ):
+        self.websocket = websocket
+        self.state = state
+        self.defer_narrative = defer_narrative
+        self.compact = compact
+        self._sent_state: dict[str, Any] = {}
+        self._lock = asyncio.Lock()
+        self._narrative_pushes: set[asyncio.Task] = set()
+
+    async def run(self) -> None:
+        await self.websocket.accept()
+        open_sessions.inc()
+        try:
+            async with self._lock:
+                self._sent_state = self._serialize_state()
+                await self.websocket.send_json(
+                    {"type": "state", "state": self._sent_state}
+                )
+            while True:
+                await self._play_turn(await self.websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            open_sessions.inc(-1)
+            for push in list(self._narrative_pushes):
+                push.cancel()
+
+    async def _play_turn(self, message: str) -> None:
+        try:
+            turn_message = TurnMessage.model_validate_json(message)
+            state_update = StateIncrement(
+                state_id=self.state.id,
+                chosen_action_references=(
+                    turn_message.chosen_action_references
+                ),
+            )
+            state_update.verify_offered(self.state)
+        except ValueError as e:
+            await self._send_error(422, str(e))
+            return
+        if llm_admission.is_saturated():
+            await self._send_error(
+                503,
+                "Too many games are waiting for the LLM",
+                retry_after_seconds=llm_admission.retry_after_seconds(),
+            )
+            return
+        async with self._lock:
+            try:
+                await update_state(
+                    self.state, state_update, self.defer_narrative
+                )
+            except Exception:
+                _logger.error(traceback.format_exc())
+                await self._send_error(500, traceback.format_exc())
+                return
+            await self._send_delta("delta")
+        if self.state.is_narrative_pending:
+            push = asyncio.create_task(
+                self._push_narrative(self.state.game_turn)
+            )
+            self._narrative_pushes.add(push)
+            push.add_done_callback(self._narrative_pushes.discard)
+
+    async def _push_narrative(self, game_turn: int) -> None:
+        narrative = await narrative_worker_pool.wait(
+            self.state.id, game_turn, settings.narrative_max_wait_seconds
+        )
+        async with self._lock:
+            if narrative is None:
+                await self._send_error(
+                    404,
+                    f"No deferred narrative for turn {game_turn}",
+                    game_turn=game_turn,
+                )
+            elif narrative.status == NarrativeStatus.PENDING:
+                await self._send_error(
+                    504,
+                    f"Narrative for turn {game_turn} not ready after "
+                    f"{settings.narrative_max_wait_seconds} seconds",
+                    game_turn=game_turn,
+                )
+            else:
+                await self._send_delta(
+                    "narrative", narrative=narrative.model_dump(mode="json")
+                )
+
+    async def _send_delta(self, message_type: str, **fields: Any) -> None:
+        with timed("serialization"):
+            current_state = self._serialize_state()
+            delta = state_delta(self._sent_state, current_state)
+        await self.websocket.send_json(
+            {"type": message_type, **fields, **delta.model_dump(mode="json")}
+        )
+        self._sent_state = current_state
+
+    def _serialize_state(self) -> dict[str, Any]:
+        if self.compact:
+            return compact_state(self.state)
+        return self.state.model_dump(mode="json")
+
+    async def _send_error(
+        self, status_code: int, detail: Any, **fields: Any
+    ) -> None:
+        await self.websocket.send_json(
+            {
+                "type": "error",
+                "status_code": status_code,
+                "detail": detail,
+                **fields,
+            }
+        )
@@ -0,0 +1,47 @@
+from typing import Any
+
+from pydantic import BaseModel
+from pydantic import NonNegativeInt
+
+
+class ListSplice(BaseModel):
+    start: NonNegativeInt
+    items: list[Any]
+
+
+class StateDelta(BaseModel):
+    """
+    Changes between two serialized states.
+
+    Changed fields are replaced as a whole, except lists, which are
+    truncated to start and extended with items, so a list that only grows
+    costs no more than its new elements.
+    """
+
+    changed: dict[str, Any] = {}
+    spliced: dict[str, ListSplice] = {}
+
+
+def state_delta(
+    previous: dict[str, Any], current: dict[str, Any]
+) -> StateDelta:
+    delta = StateDelta()
+    for field, value in current.items():
+        previous_value = previous.get(field)
+        if value == previous_value:
+            continue
+        if isinstance(value, list) and isinstance(previous_value, list):
+            start = next(
+                (
+                    i
+                    for i, (previous_item, item) in enumerate(
+                        zip(previous_value, value)
+                    )
+                    if previous_item != item
+                ),
+                min(len(previous_value), len(value)),
+            )
+            delta.spliced[field] = ListSplice(start=start, items=value[start:])
+        else:
+            delta.changed[field] = value
+    return delta
@@ -0,0 +1,137 @@
+from functools import cache
+from time import perf_counter
+from typing import Optional
+from typing import TypeVar
+from uuid import UUID
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel
+from runthroughlinehackathor.llm.llm_admission import llm_admission
+from runthroughlinehackathor.llm.llm_admission import LlmOverloadedError
+from runthroughlinehackathor.llm.llm_batcher import llm_batcher
+from runthroughlinehackathor.llm.llm_usage import record_llm_usage
+from runthroughlinehackathor.llm.prompt_type import PromptType
+from runthroughlinehackathor.llm.single_flight import SingleFlight
+from runthroughlinehackathor.monitoring.metrics import registry
+from runthroughlinehackathor.settings import settings
+
+T = TypeVar("T", bound=BaseModel)
+
+llm_single_flight = SingleFlight()
+coalesced_requests = registry.counter(
+    "llm_coalesced_requests_total",
+    "LLM requests served by an identical request already in flight",
+)
+
+
+async def invoke_llm(
+    prompt_type: PromptType, prompt: str, state_id: Optional[UUID] = None
+) -> str:
+    message = await _ainvoke(
+        prompt_type, state_id, _get_chat_model(temperature=None), prompt
+    )
+    return message.content
+
+
+async def invoke_structured_llm(
+    prompt_type: PromptType,
+    prompt: str,
+    schema: type[T],
+    state_id: Optional[UUID] = None,
+) -> T:
+    output = await _ainvoke(
+        prompt_type, state_id, _get_structured_model(schema), prompt
+    )
+    if output["parsing_error"] is not None:
+        raise output["parsing_error"]
+    return output["parsed"]
+
+
+async def _ainvoke(
+    prompt_type: PromptType,
+    state_id: Optional[UUID],
+    model: Runnable,
+    prompt: str,
+):
+    if not settings.llm_coalescing_enabled:
+        return await _ainvoke_uncoalesced(prompt_type, state_id, model, prompt)
+    key = (id(model), prompt)
+    if llm_single_flight.is_in_flight(key):
+        coalesced_requests.inc(prompt_type=prompt_type.value)
+    return await llm_single_flight.do(
+        key,
+        lambda: _ainvoke_uncoalesced(prompt_type, state_id, model, prompt),
+    )
+
+
+async def _ainvoke_uncoalesced(
+    prompt_type: PromptType,
+    state_id: Optional[UUID],
+    model: Runnable,
+    prompt: str,
+):
+    async with llm_admission.admit():
+        start = perf_counter()
+        try:
+            if settings.llm_batching_enabled:
+                output = await llm_batcher.ainvoke(
+                    model, [HumanMessage(prompt)]
+                )
+            else:
+                output = await model.ainvoke([HumanMessage(prompt)])
+        except Exception as e:
+            record_llm_usage(prompt_type, state_id, perf_counter() - start)
+            if _is_rate_limit_error(e):
+                llm_admission.on_rate_limited()
+                raise LlmOverloadedError(_retry_after_seconds(e)) from e
+            raise
+    llm_admission.on_success()
+    record_llm_usage(
+        prompt_type,
+        state_id,
+        perf_counter() - start,
+        output if isinstance(output, AIMessage) else output["raw"],
+    )
+    return output
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    # openai is already imported by _get_chat_model at this point
+    from openai import RateLimitError
+
+    return isinstance(error, RateLimitError)
+
+
+def _retry_after_seconds(error: Exception) -> float:
+    try:
+        return float(error.response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return llm_admission.retry_after_seconds()
+
+
+def load_llm_client() -> None:
+    """Create the chat model now instead of on the first LLM call."""
+    _get_chat_model(temperature=None)
+
+
+@cache
+def _get_chat_model(temperature: Optional[float]) -> BaseChatModel:
+    # Imported here, as langchain_openai takes most of the start-up time
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=settings.llm_model,
+        temperature=temperature,
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url,
+    )
+
+
+@cache
+def _get_structured_model(schema: type[BaseModel]) -> Runnable:
+    return _get_chat_model(temperature=0).with_structured_output(
+        schema, include_raw=True
+    )
@@ -0,0 +1,200 @@
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from math import ceil
+from time import monotonic
+from typing import Optional
+
+from runthroughlinehackathor.monitoring.metrics import registry
+from runthroughlinehackathor.settings import settings
+
+queue_depth = registry.gauge(
+    "llm_admission_queue_depth", "LLM requests waiting for admission"
+)
+in_flight = registry.gauge(
+    "llm_admission_in_flight", "LLM requests admitted and not finished"
+)
+rejections = registry.counter(
+    "llm_admission_rejections_total", "LLM requests rejected by admission"
+)
+rate_limit = registry.gauge(
+    "llm_admission_rate_limit", "Current LLM requests per second limit"
+)
+
+
+class LlmOverloadedError(Exception):
+    def __init__(self, retry_after_seconds: float):
+        super().__init__(
+            f"LLM is overloaded, retry after {retry_after_seconds:.1f} s"
+        )
+        self.retry_after_seconds = retry_after_seconds
+
+
+class LlmAdmissionController:
+    """
+    Token bucket and concurrency limit shared by all LLM call sites.
+
+    Requests are admitted in arrival order. Waiting requests are woken when
+    a running one finishes or when the bucket refills, without polling. At
+    most max_queue_size requests wait for admission and none of them
+    longer than max_wait_seconds, otherwise LlmOverloadedError is raised.
+    The rate is halved whenever the provider rate limits a request and
+    grows back by one percent of the maximum with every success.
+    """
+
+    def __init__(
+        self,
+        max_requests_per_second: float,
+        min_requests_per_second: float,
+        burst: int,
+        max_concurrency: int,
+        max_queue_size: int,
+        max_wait_seconds: float,
+    ):
+        self.max_requests_per_second = max_requests_per_second
+        self.min_requests_per_second = min_requests_per_second
+        self.requests_per_second = max_requests_per_second
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.max_wait_seconds = max_wait_seconds
+        self.n_waiting = 0
+        self.n_running = 0
+        self._tokens = float(burst)
+        self._refilled_at = monotonic()
+        self._waiters: deque[asyncio.Future] = deque()
+        self._refill_handle: Optional[asyncio.TimerHandle] = None
+        self._idle_waiters: list[asyncio.Future] = []
+        rate_limit.set(self.requests_per_second)
+
+    def is_saturated(self) -> bool:
+        return self.n_waiting >= self.max_queue_size
+
+    def retry_after_seconds(self) -> int:
+        return max(1, ceil((self.n_waiting + 1) / self.requests_per_second))
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        if self.is_saturated():
+            rejections.inc(reason="queue_full")
+            raise LlmOverloadedError(self.retry_after_seconds())
+        if not self._waiters and self._try_acquire():
+            self._start_running()
+        else:
+            await self._wait_for_admission()
+        try:
+            yield
+        finally:
+            self._stop_running()
+
+    async def drain(self) -> None:
+        """Wait until no LLM request is waiting or running."""
+        if self.n_waiting or self.n_running:
+            idle = asyncio.get_running_loop().create_future()
+            self._idle_waiters.append(idle)
+            await idle
+
+    def on_success(self) -> None:
+        self._set_rate(
+            self.requests_per_second + self.max_requests_per_second / 100
+        )
+
+    def on_rate_limited(self) -> None:
+        rejections.inc(reason="provider_rate_limit")
+        self._set_rate(self.requests_per_second / 2)
+
+    async def _wait_for_admission(self) -> None:
+        admission = asyncio.get_running_loop().create_future()
+        self._waiters.append(admission)
+        self._set_n_waiting(self.n_waiting + 1)
+        self._wake()
+        try:
+            await asyncio.wait((admission,), timeout=self.max_wait_seconds)
+        except asyncio.CancelledError:
+            # Admitted just before being cancelled, give the slot back
+            if admission.done():
+                self._stop_running()
+            raise
+        finally:
+            if not admission.done():
+                admission.cancel()
+            self._set_n_waiting(self.n_waiting - 1)
+            self._wake()
+        if admission.cancelled():
+            rejections.inc(reason="timeout")
+            raise LlmOverloadedError(self.retry_after_seconds())
+
+    def _wake(self) -> None:
+        """Admit waiting requests in order while slots and tokens last."""
+        while self._waiters:
+            admission = self._waiters[0]
+            if admission.done():
+                self._waiters.popleft()
+                continue
+            if not self._try_acquire():
+                break
+            self._waiters.popleft()
+            self._start_running()
+            admission.set_result(None)
+        if self._refill_handle is not None:
+            self._refill_handle.cancel()
+            self._refill_handle = None
+        if self._waiters and self.n_running < self.max_concurrency:
+            self._refill_handle = asyncio.get_running_loop().call_later(
+                (1 - self._tokens) / self.requests_per_second, self._wake
+            )
+        if not self.n_waiting and not self.n_running:
+            for idle in self._idle_waiters:
+                if not idle.done():
+                    idle.set_result(None)
+            self._idle_waiters.clear()
+
+    def _start_running(self) -> None:
+        self.n_running += 1
+        in_flight.set(self.n_running)
+
+    def _stop_running(self) -> None:
+        self.n_running -= 1
+        in_flight.set(self.n_running)
+        self._wake()
+
+    def _set_n_waiting(self, n_waiting: int) -> None:
+        self.n_waiting = n_waiting
+        queue_depth.set(self.n_waiting)
+
+    def _set_rate(self, requests_per_second: float) -> None:
+        self._refill()
+        self.requests_per_second = min(
+            self.max_requests_per_second,
+            max(self.min_requests_per_second, requests_per_second),
+        )
+        rate_limit.set(self.requests_per_second)
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(
+            self.burst,
+            self._tokens
+            + (now - self._refilled_at) * self.requests_per_second,
+        )
+        self._refilled_at = now
+
+    def _try_acquire(self) -> bool:
+        if self.n_running >= self.max_concurrency:
+            return False
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+llm_admission = LlmAdmissionController(
+    max_requests_per_second=settings.llm_max_requests_per_second,
+    min_requests_per_second=settings.llm_min_requests_per_second,
+    burst=settings.llm_burst,
+    max_concurrency=settings.llm_max_concurrency,
+    max_queue_size=settings.llm_max_queue_size,
+    max_wait_seconds=settings.llm_max_wait_seconds,
+)
@@ -0,0 +1,100 @@
+import asyncio
+from typing import Any
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
+from runthroughlinehackathor.monitoring.metrics import registry
+from runthroughlinehackathor.settings import settings
+
+llm_batch_size = registry.histogram(
+    "llm_batch_size",
+    "Number of LLM requests submitted in one batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+
+class LlmBatcher:
+    """
+    Micro-batching dispatcher of LLM requests.
+
+    Requests to the same model arriving within window_seconds of the first
+    pending one are sent together through the model's abatch_as_completed,
+    so providers with a batch call receive them as one batch. A batch is
+    sent early once it holds max_batch_size requests. Every request
+    resolves as soon as its own output arrives, and at most max_concurrency
+    calls of a batch run at a time; llm_admission bounds the calls of all
+    batches. Models are told apart by identity, which is stable because
+    invoke_llm caches them.
+    """
+
+    def __init__(
+        self, window_seconds: float, max_batch_size: int, max_concurrency: int
+    ):
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self._pending: dict[
+            int, list[tuple[list[BaseMessage], asyncio.Future]]
+        ] = {}
+        self._flush_handles: dict[int, asyncio.TimerHandle] = {}
+        self._sending: set[asyncio.Task] = set()
+
+    async def ainvoke(
+        self, model: Runnable, messages: list[BaseMessage]
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(id(model), [])
+        pending.append((messages, future))
+        if len(pending) >= self.max_batch_size:
+            self._flush(model)
+        elif id(model) not in self._flush_handles:
+            self._flush_handles[id(model)] = loop.call_later(
+                self.window_seconds, self._flush, model
+            )
+        return await future
+
+    def _flush(self, model: Runnable) -> None:
+        flush_handle = self._flush_handles.pop(id(model), None)
+        if flush_handle is not None:
+            flush_handle.cancel()
+        batch = self._pending.pop(id(model), [])
+        if batch:
+            task = asyncio.create_task(self._send(model, batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(
+        self,
+        model: Runnable,
+        batch: list[tuple[list[BaseMessage], asyncio.Future]],
+    ) -> None:
+        # Requests cancelled while waiting for the window are not sent
+        batch = [(m, future) for m, future in batch if not future.done()]
+        if not batch:
+            return
+        llm_batch_size.observe(len(batch))
+        try:
+            async for position, output in model.abatch_as_completed(
+                [messages for messages, _ in batch],
+                config={"max_concurrency": self.max_concurrency},
+                return_exceptions=True,
+            ):
+                future = batch[position][1]
+                if future.done():
+                    continue
+                if isinstance(output, Exception):
+                    future.set_exception(output)
+                else:
+                    future.set_result(output)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+llm_batcher = LlmBatcher(
+    window_seconds=settings.llm_batch_window_seconds,
+    max_batch_size=settings.llm_max_batch_size,
+    max_concurrency=settings.llm_batch_max_concurrency,
+)
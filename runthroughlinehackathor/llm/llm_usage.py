@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from typing import Optional
+from uuid import UUID
+
+from langchain_core.messages import AIMessage
+from pydantic import BaseModel
+from pydantic import computed_field
+from pydantic import Field
+from runthroughlinehackathor.llm.prompt_type import PromptType
+from runthroughlinehackathor.monitoring.metrics import registry
+from runthroughlinehackathor.settings import settings
+
+llm_requests_total = registry.counter(
+    "llm_requests_total", "LLM requests by prompt type and outcome"
+)
+llm_prompt_tokens_total = registry.counter(
+    "llm_prompt_tokens_total", "Prompt tokens sent to the LLM"
+)
+llm_completion_tokens_total = registry.counter(
+    "llm_completion_tokens_total", "Completion tokens returned by the LLM"
+)
+llm_cached_prompt_tokens_total = registry.counter(
+    "llm_cached_prompt_tokens_total",
+    "Prompt tokens served from the provider prompt cache",
+)
+llm_cache_hits_total = registry.counter(
+    "llm_cache_hits_total", "LLM requests that hit any cache"
+)
+llm_cost_usd_total = registry.counter(
+    "llm_cost_usd_total", "Estimated LLM spend in USD"
+)
+llm_request_duration_seconds = registry.histogram(
+    "llm_request_duration_seconds", "Latency of LLM requests"
+)
+
+
+class LlmUsage(BaseModel):
+    n_requests: int = 0
+    n_errors: int = 0
+    n_cache_hits: int = 0
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0
+    duration_seconds: float = 0
+
+    def add(self, other: "LlmUsage") -> None:
+        for name in LlmUsage.model_fields:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+class GameLlmUsage(BaseModel):
+    by_prompt_type: dict[PromptType, LlmUsage] = Field(default_factory=dict)
+
+    @computed_field
+    def total(self) -> LlmUsage:
+        total = LlmUsage()
+        for usage in self.by_prompt_type.values():
+            total.add(usage)
+        return total
+
+
+# Least recently used games are dropped beyond llm_usage_max_games
+game_llm_usage: OrderedDict[UUID, GameLlmUsage] = OrderedDict()
+
+
+def record_llm_usage(
+    prompt_type: PromptType,
+    state_id: Optional[UUID],
+    duration_seconds: float,
+    message: Optional[AIMessage] = None,
+) -> None:
+    """Aggregate one LLM call into the metrics and the game's summary."""
+    usage_metadata = (message and message.usage_metadata) or {}
+    cached_prompt_tokens = usage_metadata.get("input_token_details", {}).get(
+        "cache_read", 0
+    )
+    prompt_tokens = usage_metadata.get("input_tokens", 0)
+    completion_tokens = usage_metadata.get("output_tokens", 0)
+    usage = LlmUsage(
+        n_requests=1,
+        n_errors=int(message is None),
+        n_cache_hits=int(cached_prompt_tokens > 0),
+        prompt_tokens=prompt_tokens,
+        cached_prompt_tokens=cached_prompt_tokens,
+        completion_tokens=completion_tokens,
+        cost_usd=(prompt_tokens - cached_prompt_tokens)
+        * settings.llm_prompt_token_cost_usd
+        + cached_prompt_tokens * settings.llm_cached_prompt_token_cost_usd
+        + completion_tokens * settings.llm_completion_token_cost_usd,
+        duration_seconds=duration_seconds,
+    )
+    labels = {"prompt_type": prompt_type.value}
+    llm_requests_total.inc(
+        **labels, outcome="error" if message is None else "success"
+    )
+    llm_request_duration_seconds.observe(duration_seconds, **labels)
+    llm_prompt_tokens_total.inc(prompt_tokens, **labels)
+    llm_cached_prompt_tokens_total.inc(cached_prompt_tokens, **labels)
+    llm_completion_tokens_total.inc(completion_tokens, **labels)
+    llm_cache_hits_total.inc(usage.n_cache_hits, **labels)
+    llm_cost_usd_total.inc(usage.cost_usd, **labels)
+    if state_id is not None:
+        game_llm_usage.setdefault(
+            state_id, GameLlmUsage()
+        ).by_prompt_type.setdefault(prompt_type, LlmUsage()).add(usage)
+        game_llm_usage.move_to_end(state_id)
+        while len(game_llm_usage) > settings.llm_usage_max_games:
+            game_llm_usage.popitem(last=False)
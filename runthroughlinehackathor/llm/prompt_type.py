@@ -0,0 +1,10 @@
+from enum import Enum
+
+
+class PromptType(str, Enum):
+    ACTION_WEIGHT = "action_weight"
+    GAME_LOSS = "game_loss"
+    STAGE_SUMMARY = "stage_summary"
+    TURN_DESCRIPTION = "turn_description"
+    NARRATIVE_MEMORY = "narrative_memory"
+    NARRATIVE_FRAGMENT = "narrative_fragment"
@@ -0,0 +1,51 @@
+import asyncio
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Hashable
+from typing import Generic
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.n_waiters = 0
+
+
+class SingleFlight:
+    """
+    Lets concurrent calls with the same key share one in-flight call.
+
+    The shared call runs as a task that every caller awaits through
+    asyncio.shield, so a cancelled caller does not cancel it for the
+    others. Once all callers are gone the call itself is cancelled.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+
+    def is_in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(
+        self, key: Hashable, function: Callable[[], Awaitable[T]]
+    ) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(function()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        call.n_waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.n_waiters -= 1
+            if call.n_waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self._forget(key, call)
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -23,3 +23,6 @@ class Parameters(BaseModel):
             ),
             money=min(settings.MAX_PARAMETER_VALUE, self.money + other.money),
         )
+
+
+PARAMETER_NAMES: tuple[str, ...] = tuple(Parameters.model_fields)
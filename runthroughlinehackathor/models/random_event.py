@@ -1,8 +1,13 @@
 from pydantic import BaseModel
+from pydantic import Field
+from pydantic import PositiveInt
 from runthroughlinehackathor.models.action.reaction import Reaction
+from runthroughlinehackathor.models.stage import Stage
 
 
 class RandomEvent(BaseModel):
     name: str
     description: str
     reactions: list[Reaction]
+    weight: PositiveInt = 1
+    allowed_stages: list[Stage] = Field(default_factory=lambda: list(Stage))
@@ -35,6 +35,9 @@ class State(BaseModel):
     stage_summary: Optional[str] = None
     is_game_finished: bool = False
     did_user_win: bool = True
+    is_narrative_pending: bool = False
+    is_updating: bool = False
+    version: NonNegativeInt = 0
 
     @computed_field
     def turn_description(self) -> str:
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from collections import deque
+from collections.abc import Collection
+from collections.abc import Sequence
+from typing import Optional
+from uuid import UUID
+
+from pydantic import BaseModel
+from pydantic import computed_field
+from pydantic import NonNegativeInt
+from runthroughlinehackathor.models.state import State
+from runthroughlinehackathor.monitoring.metrics import registry
+from runthroughlinehackathor.settings import settings
+
+_logger = logging.getLogger(__name__)
+
+live_games = registry.gauge("live_games", "Number of games kept in memory")
+state_snapshots = registry.gauge(
+    "state_snapshots", "Number of previous state snapshots kept in memory"
+)
+game_memory_bytes = registry.gauge(
+    "game_memory_bytes",
+    "Approximate memory used by all games at the last memory report",
+)
+process_rss_bytes = registry.gauge(
+    "process_rss_bytes", "Resident set size of the server process"
+)
+memory_alerts = registry.counter(
+    "memory_alerts_total", "Memory thresholds exceeded by a sample"
+)
+
+
+class GameMemoryFootprint(BaseModel):
+    state_id: UUID
+    n_snapshots: NonNegativeInt
+    history_bytes: NonNegativeInt
+    turn_descriptions_bytes: NonNegativeInt
+    snapshots_bytes: NonNegativeInt
+
+    @computed_field
+    def total_bytes(self) -> int:
+        return (
+            self.history_bytes
+            + self.turn_descriptions_bytes
+            + self.snapshots_bytes
+        )
+
+
+class RssSample(BaseModel):
+    timestamp: float
+    rss_bytes: NonNegativeInt
+
+
+class MemorySample(BaseModel):
+    n_games: NonNegativeInt
+    n_snapshots: NonNegativeInt
+    rss_bytes: Optional[NonNegativeInt]
+    alerts: list[str]
+
+
+class MemoryReport(BaseModel):
+    n_games: NonNegativeInt
+    n_snapshots: NonNegativeInt
+    total_game_bytes: NonNegativeInt
+    mean_game_bytes: float
+    rss_bytes: Optional[NonNegativeInt]
+    rss_history: list[RssSample]
+    alerts: list[str]
+    largest_games: list[GameMemoryFootprint]
+
+
+def measure_game(
+    state: State, snapshots: Sequence[State]
+) -> GameMemoryFootprint:
+    """
+    Approximate the bytes owned by one game.
+
+    History elements of a live state are shared with the catalog, so only the
+    list itself is counted. Snapshots are deep copies and own everything.
+    """
+    return GameMemoryFootprint(
+        state_id=state.id,
+        n_snapshots=len(snapshots),
+        history_bytes=sys.getsizeof(state.history),
+        turn_descriptions_bytes=_strings_size(state.turn_descriptions),
+        snapshots_bytes=sum(_deep_sizeof(s, set()) for s in snapshots),
+    )
+
+
+def read_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class MemorySampler:
+    """
+    Periodically samples the process RSS and the number of games in memory.
+
+    Samples update the memory gauges, keep a bounded RSS history and log a
+    warning for every configured threshold that is exceeded. The per-game
+    footprint is only measured on demand by report, off the event loop.
+    """
+
+    def __init__(
+        self, states: Collection[State], previous_states: list[State]
+    ):
+        self.states = states
+        self.previous_states = previous_states
+        self.rss_history: deque[RssSample] = deque(
+            maxlen=settings.memory_rss_history_size
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    async def report(self, n_largest_games: int = 10) -> MemoryReport:
+        """
+        Measure every game in a worker thread.
+
+        The lists are copied first, so the thread only reads live states
+        shallowly and deep-walks snapshots, which are never mutated.
+        """
+        states = list(self.states)
+        snapshots = list(self.previous_states)
+        footprints = await asyncio.to_thread(_measure_games, states, snapshots)
+        total_game_bytes = sum(f.total_bytes for f in footprints)
+        game_memory_bytes.set(total_game_bytes)
+        rss_bytes = read_rss_bytes()
+        return MemoryReport(
+            n_games=len(states),
+            n_snapshots=len(snapshots),
+            total_game_bytes=total_game_bytes,
+            mean_game_bytes=total_game_bytes / max(len(footprints), 1),
+            rss_bytes=rss_bytes,
+            rss_history=list(self.rss_history),
+            alerts=self._check_thresholds(rss_bytes),
+            largest_games=sorted(
+                footprints, key=lambda f: f.total_bytes, reverse=True
+            )[:n_largest_games],
+        )
+
+    def sample(self) -> MemorySample:
+        rss_bytes = read_rss_bytes()
+        sample = MemorySample(
+            n_games=len(self.states),
+            n_snapshots=len(self.previous_states),
+            rss_bytes=rss_bytes,
+            alerts=self._check_thresholds(rss_bytes),
+        )
+        if rss_bytes is not None:
+            self.rss_history.append(
+                RssSample(timestamp=time.time(), rss_bytes=rss_bytes)
+            )
+            process_rss_bytes.set(rss_bytes)
+        live_games.set(sample.n_games)
+        state_snapshots.set(sample.n_snapshots)
+        for alert in sample.alerts:
+            memory_alerts.inc()
+            _logger.warning(alert)
+        return sample
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self.sample()
+            except Exception:
+                _logger.exception("Memory sampling failed")
+            await asyncio.sleep(settings.memory_sampling_interval_seconds)
+
+    def _check_thresholds(self, rss_bytes: Optional[int]) -> list[str]:
+        alerts = []
+        if (
+            settings.memory_alert_rss_bytes is not None
+            and rss_bytes is not None
+            and rss_bytes > settings.memory_alert_rss_bytes
+        ):
+            alerts.append(
+                f"Process RSS {rss_bytes} B exceeds"
+                f" {settings.memory_alert_rss_bytes} B"
+            )
+        if (
+            settings.memory_alert_n_games is not None
+            and len(self.states) > settings.memory_alert_n_games
+        ):
+            alerts.append(
+                f"{len(self.states)} live games exceed"
+                f" {settings.memory_alert_n_games}"
+            )
+        if (
+            settings.memory_alert_n_snapshots is not None
+            and len(self.previous_states) > settings.memory_alert_n_snapshots
+        ):
+            alerts.append(
+                f"{len(self.previous_states)} state snapshots exceed"
+                f" {settings.memory_alert_n_snapshots}"
+            )
+        return alerts
+
+
+def _measure_games(
+    states: list[State], snapshots: list[State]
+) -> list[GameMemoryFootprint]:
+    id_to_snapshots: dict[UUID, list[State]] = defaultdict(list)
+    for snapshot in snapshots:
+        id_to_snapshots[snapshot.id].append(snapshot)
+    return [
+        measure_game(state, id_to_snapshots.get(state.id, ()))
+        for state in states
+    ]
+
+
+def _strings_size(strings: list[str]) -> int:
+    return sys.getsizeof(strings) + sum(map(sys.getsizeof, strings))
+
+
+def _deep_sizeof(obj: object, seen: set[int]) -> int:
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        return size + sum(
+            _deep_sizeof(key, seen) + _deep_sizeof(value, seen)
+            for key, value in obj.items()
+        )
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(_deep_sizeof(item, seen) for item in obj)
+    if isinstance(obj, BaseModel):
+        return size + _deep_sizeof(obj.__dict__, seen)
+    return size
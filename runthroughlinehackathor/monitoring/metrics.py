@@ -0,0 +1,146 @@
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Sequence
+from typing import Union
+
+LabelValues = tuple[tuple[str, str], ...]
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def _label_values(labels: dict[str, str]) -> LabelValues:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(label_values: LabelValues) -> str:
+    if not label_values:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{name}="{value}"' for name, value in label_values)
+        + "}"
+    )
+
+
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.values: dict[LabelValues, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        self.values[_label_values(labels)] += amount
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(label_values)} {value}"
+            for label_values, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[_label_values(labels)] = value
+
+
+class Histogram:
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.bucket_counts: dict[LabelValues, list[int]] = {}
+        self.sums: dict[LabelValues, float] = defaultdict(float)
+
+    def observe(self, value: float, **labels: str) -> None:
+        label_values = _label_values(labels)
+        counts = self.bucket_counts.setdefault(
+            label_values, [0] * (len(self.buckets) + 1)
+        )
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[label_values] += value
+
+    def render(self) -> list[str]:
+        lines = []
+        for label_values, counts in self.bucket_counts.items():
+            cumulative_count = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative_count += count
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_format_labels((*label_values, ('le', str(bound))))}"
+                    f" {cumulative_count}"
+                )
+            lines.append(
+                f"{self.name}_sum{_format_labels(label_values)}"
+                f" {self.sums[label_values]}"
+            )
+            lines.append(
+                f"{self.name}_count{_format_labels(label_values)}"
+                f" {cumulative_count}"
+            )
+        return lines
+
+
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge(name, documentation))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,195 @@
+import asyncio
+import cProfile
+import json
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from types import FrameType
+from typing import Optional
+
+from pydantic import SecretStr
+from runthroughlinehackathor.settings import settings
+
+
+class _StackSampler(threading.Thread):
+    """Periodically samples the call stack of one thread."""
+
+    def __init__(self, thread_id: int, interval_seconds: float):
+        super().__init__(daemon=True)
+        self._thread_id = thread_id
+        self._interval_seconds = interval_seconds
+        self._stopped = threading.Event()
+        self.frame_to_index: dict[tuple[str, str, int], int] = {}
+        self.samples: list[list[int]] = []
+        self.weights: list[float] = []
+        self.duration_seconds = 0.0
+
+    def run(self) -> None:
+        start = previous = time.perf_counter()
+        while not self._stopped.wait(self._interval_seconds):
+            frame = sys._current_frames().get(self._thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                self.samples.append(self._stack(frame))
+                self.weights.append(now - previous)
+            previous = now
+        self.duration_seconds = time.perf_counter() - start
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+    def to_speedscope(self, name: str) -> dict:
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "runthroughlinehackathor",
+            "shared": {
+                "frames": [
+                    {"name": function, "file": file, "line": line}
+                    for function, file, line in self.frame_to_index
+                ]
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self.duration_seconds,
+                    "samples": self.samples,
+                    "weights": self.weights,
+                }
+            ],
+        }
+
+    def _stack(self, frame: Optional[FrameType]) -> list[int]:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_qualname, code.co_filename, code.co_firstlineno)
+            stack.append(
+                self.frame_to_index.setdefault(key, len(self.frame_to_index))
+            )
+            frame = frame.f_back
+        return stack[::-1]
+
+
+class RequestProfiler:
+    """
+    Opt-in, rate limited profiling of individual requests.
+
+    Requests are profiled when profiling_enabled is set or when they carry
+    the admin profiling key, but never more often than once per
+    profiling_min_interval_seconds and never two at a time. Work of other
+    requests interleaved on the event loop is included in the profile.
+    Memory is traced with tracemalloc only when profile_memory is set.
+    Profiles are written in a worker thread, off the event loop.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        admin_key: Optional[SecretStr],
+        directory: Path,
+        profile_format: str,
+        sampling_interval_seconds: float,
+        min_interval_seconds: float,
+        profile_memory: bool = False,
+    ):
+        self.enabled = enabled
+        self.admin_key = admin_key
+        self.directory = directory
+        self.profile_format = profile_format
+        self.sampling_interval_seconds = sampling_interval_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.profile_memory = profile_memory
+        self._last_profile_start = -float("inf")
+        self._is_profiling = False
+
+    def should_profile(self, profile_key: Optional[str]) -> bool:
+        is_requested = self.enabled or (
+            self.admin_key is not None
+            and profile_key is not None
+            and secrets.compare_digest(
+                profile_key.encode(),
+                self.admin_key.get_secret_value().encode(),
+            )
+        )
+        return (
+            is_requested
+            and not self._is_profiling
+            and time.monotonic() - self._last_profile_start
+            >= self.min_interval_seconds
+        )
+
+    @asynccontextmanager
+    async def profile(self, name: str) -> AsyncIterator[None]:
+        self._is_profiling = True
+        self._last_profile_start = time.monotonic()
+        path_stem = (
+            f"{time.strftime('%Y%m%dT%H%M%S')}-{name}-{uuid.uuid4().hex[:8]}"
+        )
+        starts_tracing = self.profile_memory and not tracemalloc.is_tracing()
+        if starts_tracing:
+            tracemalloc.start()
+        sampler = profiler = None
+        if self.profile_format == "speedscope":
+            sampler = _StackSampler(
+                threading.get_ident(), self.sampling_interval_seconds
+            )
+            sampler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if sampler is not None:
+                sampler.stop()
+            if profiler is not None:
+                profiler.disable()
+            try:
+                await asyncio.to_thread(
+                    self._write, path_stem, name, sampler, profiler
+                )
+            finally:
+                if starts_tracing:
+                    tracemalloc.stop()
+                self._is_profiling = False
+
+    def _write(
+        self,
+        path_stem: str,
+        name: str,
+        sampler: Optional[_StackSampler],
+        profiler: Optional[cProfile.Profile],
+    ) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if sampler is not None:
+            (self.directory / f"{path_stem}.speedscope.json").write_text(
+                json.dumps(sampler.to_speedscope(name))
+            )
+        if profiler is not None:
+            profiler.dump_stats(self.directory / f"{path_stem}.pstats")
+        if self.profile_memory:
+            tracemalloc.take_snapshot().dump(
+                str(self.directory / f"{path_stem}.tracemalloc")
+            )
+
+
+request_profiler = RequestProfiler(
+    enabled=settings.profiling_enabled,
+    admin_key=settings.profiling_admin_key,
+    directory=Path(settings.profiling_directory),
+    profile_format=settings.profiling_format,
+    sampling_interval_seconds=settings.profiling_sampling_interval_seconds,
+    min_interval_seconds=settings.profiling_min_interval_seconds,
+    profile_memory=settings.profiling_memory,
+)
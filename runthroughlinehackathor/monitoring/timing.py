@@ -0,0 +1,53 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextlib import nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+from typing import ContextManager
+from typing import Optional
+
+from runthroughlinehackathor.monitoring.metrics import registry
+from runthroughlinehackathor.settings import settings
+
+phase_duration_seconds = registry.histogram(
+    "turn_phase_duration_seconds", "Duration of turn pipeline phases"
+)
+
+_request_phase_durations: ContextVar[Optional[dict[str, float]]] = ContextVar(
+    "request_phase_durations", default=None
+)
+_disabled = nullcontext()
+
+
+def timed(phase: str) -> ContextManager:
+    """Time a phase of the turn pipeline when timing is enabled."""
+    if not settings.timing_enabled:
+        return _disabled
+    return _timed(phase)
+
+
+def start_request_timing() -> dict[str, float]:
+    """Collect durations of all phases timed within the current request."""
+    phase_durations: dict[str, float] = {}
+    _request_phase_durations.set(phase_durations)
+    return phase_durations
+
+
+def format_server_timing(phase_durations: dict[str, float]) -> str:
+    return ", ".join(
+        f"{phase};dur={duration * 1000:.1f}"
+        for phase, duration in phase_durations.items()
+    )
+
+
+@contextmanager
+def _timed(phase: str) -> Iterator[None]:
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        duration = perf_counter() - start
+        phase_duration_seconds.observe(duration, phase=phase)
+        phase_durations = _request_phase_durations.get()
+        if phase_durations is not None:
+            phase_durations[phase] = phase_durations.get(phase, 0) + duration
@@ -0,0 +1,42 @@
+import random
+from collections.abc import Iterable
+from typing import Union
+
+from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.models.action.reaction import Reaction
+from runthroughlinehackathor.models.stage import Stage
+from runthroughlinehackathor.narrative_library.narrative_library import (
+    fragment_key,
+)
+from runthroughlinehackathor.narrative_library.narrative_library import (
+    narrative_library,
+)
+from runthroughlinehackathor.settings import settings
+
+
+def compose_turn_description(
+    chosen_actions: Iterable[Union[Action, Reaction]], stage: Stage
+) -> str:
+    """
+    Assemble a turn description from pre-generated narrative fragments.
+
+    Elements without a fragment for the stage fall back to their catalog
+    text, the result of a reaction or the description of an action.
+    """
+    return settings.composed_turn_description_template.format(
+        fragments=" ".join(
+            _fragment(element, stage) for element in chosen_actions
+        )
+    )
+
+
+def _fragment(element: Union[Action, Reaction], stage: Stage) -> str:
+    variants = narrative_library.fragments.get(fragment_key(element), {})
+    if variants.get(stage):
+        return random.choice(variants[stage])
+    text = (
+        element.result
+        if isinstance(element, Reaction)
+        else element.description
+    )
+    return text if text.endswith((".", "!", "?")) else f"{text}."
@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+from pathlib import Path
+from typing import Union
+
+from runthroughlinehackathor.action_selection.action_list import action_list
+from runthroughlinehackathor.action_selection.random_events_list import (
+    reactions,
+)
+from runthroughlinehackathor.llm.invoke_llm import invoke_llm
+from runthroughlinehackathor.llm.llm_admission import LlmOverloadedError
+from runthroughlinehackathor.llm.prompt_type import PromptType
+from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.models.action.reaction import Reaction
+from runthroughlinehackathor.models.stage import Stage
+from runthroughlinehackathor.narrative_library.narrative_library import (
+    fragment_key,
+)
+from runthroughlinehackathor.narrative_library.narrative_library import (
+    NarrativeLibrary,
+)
+from runthroughlinehackathor.settings import settings
+
+
+async def generate_narrative_library(n_variants: int) -> NarrativeLibrary:
+    """Generate n_variants fragments per catalog element and allowed stage."""
+    jobs = [
+        (element, stage)
+        for element in (*action_list, *reactions.values())
+        for stage in (
+            element.allowed_stages if isinstance(element, Action) else Stage
+        )
+    ]
+    semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+    variants = await asyncio.gather(
+        *(
+            _generate_fragment(
+                semaphore, _fragment_prompt(element, stage, variant)
+            )
+            for element, stage in jobs
+            for variant in range(1, n_variants + 1)
+        )
+    )
+    library = NarrativeLibrary()
+    for index, (element, stage) in enumerate(jobs):
+        library.fragments.setdefault(fragment_key(element), {})[stage] = (
+            variants[index * n_variants : (index + 1) * n_variants]
+        )
+    return library
+
+
+async def _generate_fragment(semaphore: asyncio.Semaphore, prompt: str) -> str:
+    async with semaphore:
+        while True:
+            try:
+                return await invoke_llm(PromptType.NARRATIVE_FRAGMENT, prompt)
+            except LlmOverloadedError as e:
+                await asyncio.sleep(e.retry_after_seconds)
+
+
+def _fragment_prompt(
+    element: Union[Action, Reaction], stage: Stage, variant: int
+) -> str:
+    if isinstance(element, Reaction):
+        choice = f"{element.description} ({element.result})"
+    else:
+        choice = f"{element.name} ({element.description})"
+    return settings.narrative_fragment_prompt.format(
+        stage=stage.value, choice=choice, variant=variant
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pre-generate the narrative library"
+    )
+    parser.add_argument("--n-variants", type=int, default=3)
+    parser.add_argument(
+        "--output", type=Path, default=Path(settings.narrative_library_path)
+    )
+    args = parser.parse_args()
+    narrative_library = asyncio.run(
+        generate_narrative_library(args.n_variants)
+    )
+    args.output.write_text(
+        narrative_library.model_dump_json(indent=2), encoding="utf-8"
+    )
@@ -0,0 +1,33 @@
+from pathlib import Path
+from typing import Union
+
+from pydantic import BaseModel
+from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.models.action.reaction import Reaction
+from runthroughlinehackathor.models.stage import Stage
+from runthroughlinehackathor.settings import settings
+
+
+class NarrativeLibrary(BaseModel):
+    """Pre-generated narrative fragments per catalog element and stage."""
+
+    fragments: dict[str, dict[Stage, list[str]]] = {}
+
+
+def fragment_key(element: Union[Action, Reaction]) -> str:
+    if isinstance(element, Reaction):
+        return f"reaction:{element.id}"
+    return f"action:{element.name}"
+
+
+def load_narrative_library(path: Path) -> NarrativeLibrary:
+    if not path.is_file():
+        return NarrativeLibrary()
+    return NarrativeLibrary.model_validate_json(
+        path.read_text(encoding="utf-8")
+    )
+
+
+narrative_library = load_narrative_library(
+    Path(settings.narrative_library_path)
+)
@@ -0,0 +1,41 @@
+import logging
+import os
+
+import uvicorn
+from runthroughlinehackathor.settings import settings
+
+_logger = logging.getLogger(__name__)
+
+
+def run_server() -> None:
+    """
+    Serve main:app with the production server settings.
+
+    Event loop and HTTP parser are left to uvicorn's auto detection, which
+    picks uvloop and httptools whenever they are installed. Every worker
+    finishes its warm-up before it accepts connections. Games live in the
+    memory of the worker that created them, so more than one worker needs
+    sticky routing by game. SERVER_WORKERS=0 starts one worker per CPU.
+    """
+    n_workers = settings.server_workers or os.cpu_count() or 1
+    # Spawned workers read their settings from the environment
+    os.environ["WARM_UP_BEFORE_SERVING"] = "true"
+    settings.warm_up_before_serving = True
+    _logger.info("Starting %d server workers", n_workers)
+    uvicorn.run(
+        "main:app",
+        host=settings.server_host,
+        port=settings.server_port,
+        workers=n_workers,
+        loop="auto",
+        http="auto",
+        backlog=settings.server_backlog,
+        timeout_keep_alive=settings.server_keep_alive_seconds,
+        limit_concurrency=settings.server_limit_concurrency,
+        timeout_graceful_shutdown=settings.server_graceful_shutdown_seconds,
+        access_log=settings.server_access_log,
+    )
+
+
+if __name__ == "__main__":
+    run_server()
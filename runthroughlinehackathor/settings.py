@@ -2,10 +2,15 @@ from __future__ import annotations
 
 import os
 from collections.abc import Mapping
+from typing import Literal
+from typing import Optional
 from typing import Self
 
+from pydantic import Field
 from pydantic import HttpUrl
 from pydantic import model_validator
+from pydantic import NonNegativeFloat
+from pydantic import NonNegativeInt
 from pydantic import PositiveFloat
 from pydantic import PositiveInt
 from pydantic import SecretStr
@@ -16,9 +21,28 @@ from runthroughlinehackathor.models.gender import Gender
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
-        env_file=os.getenv("ENV_PATH", ".env"), extra="ignore"
+        env_file=os.getenv("ENV_PATH", ".env"),
+        env_ignore_empty=True,
+        extra="ignore",
     )
     openai_api_key: SecretStr = "sk-proj-"
+    openai_base_url: Optional[str] = None
+    llm_model: str = "gpt-4o-mini"
+    llm_prompt_token_cost_usd: NonNegativeFloat = 0.15e-6
+    llm_cached_prompt_token_cost_usd: NonNegativeFloat = 0.075e-6
+    llm_completion_token_cost_usd: NonNegativeFloat = 0.6e-6
+    llm_usage_max_games: PositiveInt = 10_000
+    llm_max_requests_per_second: PositiveFloat = 50
+    llm_min_requests_per_second: PositiveFloat = 1
+    llm_burst: PositiveInt = 20
+    llm_max_concurrency: PositiveInt = 64
+    llm_max_queue_size: PositiveInt = 256
+    llm_max_wait_seconds: NonNegativeFloat = 5
+    llm_coalescing_enabled: bool = True
+    llm_batching_enabled: bool = False
+    llm_batch_window_seconds: PositiveFloat = 0.01
+    llm_max_batch_size: PositiveInt = 32
+    llm_batch_max_concurrency: PositiveInt = 16
 
     n_actions: PositiveInt = 8
     time_pre_turn: PositiveInt = 10
@@ -29,6 +53,7 @@ class Settings(BaseSettings):
     n_small_actions: PositiveInt = 5
 
     small_action_max_cost: PositiveInt = 3
+    random_event_pool_max_games: PositiveInt = 10_000
 
     initial_health: PositiveInt = 100
     initial_other_parameters: PositiveInt = 20
@@ -71,9 +96,70 @@ Czy osiągniesz sukces, szczęście, czy może coś pomiędzy?"""
     has_child_action_name: str = "Dziecko"
     is_happy_min_mean: PositiveInt = 50
 
+    timing_enabled: bool = True
+
+    profiling_enabled: bool = False
+    profiling_admin_key: Optional[SecretStr] = None
+    profiling_directory: str = "profiles"
+    profiling_format: Literal["speedscope", "pstats"] = "speedscope"
+    profiling_sampling_interval_seconds: PositiveFloat = 0.001
+    profiling_min_interval_seconds: NonNegativeFloat = 60
+    profiling_memory: bool = False
+
+    memory_sampling_interval_seconds: PositiveFloat = 60
+    memory_rss_history_size: PositiveInt = 1440
+    memory_alert_rss_bytes: Optional[PositiveInt] = None
+    memory_alert_n_games: Optional[PositiveInt] = None
+    memory_alert_n_snapshots: Optional[PositiveInt] = None
+
+    narrative_source: Literal["llm", "library"] = "llm"
+    # Past it a turn description is composed from the narrative library
+    narrative_llm_timeout_seconds: PositiveFloat = 10
+    narrative_library_path: str = "resources/narrative_library.json"
+    composed_turn_description_template: str = (
+        "Minęło kolejne pięć lat Twojego życia. {fragments}"
+    )
+    narrative_memory_token_budget: PositiveInt = 1000
+    prompt_history_token_budget: PositiveInt = 1500
+    characters_per_token: PositiveFloat = 4
+
+    deferred_narrative: bool = False
+    narrative_workers: PositiveInt = 16
+    narrative_queue_size: PositiveInt = 1024
+    narrative_max_wait_seconds: PositiveFloat = 30
+
+    catalog_max_age_seconds: PositiveInt = 31_536_000
+    compression_minimum_size: NonNegativeInt = 1000
+    compression_gzip_level: int = Field(6, ge=1, le=9)
+    compression_brotli_quality: int = Field(4, ge=0, le=11)
+    compression_zstd_level: int = Field(3, ge=1, le=22)
+
+    turn_batch_concurrency: PositiveInt = 64
+    max_turn_batch_size: PositiveInt = 10_000
+
+    server_host: str = "0.0.0.0"
+    server_port: PositiveInt = 8000
+    # 0 starts one worker per CPU
+    server_workers: NonNegativeInt = 1
+    server_backlog: PositiveInt = 2048
+    server_keep_alive_seconds: PositiveInt = 75
+    server_limit_concurrency: Optional[PositiveInt] = None
+    server_graceful_shutdown_seconds: PositiveInt = 30
+    server_access_log: bool = False
+    warm_up_before_serving: bool = False
+    shutdown_drain_seconds: PositiveFloat = 20
+
     VERCEL_BLOB_URL: HttpUrl = "https://blob.vercel-storage.com"
     BLOB_READ_WRITE_TOKEN: SecretStr = "token"
 
+    overloaded_game_loss_narrative: str = (
+        "Jedna ze sfer Twojego życia załamała się i gra dobiegła końca."
+    )
+    overloaded_stage_summary_narrative: str = (
+        "Kolejny etap Twojego życia dobiegł końca."
+        " To, kim się stałeś, jest sumą Twoich wyborów."
+    )
+
     # LLM Prompts
     action_weight_prompt: str = """Assign weights to given actions. Given state history. Weights should determine the probability of occurrence of given decision for user.
 Current user parameters are {parameters}
@@ -95,6 +181,14 @@ Zwóć histerię biorąc pod uwagę, że zmiany zaszły na przestrzeni 5 lat
 Historie z poprzednich pięcioletnich okresów to {turn_descriptions}
 Zwróć odpowiedź w języku polskim zwracając się bezpośrednio do gracza nie wspominaj bezpośrednio o wartości statystyk. Postaraj się być jak najbardziej obrazowy. Znaczenie parametru kariera (zdolność do zarabiana pieniędy)"""
 
+    narrative_memory_prompt: str = """Streść dotychczasową historię gracza w maksymalnie {max_words} słowach
+Dotychczasowe streszczenie to {summary}
+Historie z kolejnych pięcioletnich okresów to {turn_descriptions}
+Zachowaj najważniejsze wydarzenia i decyzje. Zwróć odpowiedź w języku polskim zwracając się bezpośrednio do gracza"""
+
+    narrative_fragment_prompt: str = """Napisz wariant {variant} jednego lub dwóch zdań opowieści o pięciu latach życia gracza na etapie życia {stage} z 3, w których gracz wybrał {choice}
+Zwróć odpowiedź w języku polskim zwracając się bezpośrednio do gracza nie wspominaj bezpośrednio o wartości statystyk. Postaraj się być jak najbardziej obrazowy"""
+
     @model_validator(mode="after")
     def verify_n_actions(self) -> Self:
         if self.n_big_actions == self.n_big_actions + self.n_small_actions:
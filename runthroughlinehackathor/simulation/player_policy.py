@@ -0,0 +1,26 @@
+import random
+from collections.abc import Callable
+
+from runthroughlinehackathor.action_selection.reference_index import (
+    ActionReference,
+)
+from runthroughlinehackathor.models.state import State
+from runthroughlinehackathor.settings import settings
+
+PlayerPolicy = Callable[[State], list[ActionReference]]
+
+
+def random_policy(state: State) -> list[ActionReference]:
+    """Pick a random reaction, a random big action and fill the turn."""
+    reaction = random.choice(state.random_event.reactions)
+    big_action = random.choice(state.big_actions)
+    remaining_time = settings.time_pre_turn - big_action.time_cost
+    small_actions = random.sample(
+        state.small_actions, len(state.small_actions)
+    )
+    references: list[ActionReference] = [reaction.id, big_action.name]
+    for small_action in small_actions:
+        if small_action.time_cost <= remaining_time:
+            references.append(small_action.name)
+            remaining_time -= small_action.time_cost
+    return references
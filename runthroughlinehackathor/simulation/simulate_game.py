@@ -0,0 +1,237 @@
+import random
+import uuid
+from collections.abc import Sequence
+
+import numpy as np
+from pydantic import BaseModel
+from runthroughlinehackathor.action_selection.random_event_pool import (
+    RandomEventPool,
+)
+from runthroughlinehackathor.action_selection.random_events_list import (
+    random_events,
+)
+from runthroughlinehackathor.action_selection.reference_index import (
+    ActionReference,
+)
+from runthroughlinehackathor.action_selection.reference_index import (
+    reference_index,
+)
+from runthroughlinehackathor.action_selection.select_actions import (
+    ActionWeighter,
+)
+from runthroughlinehackathor.action_selection.select_actions import (
+    get_valid_actions,
+)
+from runthroughlinehackathor.action_selection.select_actions import (
+    sample_actions,
+)
+from runthroughlinehackathor.action_selection.select_actions import (
+    uniform_weighter,
+)
+from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.models.gender import Gender
+from runthroughlinehackathor.models.parameters import Parameters
+from runthroughlinehackathor.models.stage import Stage
+from runthroughlinehackathor.models.state import HistoryElement
+from runthroughlinehackathor.models.state import State
+from runthroughlinehackathor.settings import settings
+from runthroughlinehackathor.simulation.player_policy import PlayerPolicy
+from runthroughlinehackathor.simulation.player_policy import random_policy
+from runthroughlinehackathor.state_update.apply_turn import (
+    apply_chosen_actions,
+)
+from runthroughlinehackathor.state_update.apply_turn import (
+    apply_stage_transition,
+)
+from runthroughlinehackathor.state_update.apply_turn import (
+    detect_stage_transition,
+)
+from runthroughlinehackathor.state_update.apply_turn import is_game_lost
+from runthroughlinehackathor.state_update.apply_turn import (
+    regenerate_parameters,
+)
+from runthroughlinehackathor.state_update.batch_apply_turn import (
+    batch_apply_turn,
+)
+from runthroughlinehackathor.state_update.batch_apply_turn import BatchState
+from runthroughlinehackathor.state_update.batch_apply_turn import (
+    load_catalog_matrix,
+)
+
+
+class GameResult(BaseModel):
+    state: State
+    offered_action_names: set[str]
+
+
+def simulate_game(
+    gender: Gender,
+    policy: PlayerPolicy = random_policy,
+    weighter: ActionWeighter = uniform_weighter,
+) -> GameResult:
+    """
+    Play a whole game without HTTP or LLM calls.
+
+    Follows the rules of create_new_game and update_state, skipping the
+    narrative generation.
+    """
+    random_event_pool = RandomEventPool(random_events)
+    offered_action_names: set[str] = set()
+    state = _start_game(
+        gender, random_event_pool, offered_action_names, weighter
+    )
+    while not state.is_game_finished:
+        spent_time = apply_chosen_actions(
+            state, reference_index.resolve(policy(state))
+        )
+        if is_game_lost(state):
+            state.is_game_finished = True
+            state.did_user_win = False
+            break
+        regenerate_parameters(state, spent_time)
+        _advance_turn(state, random_event_pool, offered_action_names, weighter)
+    return GameResult(state=state, offered_action_names=offered_action_names)
+
+
+def simulate_game_batch(
+    genders: Sequence[Gender],
+    policy: PlayerPolicy = random_policy,
+    weighter: ActionWeighter = uniform_weighter,
+) -> list[GameResult]:
+    """
+    Play many games turn by turn together, like simulate_game.
+
+    Chosen actions are applied to all games at once with batch_apply_turn.
+    Games that fail on a ValueError or IndexError, e.g. when too few
+    actions are valid, are left out of the results.
+    """
+    catalog_matrix = load_catalog_matrix()
+    random_event_pools: list[RandomEventPool] = []
+    offered_action_names: list[set[str]] = []
+    states: list[State] = []
+    for gender in genders:
+        random_event_pool = RandomEventPool(random_events)
+        offered: set[str] = set()
+        try:
+            states.append(
+                _start_game(gender, random_event_pool, offered, weighter)
+            )
+        except (ValueError, IndexError):
+            continue
+        random_event_pools.append(random_event_pool)
+        offered_action_names.append(offered)
+    batch_state = BatchState.from_states(states)
+    is_failed = np.zeros(len(states), dtype=bool)
+    while not batch_state.is_game_finished.all():
+        playing = np.flatnonzero(~batch_state.is_game_finished)
+        references_per_game: list[list[ActionReference]] = [[]] * len(states)
+        for game in playing:
+            try:
+                references_per_game[game] = policy(states[game])
+            except (ValueError, IndexError):
+                is_failed[game] = batch_state.is_game_finished[game] = True
+        chosen_rows = catalog_matrix.encode(references_per_game)
+        batch_turn = batch_apply_turn(batch_state, chosen_rows, catalog_matrix)
+        for game in playing[~is_failed[playing]]:
+            state = states[game]
+            state.history.extend(
+                catalog_matrix.items[row]
+                for row in chosen_rows[game, batch_turn.is_applied[game]]
+            )
+            state.parameters = batch_state.get_parameters(game)
+            if batch_turn.is_lost[game]:
+                state.is_game_finished = True
+                state.did_user_win = False
+                continue
+            try:
+                _advance_turn(
+                    state,
+                    random_event_pools[game],
+                    offered_action_names[game],
+                    weighter,
+                )
+            except (ValueError, IndexError):
+                is_failed[game] = batch_state.is_game_finished[game] = True
+                continue
+            batch_state.is_game_finished[game] = state.is_game_finished
+    return [
+        GameResult(state=state, offered_action_names=offered)
+        for state, offered, failed in zip(
+            states, offered_action_names, is_failed
+        )
+        if not failed
+    ]
+
+
+def _start_game(
+    gender: Gender,
+    random_event_pool: RandomEventPool,
+    offered_action_names: set[str],
+    weighter: ActionWeighter,
+) -> State:
+    current_stage = Stage.FIRST
+    parameters = Parameters(
+        health=settings.initial_health,
+        career=settings.initial_other_parameters,
+        relations=settings.initial_other_parameters,
+        money=settings.initial_other_parameters,
+    )
+    actions = _select_actions([], current_stage, parameters, weighter)
+    random_event = random_event_pool.draw(current_stage)
+    state = State(
+        id=uuid.UUID(int=random.getrandbits(128)),
+        parameters=parameters,
+        history=[random_event],
+        turn_descriptions=[""],
+        current_stage=current_stage,
+        game_turn=0,
+        gender=gender,
+        goal="",
+        name="",
+        big_actions=[],
+        small_actions=[],
+        random_event=random_event,
+    )
+    _offer_actions(state, actions, offered_action_names)
+    return state
+
+
+def _advance_turn(
+    state: State,
+    random_event_pool: RandomEventPool,
+    offered_action_names: set[str],
+    weighter: ActionWeighter,
+) -> None:
+    actions = _select_actions(
+        state.history, state.current_stage, state.parameters, weighter
+    )
+    transition = detect_stage_transition(state, state.game_turn + 1)
+    state.random_event = random_event_pool.draw(transition.current_stage)
+    state.history.append(state.random_event)
+    _offer_actions(state, actions, offered_action_names)
+    state.game_turn += 1
+    apply_stage_transition(state, transition)
+
+
+def _select_actions(
+    history: list[HistoryElement],
+    current_stage: Stage,
+    parameters: Parameters,
+    weighter: ActionWeighter,
+) -> list[Action]:
+    valid_actions = get_valid_actions(history, current_stage)
+    return sample_actions(
+        valid_actions, weighter(parameters, history, valid_actions)
+    )
+
+
+def _offer_actions(
+    state: State, actions: list[Action], offered_action_names: set[str]
+) -> None:
+    state.big_actions = list(
+        a for a in actions if a.time_cost > settings.small_action_max_cost
+    )
+    state.small_actions = list(
+        a for a in actions if a.time_cost <= settings.small_action_max_cost
+    )
+    offered_action_names.update(a.name for a in actions)
@@ -0,0 +1,190 @@
+import argparse
+import json
+import random
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any
+from typing import Optional
+
+import numpy as np
+from pydantic import BaseModel
+from pydantic import ConfigDict
+from runthroughlinehackathor.action_selection.action_list import action_list
+from runthroughlinehackathor.action_selection.select_actions import (
+    ActionWeighter,
+)
+from runthroughlinehackathor.action_selection.select_actions import (
+    uniform_weighter,
+)
+from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.models.gender import Gender
+from runthroughlinehackathor.models.parameters import PARAMETER_NAMES
+from runthroughlinehackathor.simulation.player_policy import PlayerPolicy
+from runthroughlinehackathor.simulation.player_policy import random_policy
+from runthroughlinehackathor.simulation.simulate_game import (
+    simulate_game_batch,
+)
+
+
+class SimulationStatistics(BaseModel):
+    """Per-game outcomes and per-action counts stored as NumPy columns."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    action_names: tuple[str, ...]
+    did_user_win: np.ndarray
+    is_happy: np.ndarray
+    game_turn: np.ndarray
+    parameters: np.ndarray
+    n_games_offered: np.ndarray
+    n_games_chosen: np.ndarray
+    n_failed_games: int = 0
+
+    @property
+    def n_games(self) -> int:
+        return len(self.did_user_win)
+
+    @property
+    def loss_rate(self) -> float:
+        return float(np.mean(~self.did_user_win)) if self.n_games else 0.0
+
+    @property
+    def happy_rate(self) -> float:
+        return float(np.mean(self.is_happy)) if self.n_games else 0.0
+
+    @property
+    def action_reachability(self) -> np.ndarray:
+        return self.n_games_offered / max(self.n_games, 1)
+
+    @classmethod
+    def concatenate(
+        cls, chunks: Iterable["SimulationStatistics"]
+    ) -> "SimulationStatistics":
+        chunks = tuple(chunks)
+        return cls(
+            action_names=chunks[0].action_names,
+            did_user_win=np.concatenate([c.did_user_win for c in chunks]),
+            is_happy=np.concatenate([c.is_happy for c in chunks]),
+            game_turn=np.concatenate([c.game_turn for c in chunks]),
+            parameters=np.concatenate([c.parameters for c in chunks]),
+            n_games_offered=sum(c.n_games_offered for c in chunks),
+            n_games_chosen=sum(c.n_games_chosen for c in chunks),
+            n_failed_games=sum(c.n_failed_games for c in chunks),
+        )
+
+    def summary(self) -> dict[str, Any]:
+        n_games = max(self.n_games, 1)
+        return {
+            "n_games": self.n_games,
+            "n_failed_games": self.n_failed_games,
+            "loss_rate": self.loss_rate,
+            "happy_rate": self.happy_rate,
+            "mean_game_turn": float(self.game_turn.sum() / n_games),
+            "mean_parameters": dict(
+                zip(
+                    PARAMETER_NAMES,
+                    (self.parameters.sum(axis=0) / n_games).tolist(),
+                )
+            ),
+            "action_reachability": dict(
+                zip(self.action_names, self.action_reachability.tolist())
+            ),
+            "action_choice_rate": dict(
+                zip(
+                    self.action_names, (self.n_games_chosen / n_games).tolist()
+                )
+            ),
+        }
+
+
+def simulate_games(
+    n_games: int,
+    n_workers: int = 1,
+    policy: PlayerPolicy = random_policy,
+    weighter: ActionWeighter = uniform_weighter,
+    seed: Optional[int] = None,
+    chunk_size: int = 1000,
+) -> SimulationStatistics:
+    """
+    Play n_games headless games split into chunks over a process pool.
+
+    Policy and weighter must be picklable, e.g. module level functions.
+    """
+    seed = random.randrange(2**32) if seed is None else seed
+    chunk_sizes = [
+        min(chunk_size, n_games - start)
+        for start in range(0, n_games, chunk_size)
+    ]
+    simulate_chunk = partial(_simulate_chunk, policy=policy, weighter=weighter)
+    seeds = [seed + index for index in range(len(chunk_sizes))]
+    if n_workers == 1:
+        chunks = map(simulate_chunk, chunk_sizes, seeds)
+        return SimulationStatistics.concatenate(chunks)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        chunks = executor.map(simulate_chunk, chunk_sizes, seeds)
+        return SimulationStatistics.concatenate(chunks)
+
+
+def _simulate_chunk(
+    n_games: int,
+    seed: int,
+    policy: PlayerPolicy,
+    weighter: ActionWeighter,
+) -> SimulationStatistics:
+    random.seed(seed)
+    name_to_column = {a.name: column for column, a in enumerate(action_list)}
+    did_user_win = np.zeros(n_games, dtype=bool)
+    is_happy = np.zeros(n_games, dtype=bool)
+    game_turn = np.zeros(n_games, dtype=np.int32)
+    parameters = np.zeros((n_games, len(PARAMETER_NAMES)), dtype=np.int32)
+    n_games_offered = np.zeros(len(action_list), dtype=np.int64)
+    n_games_chosen = np.zeros(len(action_list), dtype=np.int64)
+    results = simulate_game_batch(
+        [random.choice(tuple(Gender)) for _ in range(n_games)],
+        policy,
+        weighter,
+    )
+    for game, result in enumerate(results):
+        state = result.state
+        did_user_win[game] = state.did_user_win
+        is_happy[game] = state.is_happy
+        game_turn[game] = state.game_turn
+        parameters[game] = [
+            getattr(state.parameters, name) for name in PARAMETER_NAMES
+        ]
+        n_games_offered[
+            [name_to_column[name] for name in result.offered_action_names]
+        ] += 1
+        n_games_chosen[
+            list(
+                {
+                    name_to_column[elem.name]
+                    for elem in state.history
+                    if isinstance(elem, Action)
+                }
+            )
+        ] += 1
+    n_played_games = len(results)
+    return SimulationStatistics(
+        action_names=tuple(name_to_column),
+        did_user_win=did_user_win[:n_played_games],
+        is_happy=is_happy[:n_played_games],
+        game_turn=game_turn[:n_played_games],
+        parameters=parameters[:n_played_games],
+        n_games_offered=n_games_offered,
+        n_games_chosen=n_games_chosen,
+        n_failed_games=n_games - n_played_games,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a balance sweep")
+    parser.add_argument("--n-games", type=int, default=10_000)
+    parser.add_argument("--n-workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    statistics = simulate_games(
+        args.n_games, n_workers=args.n_workers, seed=args.seed
+    )
+    print(json.dumps(statistics.summary(), indent=2, ensure_ascii=False))
@@ -0,0 +1,108 @@
+from collections.abc import Iterable
+from itertools import filterfalse
+from math import floor
+from typing import Optional
+from typing import Union
+
+from pydantic import BaseModel
+from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.models.action.reaction import Reaction
+from runthroughlinehackathor.models.stage import Stage
+from runthroughlinehackathor.models.state import State
+from runthroughlinehackathor.settings import settings
+from runthroughlinehackathor.state_update.apply_action import apply_action
+
+
+def apply_chosen_actions(
+    state: State, chosen_actions: Iterable[Union[Action, Reaction]]
+) -> int:
+    chosen_actions = tuple(chosen_actions)
+    for action in filterfalse(Action.__instancecheck__, chosen_actions):
+        apply_action(state, action)
+    spent_time = 0
+    for action in filter(Action.__instancecheck__, chosen_actions):
+        if spent_time + action.time_cost <= settings.time_pre_turn:
+            apply_action(state, action)
+        else:
+            break
+    return spent_time
+
+
+def is_game_lost(state: State) -> bool:
+    return any(
+        parameter_value < 0
+        for parameter_value in state.parameters.model_dump().values()
+    )
+
+
+def regenerate_parameters(state: State, spent_time: int) -> None:
+    remaining_time = settings.time_pre_turn - spent_time
+    state.parameters.health = min(
+        settings.MAX_PARAMETER_VALUE,
+        state.parameters.health
+        + settings.health_per_time_spent * remaining_time,
+    )
+    state.parameters.money = min(
+        settings.MAX_PARAMETER_VALUE,
+        state.parameters.money
+        + floor(
+            settings.career_to_money_coefficient * state.parameters.career
+        ),
+    )
+
+
+class StageTransition(BaseModel):
+    current_stage: Stage
+    completed_stage: Optional[Stage] = None
+    is_game_finished: bool = False
+
+
+def detect_stage_transition(state: State, game_turn: int) -> StageTransition:
+    """
+    Find the stage the state moves to once it reaches the given game turn.
+
+    Depends only on the turn, gender and current stage, so it can be known
+    before any turn output is generated.
+    """
+    age = game_turn * settings.years_per_turn + settings.initial_age
+    if age >= settings.end_age[state.gender]:
+        return StageTransition(
+            current_stage=state.current_stage,
+            completed_stage=Stage.THIRD,
+            is_game_finished=True,
+        )
+    if game_turn >= settings.stage_three_step:
+        return StageTransition(
+            current_stage=Stage.THIRD,
+            completed_stage=(
+                Stage.SECOND if state.current_stage == Stage.SECOND else None
+            ),
+        )
+    if game_turn >= settings.stage_two_step:
+        return StageTransition(
+            current_stage=Stage.SECOND,
+            completed_stage=(
+                Stage.FIRST if state.current_stage == Stage.FIRST else None
+            ),
+        )
+    return StageTransition(current_stage=state.current_stage)
+
+
+def apply_stage_transition(
+    state: State, transition: StageTransition
+) -> Optional[Stage]:
+    state.current_stage = transition.current_stage
+    if transition.is_game_finished:
+        state.is_game_finished = True
+    return transition.completed_stage
+
+
+def advance_stage(state: State) -> Optional[Stage]:
+    """
+    Move the state to the stage matching its game turn.
+
+    Returns the stage that has just been completed, if any.
+    """
+    return apply_stage_transition(
+        state, detect_stage_transition(state, state.game_turn)
+    )
@@ -0,0 +1,201 @@
+from collections.abc import Iterable
+from collections.abc import Mapping
+from collections.abc import Sequence
+from functools import cache
+from typing import Optional
+from typing import Self
+from typing import Union
+
+import numpy as np
+from pydantic import BaseModel
+from pydantic import ConfigDict
+from runthroughlinehackathor.action_selection.action_list import (
+    load_action_list,
+)
+from runthroughlinehackathor.action_selection.random_events_list import (
+    load_reactions,
+)
+from runthroughlinehackathor.action_selection.reference_index import (
+    ActionReference,
+)
+from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.models.action.reaction import Reaction
+from runthroughlinehackathor.models.parameters import PARAMETER_NAMES
+from runthroughlinehackathor.models.parameters import Parameters
+from runthroughlinehackathor.models.state import State
+from runthroughlinehackathor.settings import settings
+
+
+class CatalogMatrix(BaseModel):
+    """Parameter changes and time costs of the catalog, one row per item."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    reference_to_row: Mapping[ActionReference, int]
+    items: tuple[Union[Action, Reaction], ...]
+    parameter_changes: np.ndarray
+    time_costs: np.ndarray
+    is_reaction: np.ndarray
+
+    @classmethod
+    def from_catalog(
+        cls,
+        name_to_action: Mapping[str, Action],
+        reactions: Mapping[int, Reaction],
+    ) -> Self:
+        references = {**reactions, **name_to_action}
+        return cls(
+            reference_to_row={
+                reference: row for row, reference in enumerate(references)
+            },
+            items=tuple(references.values()),
+            parameter_changes=np.array(
+                [
+                    [getattr(a.parameter_change, n) for n in PARAMETER_NAMES]
+                    for a in references.values()
+                ],
+                dtype=np.int64,
+            ),
+            time_costs=np.array(
+                [getattr(a, "time_cost", 0) for a in references.values()],
+                dtype=np.int64,
+            ),
+            is_reaction=np.array(
+                [isinstance(a, Reaction) for a in references.values()]
+            ),
+        )
+
+    def encode(
+        self, references_per_game: Sequence[Iterable[ActionReference]]
+    ) -> np.ndarray:
+        """
+        Encode chosen references as an (N, K) matrix of catalog rows.
+
+        Rows are ordered reactions first, like ReferenceIndex.resolve, and
+        padded with -1.
+        """
+        rows_per_game = [
+            sorted(
+                map(self.reference_to_row.__getitem__, references),
+                key=lambda row: not self.is_reaction[row],
+            )
+            for references in references_per_game
+        ]
+        chosen_rows = np.full(
+            (
+                len(rows_per_game),
+                max(map(len, rows_per_game), default=0),
+            ),
+            -1,
+            dtype=np.int64,
+        )
+        for game, rows in enumerate(rows_per_game):
+            chosen_rows[game, : len(rows)] = rows
+        return chosen_rows
+
+
+class BatchState(BaseModel):
+    """Parameters of N games as an (N, 4) array with their end flags."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    parameters: np.ndarray
+    is_game_finished: np.ndarray
+    did_user_win: np.ndarray
+
+    @classmethod
+    def from_states(cls, states: Sequence[State]) -> Self:
+        return cls(
+            parameters=np.array(
+                [
+                    [getattr(s.parameters, n) for n in PARAMETER_NAMES]
+                    for s in states
+                ],
+                dtype=np.int64,
+            ).reshape(len(states), len(PARAMETER_NAMES)),
+            is_game_finished=np.array(
+                [s.is_game_finished for s in states], dtype=bool
+            ),
+            did_user_win=np.array(
+                [s.did_user_win for s in states], dtype=bool
+            ),
+        )
+
+    def get_parameters(self, game: int) -> Parameters:
+        return Parameters(
+            **dict(zip(PARAMETER_NAMES, self.parameters[game].tolist()))
+        )
+
+
+@cache
+def load_catalog_matrix() -> CatalogMatrix:
+    return CatalogMatrix.from_catalog(
+        {a.name: a for a in load_action_list()}, load_reactions()
+    )
+
+
+class BatchTurn(BaseModel):
+    """Outcome of batch_apply_turn for N games and K chosen rows."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    is_lost: np.ndarray
+    is_applied: np.ndarray
+
+
+_HEALTH = PARAMETER_NAMES.index("health")
+_MONEY = PARAMETER_NAMES.index("money")
+_CAREER = PARAMETER_NAMES.index("career")
+
+
+def batch_apply_turn(
+    batch_state: BatchState,
+    chosen_rows: np.ndarray,
+    catalog: Optional[CatalogMatrix] = None,
+) -> BatchTurn:
+    """
+    Apply one turn to every unfinished game in place.
+
+    Mirrors apply_chosen_actions, is_game_lost and regenerate_parameters,
+    clamping after every item as Parameters.__add__ does. Returns the games
+    lost in this turn and which of the chosen rows were applied.
+    """
+    catalog = load_catalog_matrix() if catalog is None else catalog
+    parameters = batch_state.parameters
+    is_active = ~batch_state.is_game_finished
+    spent_time = np.zeros(len(parameters), dtype=np.int64)
+    is_over_time = np.zeros(len(parameters), dtype=bool)
+    is_applied_per_row = np.zeros(chosen_rows.shape, dtype=bool)
+    for column in range(chosen_rows.shape[1]):
+        rows = chosen_rows[:, column]
+        is_chosen = is_active & (rows >= 0)
+        is_action = is_chosen & ~catalog.is_reaction[rows]
+        is_over_time |= is_action & (
+            spent_time + catalog.time_costs[rows] > settings.time_pre_turn
+        )
+        is_applied = is_chosen & ~(is_action & is_over_time)
+        is_applied_per_row[:, column] = is_applied
+        parameters[is_applied] = np.minimum(
+            settings.MAX_PARAMETER_VALUE,
+            parameters[is_applied]
+            + catalog.parameter_changes[rows[is_applied]],
+        )
+    is_lost = is_active & (parameters < 0).any(axis=1)
+    batch_state.is_game_finished |= is_lost
+    batch_state.did_user_win &= ~is_lost
+    is_regenerated = is_active & ~is_lost
+    remaining_time = settings.time_pre_turn - spent_time[is_regenerated]
+    parameters[is_regenerated, _HEALTH] = np.minimum(
+        settings.MAX_PARAMETER_VALUE,
+        parameters[is_regenerated, _HEALTH]
+        + settings.health_per_time_spent * remaining_time,
+    )
+    parameters[is_regenerated, _MONEY] = np.minimum(
+        settings.MAX_PARAMETER_VALUE,
+        parameters[is_regenerated, _MONEY]
+        + np.floor(
+            settings.career_to_money_coefficient
+            * parameters[is_regenerated, _CAREER]
+        ).astype(np.int64),
+    )
+    return BatchTurn(is_lost=is_lost, is_applied=is_applied_per_row)
@@ -0,0 +1,91 @@
+from collections import Counter
+from collections.abc import Sequence
+
+from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.models.action.reaction import Reaction
+from runthroughlinehackathor.models.parameters import PARAMETER_NAMES
+from runthroughlinehackathor.models.random_event import RandomEvent
+from runthroughlinehackathor.models.state import HistoryElement
+from runthroughlinehackathor.settings import settings
+
+_PARAMETER_LABELS = {
+    "career": "kariera",
+    "relations": "relacje",
+    "health": "zdrowie",
+    "money": "pieniądze",
+}
+
+
+def history_timeline(
+    history: Sequence[HistoryElement], first_turn: int = 1
+) -> str:
+    """
+    Describe the history as one compact line per turn.
+
+    Every line names the random event, the reaction and the actions of the
+    turn, with repeated actions counted, followed by the summed parameter
+    change. The oldest turns are left out once the timeline exceeds
+    prompt_history_token_budget.
+    """
+    lines = [
+        _format_turn(turn, elements)
+        for turn, elements in enumerate(_split_turns(history), first_turn)
+    ]
+    max_characters = int(
+        settings.prompt_history_token_budget * settings.characters_per_token
+    )
+    n_characters = 0
+    for n_kept, line in enumerate(reversed(lines)):
+        n_characters += len(line) + 1
+        if n_characters > max_characters:
+            kept_lines = lines[len(lines) - n_kept :] or [
+                line[:max_characters]
+            ]
+            n_omitted = len(lines) - len(kept_lines)
+            return "\n".join(
+                [f"({n_omitted} wcześniejszych tur pominięto)", *kept_lines]
+            )
+    return "\n".join(lines)
+
+
+def _split_turns(
+    history: Sequence[HistoryElement],
+) -> list[list[HistoryElement]]:
+    turns: list[list[HistoryElement]] = []
+    for element in history:
+        if isinstance(element, RandomEvent) or not turns:
+            turns.append([])
+        turns[-1].append(element)
+    return turns
+
+
+def _format_turn(turn: int, elements: list[HistoryElement]) -> str:
+    parts = []
+    parameter_change = dict.fromkeys(PARAMETER_NAMES, 0)
+    action_counts: Counter[str] = Counter()
+    for element in elements:
+        if isinstance(element, RandomEvent):
+            parts.append(f"wydarzenie „{element.name}”")
+            continue
+        if isinstance(element, Reaction):
+            parts.append(f"reakcja: {element.description}")
+        elif isinstance(element, Action):
+            action_counts[element.name] += 1
+        for name in PARAMETER_NAMES:
+            parameter_change[name] += getattr(element.parameter_change, name)
+    if action_counts:
+        parts.append(
+            "akcje: "
+            + ", ".join(
+                name if count == 1 else f"{name} ×{count}"
+                for name, count in action_counts.items()
+            )
+        )
+    changes = ", ".join(
+        f"{_PARAMETER_LABELS[name]} {change:+d}"
+        for name, change in parameter_change.items()
+        if change
+    )
+    if changes:
+        parts.append(f"zmiana: {changes}")
+    return f"Tura {turn}: " + "; ".join(parts)
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from collections.abc import Sequence
+from uuid import UUID
+
+from pydantic import BaseModel
+from pydantic import NonNegativeInt
+from runthroughlinehackathor.llm.invoke_llm import invoke_llm
+from runthroughlinehackathor.llm.prompt_type import PromptType
+from runthroughlinehackathor.models.state import State
+from runthroughlinehackathor.settings import settings
+
+_logger = logging.getLogger(__name__)
+
+
+class _GameMemory(BaseModel):
+    summary: str = ""
+    n_summarized: NonNegativeInt = 1
+
+
+class NarrativeMemory:
+    """
+    Bounded rolling summary of the earlier turn descriptions of each game.
+
+    The summary is extended in the background after every turn, so turn
+    description prompts only carry the summary, the descriptions it does
+    not cover yet and the last turn, cut down to token_budget. The initial
+    description is an introduction to the game and is never summarized.
+    Finished games are forgotten.
+    """
+
+    def __init__(self, token_budget: int, characters_per_token: float):
+        self.token_budget = token_budget
+        self.characters_per_token = characters_per_token
+        self.memories: dict[UUID, _GameMemory] = {}
+        self._updates: dict[UUID, asyncio.Task] = {}
+
+    def context(self, state: State, turn_index: int) -> str:
+        """Describe the turns before turn_index within the token budget."""
+        memory = self.memories.get(state.id, _GameMemory())
+        n_summarized = min(memory.n_summarized, turn_index - 1)
+        parts = [
+            memory.summary,
+            *state.turn_descriptions[max(n_summarized, 0) : turn_index],
+        ]
+        return _fit_to_budget(
+            [part for part in parts if part],
+            int(self.token_budget * self.characters_per_token),
+        )
+
+    def schedule_update(self, state: State, turn_index: int) -> None:
+        """Summarize the descriptions before turn_index in the background."""
+        if state.is_game_finished:
+            return
+        update = self._updates.get(state.id)
+        if update is not None and not update.done():
+            return
+        memory = self.memories.get(state.id, _GameMemory())
+        if memory.n_summarized >= turn_index:
+            return
+        self._updates[state.id] = asyncio.create_task(
+            self._update(state, memory, turn_index)
+        )
+
+    def forget(self, state_id: UUID) -> None:
+        """Drop the summary of a game and cancel its pending update."""
+        self.memories.pop(state_id, None)
+        update = self._updates.pop(state_id, None)
+        if update is not None:
+            update.cancel()
+
+    async def _update(
+        self, state: State, memory: _GameMemory, turn_index: int
+    ) -> None:
+        max_summary_words = self.token_budget // 2 * 3 // 4
+        try:
+            summary = await invoke_llm(
+                PromptType.NARRATIVE_MEMORY,
+                settings.narrative_memory_prompt.format(
+                    summary=memory.summary,
+                    turn_descriptions="\n\n".join(
+                        state.turn_descriptions[
+                            memory.n_summarized : turn_index
+                        ]
+                    ),
+                    max_words=max_summary_words,
+                ),
+                state_id=state.id,
+            )
+        except Exception:
+            _logger.exception("Narrative memory update failed")
+            return
+        finally:
+            self._updates.pop(state.id, None)
+        self.memories[state.id] = _GameMemory(
+            summary=summary, n_summarized=turn_index
+        )
+
+
+def _fit_to_budget(parts: Sequence[str], max_characters: int) -> str:
+    """Keep the newest parts, cutting the oldest kept part from its start."""
+    kept = []
+    remaining = max_characters
+    for part in reversed(parts):
+        if remaining <= 0:
+            break
+        kept.append(part[-remaining:])
+        remaining -= len(part) + 2
+    return "\n\n".join(reversed(kept))
+
+
+narrative_memory = NarrativeMemory(
+    token_budget=settings.narrative_memory_token_budget,
+    characters_per_token=settings.characters_per_token,
+)
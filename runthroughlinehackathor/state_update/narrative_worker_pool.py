@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+import logging
+from collections.abc import Awaitable
+from collections.abc import Callable
+from enum import Enum
+from typing import Optional
+from uuid import UUID
+
+from pydantic import BaseModel
+from pydantic import NonNegativeInt
+from runthroughlinehackathor.settings import settings
+
+_logger = logging.getLogger(__name__)
+
+
+class NarrativeStatus(str, Enum):
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Narrative(BaseModel):
+    state_id: UUID
+    game_turn: NonNegativeInt
+    status: NarrativeStatus = NarrativeStatus.PENDING
+    turn_description: Optional[str] = None
+    stage_summary: Optional[str] = None
+
+
+NarrativeGenerator = Callable[[Narrative], Awaitable[None]]
+
+
+class NarrativeWorkerPool:
+    """
+    Bounded pool of background workers generating turn narratives.
+
+    Jobs are queued in submission order and jobs of one game run one after
+    another, so a turn description can use the descriptions of the previous
+    turns. Submitting waits while the queue is full. Only the latest turn of
+    a game is kept once the earlier ones are generated. Another job for the
+    latest turn, like the narrative of a lost game, extends its narrative.
+    """
+
+    def __init__(self, n_workers: int, max_queue_size: int):
+        self.n_workers = n_workers
+        self.narratives: dict[tuple[UUID, int], Narrative] = {}
+        self._max_queue_size = max_queue_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._done: dict[tuple[UUID, int], asyncio.Event] = {}
+        self._last_game_turn: dict[UUID, int] = {}
+        self._n_unfinished: dict[UUID, int] = {}
+
+    async def submit(
+        self, state_id: UUID, game_turn: int, generate: NarrativeGenerator
+    ) -> Narrative:
+        if self._loop is not asyncio.get_running_loop():
+            self._start()
+        key = (state_id, game_turn)
+        previous_key = (state_id, self._last_game_turn.get(state_id, -1))
+        previous_done = self._done.get(previous_key)
+        narrative = self.narratives.get(key) if previous_key == key else None
+        if narrative is None:
+            narrative = Narrative(state_id=state_id, game_turn=game_turn)
+            self.narratives[key] = narrative
+        else:
+            narrative.status = NarrativeStatus.PENDING
+        if (
+            previous_key != key
+            and previous_done is not None
+            and previous_done.is_set()
+        ):
+            self._evict(previous_key)
+        done = self._done[key] = asyncio.Event()
+        self._last_game_turn[state_id] = game_turn
+        self._n_unfinished[state_id] = self._n_unfinished.get(state_id, 0) + 1
+        await self._queue.put((key, previous_done, done, generate))
+        return narrative
+
+    def latest_game_turn(self, state_id: UUID) -> Optional[int]:
+        return self._last_game_turn.get(state_id)
+
+    def has_later_jobs(self, state_id: UUID) -> bool:
+        """Whether jobs of the game submitted after the running one wait."""
+        return self._n_unfinished.get(state_id, 0) > 1
+
+    async def wait(
+        self, state_id: UUID, game_turn: Optional[int], timeout: float
+    ) -> Optional[Narrative]:
+        """
+        Wait up to timeout seconds for the narrative of a game turn.
+
+        Without game_turn the latest submitted narrative of the game is used.
+        Returns None when no narrative was submitted for the turn.
+        """
+        if game_turn is None:
+            game_turn = self.latest_game_turn(state_id)
+        key = (state_id, game_turn)
+        done = self._done.get(key)
+        if done is None:
+            return None
+        narrative = self.narratives[key]
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except TimeoutError:
+            pass
+        return narrative
+
+    async def drain(self) -> None:
+        """Wait until every submitted narrative has been generated."""
+        if self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        # Workers started in another, possibly closed, loop are dropped
+        if self._loop is asyncio.get_running_loop():
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._loop = self._queue = None
+
+    def _start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self._max_queue_size)
+        self._done.clear()
+        self.narratives.clear()
+        self._last_game_turn.clear()
+        self._n_unfinished.clear()
+        self._workers = [
+            asyncio.create_task(self._work(), context=contextvars.Context())
+            for _ in range(self.n_workers)
+        ]
+
+    async def _work(self) -> None:
+        while True:
+            key, previous_done, done, generate = await self._queue.get()
+            if previous_done is not None:
+                await previous_done.wait()
+            narrative = self.narratives[key]
+            try:
+                await generate(narrative)
+                narrative.status = NarrativeStatus.DONE
+            except Exception:
+                _logger.exception("Narrative generation failed")
+                narrative.status = NarrativeStatus.FAILED
+            finally:
+                self._n_unfinished[key[0]] -= 1
+                if not self._n_unfinished[key[0]]:
+                    del self._n_unfinished[key[0]]
+                done.set()
+                if self._last_game_turn.get(key[0]) != key[1]:
+                    self._evict(key)
+                self._queue.task_done()
+
+    def _evict(self, key: tuple[UUID, int]) -> None:
+        self.narratives.pop(key, None)
+        self._done.pop(key, None)
+
+
+narrative_worker_pool = NarrativeWorkerPool(
+    n_workers=settings.narrative_workers,
+    max_queue_size=settings.narrative_queue_size,
+)
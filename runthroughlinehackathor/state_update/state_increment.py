@@ -1,27 +1,50 @@
+from typing import Self
 from typing import Union
 from uuid import UUID
 
 from pydantic import BaseModel
-from runthroughlinehackathor.action_selection.action_list import name_to_action
-from runthroughlinehackathor.action_selection.random_events_list import (
-    reactions,
+from pydantic import model_validator
+from pydantic import PrivateAttr
+from runthroughlinehackathor.action_selection.reference_index import (
+    ActionReference,
+)
+from runthroughlinehackathor.action_selection.reference_index import (
+    reference_index,
 )
 from runthroughlinehackathor.models.action.action import Action
 from runthroughlinehackathor.models.action.reaction import Reaction
+from runthroughlinehackathor.models.state import State
 
 
 class StateIncrement(BaseModel):
     state_id: UUID
-    chosen_action_references: list[Union[str, int]]
+    chosen_action_references: list[ActionReference]
+    _chosen_actions: tuple[Union[Action, Reaction], ...] = PrivateAttr()
+
+    @model_validator(mode="after")
+    def resolve_references(self) -> Self:
+        self._chosen_actions = reference_index.resolve(
+            self.chosen_action_references
+        )
+        return self
 
     @property
     def chosen_actions(self) -> tuple[Union[Action, Reaction], ...]:
-        return tuple(
-            map(
-                {**name_to_action, **reactions}.__getitem__,
-                sorted(
-                    self.chosen_action_references,
-                    key=lambda reference: isinstance(reference, str),
-                ),
+        return self._chosen_actions
+
+    def verify_offered(self, state: State) -> None:
+        offered_references = {
+            *(a.name for a in state.big_actions),
+            *(a.name for a in state.small_actions),
+            *(r.id for r in state.random_event.reactions),
+        }
+        not_offered_references = [
+            r
+            for r in self.chosen_action_references
+            if r not in offered_references
+        ]
+        if not_offered_references:
+            raise ValueError(
+                f"References {not_offered_references} were not offered in"
+                f" state with id={state.id}"
             )
-        )
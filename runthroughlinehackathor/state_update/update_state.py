@@ -1,21 +1,58 @@
 import asyncio
 import logging
-from itertools import filterfalse
-from math import floor
+from typing import Optional
 
-from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
+from runthroughlinehackathor.action_selection.reference_index import (
+    ActionReference,
+)
+from runthroughlinehackathor.action_selection.reference_index import (
+    reference_index,
+)
 from runthroughlinehackathor.action_selection.select_actions import (
     select_actions,
 )
+from runthroughlinehackathor.action_selection.select_random_event import (
+    random_event_pools,
+)
 from runthroughlinehackathor.action_selection.select_random_event import (
     select_random_event,
 )
-from runthroughlinehackathor.models.action.action import Action
+from runthroughlinehackathor.llm.invoke_llm import invoke_llm
+from runthroughlinehackathor.llm.llm_admission import LlmOverloadedError
+from runthroughlinehackathor.llm.prompt_type import PromptType
+from runthroughlinehackathor.models.random_event import RandomEvent
 from runthroughlinehackathor.models.stage import Stage
 from runthroughlinehackathor.models.state import State
+from runthroughlinehackathor.monitoring.timing import timed
+from runthroughlinehackathor.narrative_library.compose_turn_description import (
+    compose_turn_description,
+)
 from runthroughlinehackathor.settings import settings
-from runthroughlinehackathor.state_update.apply_action import apply_action
+from runthroughlinehackathor.state_update.apply_turn import (
+    apply_chosen_actions,
+)
+from runthroughlinehackathor.state_update.apply_turn import (
+    apply_stage_transition,
+)
+from runthroughlinehackathor.state_update.apply_turn import (
+    detect_stage_transition,
+)
+from runthroughlinehackathor.state_update.apply_turn import is_game_lost
+from runthroughlinehackathor.state_update.apply_turn import (
+    regenerate_parameters,
+)
+from runthroughlinehackathor.state_update.history_timeline import (
+    history_timeline,
+)
+from runthroughlinehackathor.state_update.narrative_memory import (
+    narrative_memory,
+)
+from runthroughlinehackathor.state_update.narrative_worker_pool import (
+    Narrative,
+)
+from runthroughlinehackathor.state_update.narrative_worker_pool import (
+    narrative_worker_pool,
+)
 from runthroughlinehackathor.state_update.state_increment import StateIncrement
 
 previous_states = []
@@ -23,63 +60,92 @@ previous_states = []
 _logger = logging.getLogger(__name__)
 
 
-async def update_state(state: State, state_update: StateIncrement) -> None:
-    previous_states.append(state.model_copy(deep=True))
-    for action in filterfalse(
-        Action.__instancecheck__, state_update.chosen_actions
-    ):
-        apply_action(state, action)
-    spent_time = 0
-    for action in filter(
-        Action.__instancecheck__, state_update.chosen_actions
-    ):
-        if spent_time + action.time_cost <= settings.time_pre_turn:
-            apply_action(state, action)
-        else:
-            break
-    if any(
-        parameter_value < 0
-        for parameter_value in state.parameters.model_dump().values()
-    ):
+async def update_state(
+    state: State, state_update: StateIncrement, defer_narrative: bool = False
+) -> None:
+    """
+    Play one turn of the game.
+
+    With defer_narrative the turn description and stage summary are left
+    to narrative_worker_pool and the state is marked as narrative pending.
+    The state is marked as updating until the turn is applied, after which
+    its version is bumped.
+    """
+    with timed("previous_state_copy"):
+        previous_states.append(state.model_copy(deep=True))
+    state.is_updating = True
+    try:
+        await _play_turn(state, state_update, defer_narrative)
+    finally:
+        state.is_updating = False
+        state.version += 1
+
+
+async def _play_turn(
+    state: State, state_update: StateIncrement, defer_narrative: bool
+) -> None:
+    with timed("action_application"):
+        spent_time = apply_chosen_actions(state, state_update.chosen_actions)
+    if is_game_lost(state):
         state.is_game_finished = True
         state.did_user_win = False
-        state.stage_summary = (
-            await ChatOpenAI(
-                name="gpt-4o-mini", api_key=settings.openai_api_key
-            ).ainvoke(
-                [
-                    HumanMessage(
-                        settings.game_loss_prompt.format(
-                            parameters=state.parameters, history=state.history
-                        )
-                    )
-                ]
+        loss_prompt = settings.game_loss_prompt.format(
+            parameters=state.parameters,
+            history=history_timeline(state.history),
+        )
+        if defer_narrative:
+            await _defer_narrative(
+                state,
+                state.game_turn,
+                stage_summary_prompt=(PromptType.GAME_LOSS, loss_prompt),
             )
-        ).content
+        else:
+            state.stage_summary = await _generate_narrative(
+                state, PromptType.GAME_LOSS, loss_prompt
+            )
+        random_event_pools.pop(state.id, None)
+        narrative_memory.forget(state.id)
         return
-    remaining_time = settings.time_pre_turn - spent_time
-    state.parameters.health = min(
-        settings.MAX_PARAMETER_VALUE,
-        state.parameters.health
-        + settings.health_per_time_spent * remaining_time,
-    )
-    state.parameters.money = min(
-        settings.MAX_PARAMETER_VALUE,
-        state.parameters.money
-        + floor(
-            settings.career_to_money_coefficient * state.parameters.career
-        ),
+    regenerate_parameters(state, spent_time)
+    transition = detect_stage_transition(state, state.game_turn + 1)
+    random_event = await select_random_event(
+        state.history,
+        current_stage=transition.current_stage,
+        state_id=state.id,
     )
-    actions, random_event, turn_description = await asyncio.gather(
+    turn_index = len(state.turn_descriptions)
+    played_stage = state.current_stage
+    stage_summary_prompt = None
+    if transition.completed_stage is not None:
+        stage_summary_prompt = (
+            PromptType.STAGE_SUMMARY,
+            _stage_summary_prompt(
+                transition.completed_stage, state, random_event
+            ),
+        )
+    generations = [
         select_actions(
             history=state.history,
             current_stage=state.current_stage,
             parameters=state.parameters,
-        ),
-        select_random_event(state.history),
-        _generate_turn_description(state, state_update),
-    )
-    state.turn_descriptions.append(turn_description)
+            state_id=state.id,
+        )
+    ]
+    if not defer_narrative:
+        generations.append(
+            _generate_turn_description(
+                state,
+                state_update.chosen_action_references,
+                turn_index,
+                played_stage,
+            )
+        )
+        if stage_summary_prompt is not None:
+            generations.append(
+                _generate_narrative(state, *stage_summary_prompt)
+            )
+    actions, *narrative = await asyncio.gather(*generations)
+    state.turn_descriptions.append(narrative[0] if narrative else "")
     state.random_event = random_event
     state.history.append(random_event)
     state.big_actions = list(
@@ -89,20 +155,56 @@ async def update_state(state: State, state_update: StateIncrement) -> None:
         a for a in actions if a.time_cost <= settings.small_action_max_cost
     )
     state.game_turn += 1
-    if state.age >= settings.end_age[state.gender]:
-        state.stage_summary = await _generate_summary(Stage.THIRD, state)
-        state.is_game_finished = True
-    elif state.game_turn >= settings.stage_three_step:
-        if state.current_stage == Stage.SECOND:
-            state.stage_summary = await _generate_summary(Stage.SECOND, state)
-        state.current_stage = Stage.THIRD
-    elif state.game_turn >= settings.stage_two_step:
-        if state.current_stage == Stage.FIRST:
-            state.stage_summary = await _generate_summary(Stage.FIRST, state)
-        state.current_stage = Stage.SECOND
+    apply_stage_transition(state, transition)
+    if defer_narrative:
+        await _defer_narrative(
+            state,
+            state.game_turn,
+            chosen_action_references=state_update.chosen_action_references,
+            turn_index=turn_index,
+            stage=played_stage,
+            stage_summary_prompt=stage_summary_prompt,
+        )
+    elif stage_summary_prompt is not None:
+        state.stage_summary = narrative[1]
+    if state.is_game_finished:
+        random_event_pools.pop(state.id, None)
+        narrative_memory.forget(state.id)
 
 
-async def _generate_summary(previous_stage: Stage, state: State) -> str:
+async def _defer_narrative(
+    state: State,
+    game_turn: int,
+    chosen_action_references: Optional[list[ActionReference]] = None,
+    turn_index: Optional[int] = None,
+    stage: Optional[Stage] = None,
+    stage_summary_prompt: Optional[tuple[PromptType, str]] = None,
+) -> None:
+    async def generate(narrative: Narrative) -> None:
+        try:
+            if turn_index is not None:
+                turn_description = await _generate_turn_description(
+                    state, chosen_action_references, turn_index, stage
+                )
+                state.turn_descriptions[turn_index] = turn_description
+                narrative.turn_description = turn_description
+                state.version += 1
+            if stage_summary_prompt is not None:
+                state.stage_summary = narrative.stage_summary = (
+                    await _generate_narrative(state, *stage_summary_prompt)
+                )
+        finally:
+            if not narrative_worker_pool.has_later_jobs(state.id):
+                state.is_narrative_pending = False
+            state.version += 1
+
+    state.is_narrative_pending = True
+    await narrative_worker_pool.submit(state.id, game_turn, generate)
+
+
+def _stage_summary_prompt(
+    previous_stage: Stage, state: State, random_event: RandomEvent
+) -> str:
     previous_state: State = max(
         filter(
             lambda s: s.current_stage == previous_stage and s.id == state.id,
@@ -110,39 +212,60 @@ async def _generate_summary(previous_stage: Stage, state: State) -> str:
         ),
         key=lambda s: s.game_turn,
     )
-    return (
-        await ChatOpenAI(
-            name="gpt-4o-mini", api_key=settings.openai_api_key
-        ).ainvoke(
-            [
-                HumanMessage(
-                    settings.stage_summary_prompt.format(
-                        previous_parameters=previous_state.parameters,
-                        current_parameters=state.parameters,
-                        history_diff=state.history[
-                            len(previous_state.history) :
-                        ],
-                    )
-                )
-            ]
-        )
-    ).content
+    return settings.stage_summary_prompt.format(
+        previous_parameters=previous_state.parameters,
+        current_parameters=state.parameters,
+        history_diff=history_timeline(
+            [*state.history[len(previous_state.history) :], random_event],
+            first_turn=previous_state.game_turn + 1,
+        ),
+    )
 
 
 async def _generate_turn_description(
-    state: State, state_increment: StateIncrement
+    state: State,
+    chosen_action_references: list[ActionReference],
+    turn_index: int,
+    stage: Stage,
 ) -> str:
-    return (
-        await ChatOpenAI(
-            name="gpt-4o-mini", api_key=settings.openai_api_key
-        ).ainvoke(
-            [
-                HumanMessage(
-                    settings.turn_description_prompt.format(
-                        chosen_actions=state_increment.chosen_action_references,
-                        turn_descriptions=state.turn_descriptions,
-                    )
-                )
-            ]
+    if settings.narrative_source == "library":
+        return compose_turn_description(
+            reference_index.resolve(chosen_action_references), stage
         )
-    ).content
+    with timed(PromptType.TURN_DESCRIPTION.value):
+        try:
+            turn_description = await asyncio.wait_for(
+                invoke_llm(
+                    PromptType.TURN_DESCRIPTION,
+                    settings.turn_description_prompt.format(
+                        chosen_actions=chosen_action_references,
+                        turn_descriptions=narrative_memory.context(
+                            state, turn_index
+                        ),
+                    ),
+                    state_id=state.id,
+                ),
+                settings.narrative_llm_timeout_seconds,
+            )
+        except (LlmOverloadedError, TimeoutError):
+            _logger.warning(
+                "LLM overloaded or slow, composing turn description"
+            )
+            return compose_turn_description(
+                reference_index.resolve(chosen_action_references), stage
+            )
+    narrative_memory.schedule_update(state, turn_index)
+    return turn_description
+
+
+async def _generate_narrative(
+    state: State, prompt_type: PromptType, prompt: str
+) -> str:
+    with timed(prompt_type.value):
+        try:
+            return await invoke_llm(prompt_type, prompt, state_id=state.id)
+        except LlmOverloadedError:
+            _logger.warning("LLM overloaded, skipping %s", prompt_type.value)
+            if prompt_type == PromptType.GAME_LOSS:
+                return settings.overloaded_game_loss_narrative
+            return settings.overloaded_stage_summary_narrative
@@ -0,0 +1,21 @@
+from runthroughlinehackathor.action_selection.random_events_list import (
+    load_random_events,
+)
+from runthroughlinehackathor.action_selection.reference_index import (
+    reference_index,
+)
+from runthroughlinehackathor.catalog.catalog import load_catalog
+from runthroughlinehackathor.llm.invoke_llm import load_llm_client
+
+
+def warm_up() -> None:
+    """
+    Load what importing leaves for first use.
+
+    Downloads the catalogs, builds the lookups derived from them and
+    creates the LLM client. Blocks, so the app runs it in a worker thread.
+    """
+    load_random_events()
+    reference_index.load()
+    load_catalog()
+    load_llm_client()
@@ -1,9 +1,14 @@
 """Tests for action selection logic."""
 
 import unittest
+import uuid
+from unittest.mock import patch
 
 from runthroughlinehackathor.action_selection.action_list import action_list
 from runthroughlinehackathor.action_selection.action_list import name_to_action
+from runthroughlinehackathor.action_selection.random_event_pool import (
+    RandomEventPool,
+)
 from runthroughlinehackathor.action_selection.random_events_list import (
     random_events,
 )
@@ -16,11 +21,16 @@ from runthroughlinehackathor.action_selection.select_actions import (
 from runthroughlinehackathor.action_selection.select_actions import (
     select_actions,
 )
+from runthroughlinehackathor.action_selection.select_random_event import (
+    random_event_pools,
+)
 from runthroughlinehackathor.action_selection.select_random_event import (
     select_random_event,
 )
+from runthroughlinehackathor.llm.llm_admission import LlmOverloadedError
 from runthroughlinehackathor.models.action.action_type import ActionType
 from runthroughlinehackathor.models.parameters import Parameters
+from runthroughlinehackathor.models.random_event import RandomEvent
 from runthroughlinehackathor.models.stage import Stage
 from runthroughlinehackathor.settings import settings
 
@@ -186,6 +196,20 @@ class TestSelectActions(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(len(big_actions), settings.n_big_actions)
         self.assertEqual(len(small_actions), settings.n_small_actions)
 
+    async def test_select_actions_falls_back_when_llm_is_overloaded(self):
+        """Test that uniform weights are used when the LLM is overloaded."""
+        with patch(
+            "runthroughlinehackathor.action_selection.select_actions"
+            "._weight_actions_with_llm",
+            side_effect=LlmOverloadedError(1),
+        ):
+            actions = await select_actions(
+                [],
+                Stage.FIRST,
+                Parameters(career=40, relations=40, health=40, money=40),
+            )
+        self.assertEqual(len(actions), settings.n_actions)
+
 
 class TestSelectRandomEvent(unittest.IsolatedAsyncioTestCase):
     """Test cases for select_random_event function."""
@@ -223,6 +247,74 @@ class TestSelectRandomEvent(unittest.IsolatedAsyncioTestCase):
         event = await select_random_event([])
         self.assertIn(event, random_events)
 
+    async def test_select_random_event_does_not_repeat_for_state(self):
+        """Test that events drawn for one state are never drawn again."""
+        state_id = uuid.uuid4()
+        drawn = [
+            (
+                await select_random_event(
+                    [], current_stage=Stage.FIRST, state_id=state_id
+                )
+            ).name
+            for _ in range(len(random_events))
+        ]
+        self.assertEqual(len(set(drawn)), len(random_events))
+
+
+    async def test_least_recently_used_pools_are_dropped(self):
+        """Test that pools are kept for at most random_event_pool_max_games."""
+        state_ids = [uuid.uuid4() for _ in range(3)]
+        with patch.object(settings, "random_event_pool_max_games", 2):
+            for state_id in state_ids:
+                await select_random_event([], state_id=state_id)
+            await select_random_event([], state_id=state_ids[1])
+
+        self.assertEqual(
+            list(random_event_pools), [state_ids[2], state_ids[1]]
+        )
+
+class TestRandomEventPool(unittest.TestCase):
+    """Test cases for RandomEventPool."""
+
+    def test_draw_removes_event_from_pool(self):
+        """Test that drawn events are removed from every stage."""
+        pool = RandomEventPool(random_events)
+        event = pool.draw(Stage.FIRST)
+        self.assertEqual(len(pool), len(random_events) - 1)
+        remaining = [pool.draw(Stage.THIRD) for _ in range(len(pool))]
+        self.assertNotIn(event, remaining)
+        with self.assertRaises(IndexError):
+            pool.draw(Stage.SECOND)
+
+    def test_discard_skips_history_events(self):
+        """Test that events already in history are not drawn."""
+        pool = RandomEventPool(random_events)
+        pool.discard([action_list[0], *random_events[1:]])
+        self.assertEqual(pool.draw(Stage.FIRST), random_events[0])
+
+    def test_draw_respects_allowed_stages(self):
+        """Test that stage-restricted events are drawn only in their stage."""
+        events = tuple(
+            event.model_copy(update={"allowed_stages": [stage]})
+            for event, stage in zip(random_events, Stage)
+        )
+        pool = RandomEventPool(events)
+        self.assertEqual(pool.draw(Stage.SECOND), events[1])
+        with self.assertRaises(IndexError):
+            pool.draw(Stage.SECOND)
+
+    def test_draw_respects_weights(self):
+        """Test that heavier events are drawn more often."""
+        light, heavy = (
+            RandomEvent(name=name, description="", reactions=[], weight=weight)
+            for name, weight in (("light", 1), ("heavy", 10))
+        )
+        n_heavy_first = sum(
+            RandomEventPool((light, heavy)).draw(Stage.FIRST) == heavy
+            for _ in range(1000)
+        )
+        self.assertGreater(n_heavy_first, 800)
+
 
 class TestActionListDictionaries(unittest.TestCase):
     """Test cases for action_list dictionaries."""
@@ -1,14 +1,19 @@
 """Tests for API endpoints."""
 
 import os
+import threading
+import time
 import unittest
+import uuid
 from unittest.mock import patch
 
 from fastapi.testclient import TestClient
 from main import app
 from main import states
 from runthroughlinehackathor.action_selection.action_list import action_list
+from runthroughlinehackathor.llm.llm_admission import llm_admission
 from runthroughlinehackathor.settings import settings
+from starlette.websockets import WebSocketDisconnect
 
 
 class TestAPIEndpoints(unittest.TestCase):
@@ -28,12 +33,358 @@ class TestAPIEndpoints(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.text, "pong")
 
+    def test_ready_after_warm_up(self):
+        """Test that the readiness probe waits for the warm-up."""
+        warm_up_done = threading.Event()
+
+        with patch("main.warm_up", warm_up_done.wait):
+            with TestClient(app) as client:
+                self.assertEqual(client.get("/ping").status_code, 200)
+                self.assertEqual(client.get("/ready").status_code, 503)
+
+                warm_up_done.set()
+                for _ in range(100):
+                    response = client.get("/ready")
+                    if response.status_code == 200:
+                        break
+                    time.sleep(0.01)
+                self.assertEqual(response.text, "ready")
+
+    def test_requests_wait_for_warm_up(self):
+        """Test that catalog requests wait until the warm-up is done."""
+        warm_up_done = threading.Event()
+        responses = []
+
+        with patch("main.warm_up", warm_up_done.wait):
+            with TestClient(app) as client:
+                request = threading.Thread(
+                    target=lambda: responses.append(client.get("/catalog"))
+                )
+                request.start()
+                request.join(0.1)
+                self.assertEqual(responses, [])
+
+                warm_up_done.set()
+                request.join(5)
+
+        self.assertEqual(responses[0].status_code, 200)
+
+    def test_requests_fail_after_failed_warm_up(self):
+        """Test that requests are rejected when the warm-up failed."""
+        with patch("main.warm_up", side_effect=OSError("offline")):
+            with TestClient(app) as client:
+                response = client.get("/catalog")
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_warm_up_before_serving(self):
+        """Test that the app can finish its warm-up before serving."""
+        with patch.object(settings, "warm_up_before_serving", True):
+            with TestClient(app) as client:
+                self.assertEqual(client.get("/ready").status_code, 200)
+
     def test_root_redirects_to_docs(self):
         """Test that root path redirects to /docs."""
         response = self.client.get("/", follow_redirects=False)
         self.assertEqual(response.status_code, 307)
         self.assertEqual(response.headers["location"], "/docs")
 
+    def test_create_new_game_reports_server_timing(self):
+        """Test that turn pipeline phases are exposed as Server-Timing."""
+        response = self.client.post(
+            "/create-new-game",
+            json={
+                "gender": "male",
+                "goal": "Test goal",
+                "name": "Test Player",
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        self.assertIn(
+            "action_weighting;dur=", response.headers["Server-Timing"]
+        )
+
+        metrics_response = self.client.get("/metrics")
+        self.assertEqual(metrics_response.status_code, 200)
+        self.assertIn(
+            'turn_phase_duration_seconds_count{phase="action_weighting"}',
+            metrics_response.text,
+        )
+
+    def test_get_game_with_etag(self):
+        """Test reading a game and revalidating it with If-None-Match."""
+        state = self.client.post(
+            "/create-new-game",
+            json={
+                "gender": "male",
+                "goal": "Test goal",
+                "name": "Test Player",
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        ).json()
+
+        response = self.client.get(
+            f"/games/{state['id']}",
+            headers={"X_API_KEY": "test-api-key", "Accept-Encoding": "gzip"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), state)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+
+        response = self.client.get(
+            f"/games/{state['id']}",
+            headers={"X_API_KEY": "test-api-key", "If-None-Match": etag},
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post(
+            "/next-turn",
+            json={
+                "state_id": state["id"],
+                "chosen_action_references": [
+                    state["random_event"]["reactions"][0]["id"]
+                ],
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        response = self.client.get(
+            f"/games/{state['id']}",
+            headers={"X_API_KEY": "test-api-key", "If-None-Match": etag},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["game_turn"], 1)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+        response = self.client.get(
+            f"/games/{uuid.uuid4()}", headers={"X_API_KEY": "test-api-key"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_get_game_llm_usage(self):
+        """Test per-game LLM usage summary."""
+        create_response = self.client.post(
+            "/create-new-game",
+            json={
+                "gender": "male",
+                "goal": "Test goal",
+                "name": "Test Player",
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        state_id = create_response.json()["id"]
+
+        response = self.client.get(
+            f"/games/{state_id}/llm-usage",
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["by_prompt_type"]["action_weight"]["n_requests"],
+            1,
+        )
+
+        response = self.client.get(
+            f"/games/{uuid.uuid4()}/llm-usage",
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_deferred_narrative_can_be_polled(self):
+        """Test next turn with deferred narrative and the narrative poll."""
+        with TestClient(app) as client:
+            state = client.post(
+                "/create-new-game",
+                json={
+                    "gender": "male",
+                    "goal": "Test goal",
+                    "name": "Test Player",
+                },
+                headers={"X_API_KEY": "test-api-key"},
+            ).json()
+
+            response = client.post(
+                "/next-turn",
+                params={"defer_narrative": True},
+                json={
+                    "state_id": state["id"],
+                    "chosen_action_references": [
+                        state["random_event"]["reactions"][0]["id"]
+                    ],
+                },
+                headers={"X_API_KEY": "test-api-key"},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json()["is_narrative_pending"])
+
+            response = client.get(
+                f"/games/{state['id']}/narrative",
+                params={"wait_seconds": 5},
+                headers={"X_API_KEY": "test-api-key"},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["status"], "done")
+            self.assertEqual(response.json()["game_turn"], 1)
+            self.assertIsNotNone(response.json()["turn_description"])
+
+            response = client.get(
+                f"/games/{uuid.uuid4()}/narrative",
+                headers={"X_API_KEY": "test-api-key"},
+            )
+            self.assertEqual(response.status_code, 404)
+
+    def test_saturated_llm_sheds_load(self):
+        """Test 503 with Retry-After when the LLM queue is full."""
+        with patch.object(llm_admission, "max_queue_size", 0):
+            response = self.client.post(
+                "/create-new-game",
+                json={
+                    "gender": "male",
+                    "goal": "Test goal",
+                    "name": "Test Player",
+                },
+                headers={"X_API_KEY": "test-api-key"},
+            )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+        self.assertEqual(len(states), 0)
+
+    def test_get_memory_report(self):
+        """Test memory diagnostics of live games."""
+        create_response = self.client.post(
+            "/create-new-game",
+            json={
+                "gender": "male",
+                "goal": "Test goal",
+                "name": "Test Player",
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        )
+
+        response = self.client.get(
+            "/diagnostics/memory",
+            params={"n_largest_games": 1},
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report["n_games"], len(states))
+        self.assertEqual(len(report["largest_games"]), 1)
+        self.assertIn(
+            create_response.json()["id"],
+            [game["state_id"] for game in report["largest_games"]],
+        )
+
+    def test_game_session_plays_turns(self):
+        """Test a turn over a WebSocket session and the narrative push."""
+        state = self.client.post(
+            "/create-new-game",
+            json={
+                "gender": "male",
+                "goal": "Test goal",
+                "name": "Test Player",
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        ).json()
+
+        with self.client.websocket_connect(
+            f"/games/{state['id']}/session?defer_narrative=true",
+            headers={"X_API_KEY": "test-api-key"},
+        ) as websocket:
+            message = websocket.receive_json()
+            self.assertEqual(message["type"], "state")
+            self.assertEqual(message["state"]["id"], state["id"])
+
+            websocket.send_json(
+                {"type": "turn", "chosen_action_references": ["unknown"]}
+            )
+            message = websocket.receive_json()
+            self.assertEqual(message["type"], "error")
+            self.assertEqual(message["status_code"], 422)
+
+            websocket.send_json(
+                {
+                    "type": "turn",
+                    "chosen_action_references": [
+                        state["random_event"]["reactions"][0]["id"]
+                    ],
+                }
+            )
+            message = websocket.receive_json()
+            self.assertEqual(message["type"], "delta")
+            self.assertEqual(message["changed"]["game_turn"], 1)
+            self.assertTrue(message["changed"]["is_narrative_pending"])
+            self.assertEqual(
+                message["spliced"]["turn_descriptions"]["start"], 1
+            )
+
+            message = websocket.receive_json()
+            self.assertEqual(message["type"], "narrative")
+            self.assertEqual(message["narrative"]["status"], "done")
+            self.assertFalse(message["changed"]["is_narrative_pending"])
+            self.assertEqual(
+                message["spliced"]["turn_descriptions"]["items"],
+                [message["narrative"]["turn_description"]],
+            )
+
+    def test_game_session_pushes_loss_narrative(self):
+        """Test that a session pushes the narrative of a lost game."""
+        state = self.client.post(
+            "/create-new-game",
+            json={
+                "gender": "male",
+                "goal": "Test goal",
+                "name": "Test Player",
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        ).json()
+        losing_action = next(
+            a for a in action_list if a.parameter_change.money < 0
+        )
+        stored_state = states[uuid.UUID(state["id"])]
+        stored_state.parameters.money = 0
+        stored_state.big_actions = [losing_action]
+
+        with self.client.websocket_connect(
+            f"/games/{state['id']}/session?defer_narrative=true",
+            headers={"X_API_KEY": "test-api-key"},
+        ) as websocket:
+            message = websocket.receive_json()
+            self.assertEqual(message["type"], "state")
+
+            websocket.send_json(
+                {
+                    "type": "turn",
+                    "chosen_action_references": [losing_action.name],
+                }
+            )
+            message = websocket.receive_json()
+            self.assertEqual(message["type"], "delta")
+            self.assertTrue(message["changed"]["is_game_finished"])
+            self.assertTrue(message["changed"]["is_narrative_pending"])
+
+            message = websocket.receive_json()
+            self.assertEqual(message["type"], "narrative")
+            self.assertEqual(message["narrative"]["status"], "done")
+            self.assertEqual(
+                message["narrative"]["game_turn"], stored_state.game_turn
+            )
+            self.assertIsNotNone(message["narrative"]["stage_summary"])
+            self.assertFalse(message["changed"]["is_narrative_pending"])
+
+    def test_game_session_with_invalid_api_key(self):
+        """Test that a session is refused without a valid API key."""
+        with self.assertRaises(WebSocketDisconnect) as context:
+            with self.client.websocket_connect(
+                f"/games/{uuid.uuid4()}/session",
+                headers={"X_API_KEY": "wrong-key"},
+            ):
+                pass
+
+        self.assertEqual(context.exception.code, 1008)
+
     def test_create_new_game_without_api_key(self):
         """Test creating new game without API key fails."""
         response = self.client.post(
@@ -271,6 +622,221 @@ class TestAPIEndpoints(unittest.TestCase):
         # This test documents current behavior
         self.assertIn(response.status_code, [200, 404, 422])
 
+    def test_next_turn_with_not_offered_reference(self):
+        """Test next turn rejects actions that were not offered."""
+        create_response = self.client.post(
+            "/create-new-game",
+            json={
+                "gender": "male",
+                "goal": "Test goal",
+                "name": "Test Player",
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        data = create_response.json()
+        offered_names = {
+            a["name"] for a in data["big_actions"] + data["small_actions"]
+        }
+        not_offered_action = next(
+            a for a in action_list if a.name not in offered_names
+        )
+
+        response = self.client.post(
+            "/next-turn",
+            json={
+                "state_id": data["id"],
+                "chosen_action_references": [not_offered_action.name],
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        self.assertEqual(response.status_code, 422)
+
+    def test_next_turn_batch_returns_per_item_results(self):
+        """Test batch next turn plays offered turns and reports errors."""
+        create_response = self.client.post(
+            "/create-new-game",
+            json={
+                "gender": "male",
+                "goal": "Test goal",
+                "name": "Test Player",
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        data = create_response.json()
+        fake_state_id = str(uuid.uuid4())
+
+        response = self.client.post(
+            "/next-turn/batch",
+            json={
+                "state_increments": [
+                    {
+                        "state_id": data["id"],
+                        "chosen_action_references": [
+                            data["small_actions"][0]["name"]
+                        ],
+                    },
+                    {
+                        "state_id": fake_state_id,
+                        "chosen_action_references": [],
+                    },
+                ]
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        self.assertEqual(response.status_code, 200)
+
+        results = response.json()
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["status_code"], 200)
+        self.assertEqual(results[0]["state"]["game_turn"], 1)
+        self.assertEqual(results[1]["status_code"], 404)
+        self.assertEqual(results[1]["state_id"], fake_state_id)
+
+    def test_next_turn_batch_rejects_only_invalid_items(self):
+        """Test that an invalid batch item fails only its own position."""
+        data = self.client.post(
+            "/create-new-game",
+            json={
+                "gender": "male",
+                "goal": "Test goal",
+                "name": "Test Player",
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        ).json()
+
+        response = self.client.post(
+            "/next-turn/batch",
+            json={
+                "state_increments": [
+                    {
+                        "state_id": "not-a-uuid",
+                        "chosen_action_references": ["unknown"],
+                    },
+                    {
+                        "state_id": data["id"],
+                        "chosen_action_references": [
+                            data["small_actions"][0]["name"]
+                        ],
+                    },
+                ]
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        self.assertEqual(response.status_code, 200)
+
+        results = response.json()
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["status_code"], 422)
+        self.assertEqual(results[0]["state_id"], "not-a-uuid")
+        self.assertIsNone(results[0]["state"])
+        self.assertEqual(results[0]["detail"][0]["loc"], ["state_id"])
+        self.assertEqual(results[1]["status_code"], 200)
+        self.assertEqual(results[1]["state"]["game_turn"], 1)
+
+    def test_get_game_while_updating_is_not_cached(self):
+        """Test that a state in the middle of a turn carries no ETag."""
+        state = self.client.post(
+            "/create-new-game",
+            json={
+                "gender": "male",
+                "goal": "Test goal",
+                "name": "Test Player",
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        ).json()
+        states[uuid.UUID(state["id"])].is_updating = True
+
+        response = self.client.get(
+            f"/games/{state['id']}", headers={"X_API_KEY": "test-api-key"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response.headers)
+        self.assertEqual(response.headers["Cache-Control"], "no-store")
+
+    def test_get_catalog_with_etag(self):
+        """Test the catalog, its revalidation and its versioned URL."""
+        response = self.client.get(
+            "/catalog", headers={"Accept-Encoding": "identity"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["actions"]), len(action_list))
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+        etag = response.headers["ETag"]
+        version = response.json()["version"]
+
+        response = self.client.get(
+            "/catalog",
+            headers={"Accept-Encoding": "identity", "If-None-Match": etag},
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        response = self.client.get(
+            f"/catalog/{version}",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], version)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertIn("immutable", response.headers["Cache-Control"])
+
+        response = self.client.get(
+            f"/catalog/{version}",
+            headers={
+                "Accept-Encoding": "gzip",
+                "If-None-Match": response.headers["ETag"],
+            },
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get("/catalog/outdated")
+        self.assertEqual(response.status_code, 404)
+
+    def test_next_turn_with_compact_state(self):
+        """Test that compact states reference catalog items by id."""
+        state = self.client.post(
+            "/create-new-game",
+            params={"compact": True},
+            json={
+                "gender": "male",
+                "goal": "Test goal",
+                "name": "Test Player",
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        ).json()
+        catalog = self.client.get("/catalog").json()
+        self.assertEqual(state["catalog_version"], catalog["version"])
+        self.assertIsInstance(state["random_event"], str)
+
+        reaction_id = next(
+            event["reaction_ids"][0]
+            for event in catalog["random_events"]
+            if event["name"] == state["random_event"]
+        )
+        response = self.client.post(
+            "/next-turn",
+            params={"compact": True},
+            json={
+                "state_id": state["id"],
+                "chosen_action_references": [
+                    reaction_id,
+                    state["small_actions"][0],
+                ],
+            },
+            headers={"X_API_KEY": "test-api-key"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["history"][:3],
+            [
+                {"random_event": state["random_event"]},
+                {"reaction": reaction_id},
+                {"action": state["small_actions"][0]},
+            ],
+        )
+
     def test_create_new_game_invalid_gender(self):
         """Test creating new game with invalid gender."""
         response = self.client.post(
@@ -319,7 +885,7 @@ class TestAPIEndpoints(unittest.TestCase):
         # State IDs should be different
         self.assertNotEqual(state_id1, state_id2)
 
-        # Both should be in states list
+        # Both should be in states
         self.assertEqual(len(states), 2)
 
 
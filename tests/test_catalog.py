@@ -0,0 +1,45 @@
+"""Tests for the catalog and compact states."""
+
+import unittest
+
+from runthroughlinehackathor.action_selection.action_list import action_list
+from runthroughlinehackathor.action_selection.random_events_list import (
+    random_events,
+)
+from runthroughlinehackathor.action_selection.random_events_list import (
+    reactions,
+)
+from runthroughlinehackathor.catalog.catalog import build_catalog
+from runthroughlinehackathor.catalog.catalog import load_catalog
+
+
+class TestBuildCatalog(unittest.TestCase):
+    """Test cases for build_catalog function."""
+
+    def test_random_events_reference_reactions(self):
+        """Test that random events list reaction ids instead of reactions."""
+        catalog = load_catalog()
+        event = catalog.random_events[0]
+
+        self.assertEqual(
+            event.reaction_ids, [r.id for r in random_events[0].reactions]
+        )
+        self.assertIn(b'"reaction_ids"', catalog.body)
+
+    def test_version_follows_content(self):
+        """Test that the version changes only with the catalog content."""
+        same_catalog = build_catalog(
+            action_list, random_events, reactions.values()
+        )
+        smaller_catalog = build_catalog(
+            action_list[1:], random_events, reactions.values()
+        )
+
+        self.assertEqual(same_catalog.version, load_catalog().version)
+        self.assertNotEqual(smaller_catalog.version, load_catalog().version)
+
+    def test_body_is_catalog_json(self):
+        """Test that the serialized body carries the version and content."""
+        catalog = load_catalog()
+
+        self.assertEqual(catalog.body, catalog.model_dump_json().encode())
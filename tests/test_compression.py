@@ -0,0 +1,154 @@
+"""Tests for response compression."""
+
+import gzip
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from runthroughlinehackathor.compression import codecs
+from runthroughlinehackathor.compression.codecs import compress
+from runthroughlinehackathor.compression.codecs import compress_immutable
+from runthroughlinehackathor.compression.codecs import negotiate_encoding
+from runthroughlinehackathor.compression.compression_middleware import (
+    CompressionMiddleware,
+)
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+
+class TestNegotiateEncoding(unittest.TestCase):
+    """Test cases for negotiate_encoding function."""
+
+    def setUp(self):
+        """Limit the available encodings to the ones always installed."""
+        patcher = patch.dict(
+            codecs._COMPRESSORS,
+            {"gzip": codecs._gzip},
+            clear=True,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_gzip_is_chosen(self):
+        """Test that an accepted encoding is chosen."""
+        self.assertEqual(negotiate_encoding("deflate, gzip"), "gzip")
+
+    def test_unavailable_or_refused_encodings(self):
+        """Test that nothing is chosen without an acceptable encoding."""
+        self.assertIsNone(negotiate_encoding(""))
+        self.assertIsNone(negotiate_encoding("br, deflate"))
+        self.assertIsNone(negotiate_encoding("gzip;q=0"))
+        self.assertIsNone(negotiate_encoding("*;q=0, identity"))
+
+    def test_wildcard_accepts_gzip(self):
+        """Test that the wildcard covers encodings not listed."""
+        self.assertEqual(negotiate_encoding("*"), "gzip")
+
+    def test_quality_values_are_respected(self):
+        """Test that the encoding with the highest quality wins."""
+        with patch.dict(
+            codecs._COMPRESSORS,
+            {"zstd": codecs._zstd, "gzip": codecs._gzip},
+            clear=True,
+        ):
+            self.assertEqual(
+                negotiate_encoding("gzip;q=1.0, zstd;q=0.5"), "gzip"
+            )
+            self.assertEqual(negotiate_encoding("gzip, zstd"), "zstd")
+
+
+class TestCompress(unittest.TestCase):
+    """Test cases for compress and compress_immutable functions."""
+
+    def test_gzip_round_trip(self):
+        """Test that both compression levels produce valid gzip."""
+        body = b'{"turn_descriptions": ["' + 1000 * b"x" + b'"]}'
+
+        self.assertEqual(gzip.decompress(compress(body, "gzip")), body)
+        self.assertEqual(
+            gzip.decompress(compress_immutable(body, "gzip")), body
+        )
+
+    def test_immutable_bodies_are_compressed_once(self):
+        """Test that repeated immutable bodies come from the cache."""
+        body = 100 * b"catalog"
+
+        self.assertIs(
+            compress_immutable(body, "gzip"), compress_immutable(body, "gzip")
+        )
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+    """Test cases for CompressionMiddleware class."""
+
+    def setUp(self):
+        """Set up an app with large and small responses."""
+        app = Starlette(
+            routes=[
+                Route(
+                    "/large",
+                    lambda request: JSONResponse({"text": 2000 * "x"}),
+                ),
+                Route("/small", lambda request: JSONResponse({"text": "x"})),
+                Route(
+                    "/tagged",
+                    lambda request: JSONResponse(
+                        {"text": 2000 * "x"}, headers={"ETag": '"1"'}
+                    ),
+                ),
+                Route(
+                    "/encoded",
+                    lambda request: PlainTextResponse(
+                        gzip.compress(2000 * b"x"),
+                        headers={"Content-Encoding": "gzip"},
+                    ),
+                ),
+            ]
+        )
+        app.add_middleware(CompressionMiddleware, minimum_size=1000)
+        self.client = TestClient(app)
+
+    def test_large_response_is_compressed(self):
+        """Test that large JSON responses are gzipped on request."""
+        response = self.client.get(
+            "/large", headers={"Accept-Encoding": "gzip"}
+        )
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertLess(int(response.headers["Content-Length"]), 1000)
+        self.assertEqual(response.json(), {"text": 2000 * "x"})
+
+    def test_strong_etag_of_compressed_response_is_weakened(self):
+        """Test that compressing a response makes its ETag weak."""
+        compressed_response = self.client.get(
+            "/tagged", headers={"Accept-Encoding": "gzip"}
+        )
+        identity_response = self.client.get(
+            "/tagged", headers={"Accept-Encoding": "identity"}
+        )
+
+        self.assertEqual(compressed_response.headers["ETag"], 'W/"1"')
+        self.assertEqual(identity_response.headers["ETag"], '"1"')
+
+    def test_small_or_unaccepted_responses_are_not_compressed(self):
+        """Test the size threshold and the encoding negotiation."""
+        small_response = self.client.get(
+            "/small", headers={"Accept-Encoding": "gzip"}
+        )
+        identity_response = self.client.get(
+            "/large", headers={"Accept-Encoding": "identity"}
+        )
+
+        self.assertNotIn("Content-Encoding", small_response.headers)
+        self.assertNotIn("Content-Encoding", identity_response.headers)
+
+    def test_encoded_response_is_passed_through(self):
+        """Test that pre-compressed responses are not compressed again."""
+        response = self.client.get(
+            "/encoded", headers={"Accept-Encoding": "gzip"}
+        )
+
+        self.assertEqual(response.text, 2000 * "x")
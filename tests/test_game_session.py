@@ -0,0 +1,46 @@
+"""Tests for WebSocket game sessions."""
+
+import unittest
+
+from runthroughlinehackathor.game_session.state_delta import state_delta
+
+
+class TestStateDelta(unittest.TestCase):
+    """Test cases for state_delta function."""
+
+    def test_unchanged_state_has_empty_delta(self):
+        """Test that equal states produce no changes."""
+        state = {"game_turn": 1, "history": [1, 2]}
+
+        delta = state_delta(state, dict(state))
+
+        self.assertEqual(delta.changed, {})
+        self.assertEqual(delta.spliced, {})
+
+    def test_changed_fields_are_replaced(self):
+        """Test that changed scalar and mapping fields are sent whole."""
+        delta = state_delta(
+            {"game_turn": 1, "parameters": {"health": 50}},
+            {"game_turn": 2, "parameters": {"health": 40}},
+        )
+
+        self.assertEqual(
+            delta.changed, {"game_turn": 2, "parameters": {"health": 40}}
+        )
+
+    def test_grown_list_is_spliced_at_its_end(self):
+        """Test that only appended list elements are sent."""
+        delta = state_delta({"history": [1, 2]}, {"history": [1, 2, 3]})
+
+        self.assertEqual(delta.spliced["history"].start, 2)
+        self.assertEqual(delta.spliced["history"].items, [3])
+
+    def test_changed_list_tail_is_spliced(self):
+        """Test that a list is spliced from its first changed element."""
+        delta = state_delta(
+            {"turn_descriptions": ["a", "", "c"]},
+            {"turn_descriptions": ["a", "b"]},
+        )
+
+        self.assertEqual(delta.spliced["turn_descriptions"].start, 1)
+        self.assertEqual(delta.spliced["turn_descriptions"].items, ["b"])
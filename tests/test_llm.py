@@ -0,0 +1,374 @@
+"""Tests for LLM call accounting, batching, coalescing and admission."""
+
+import asyncio
+import unittest
+import uuid
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableLambda
+from runthroughlinehackathor.llm.llm_admission import LlmAdmissionController
+from runthroughlinehackathor.llm.llm_admission import LlmOverloadedError
+from runthroughlinehackathor.llm.llm_batcher import LlmBatcher
+from runthroughlinehackathor.llm.llm_usage import game_llm_usage
+from runthroughlinehackathor.llm.llm_usage import record_llm_usage
+from runthroughlinehackathor.llm.prompt_type import PromptType
+from runthroughlinehackathor.llm.single_flight import SingleFlight
+from runthroughlinehackathor.monitoring.metrics import registry
+from runthroughlinehackathor.settings import settings
+
+
+class TestRecordLlmUsage(unittest.TestCase):
+    """Test cases for record_llm_usage function."""
+
+    def test_usage_is_aggregated_per_game_and_prompt_type(self):
+        """Test token, cost and error aggregation for one game."""
+        state_id = uuid.uuid4()
+        message = AIMessage(
+            content="Test",
+            usage_metadata={
+                "input_tokens": 1000,
+                "output_tokens": 100,
+                "total_tokens": 1100,
+                "input_token_details": {"cache_read": 400},
+            },
+        )
+
+        record_llm_usage(PromptType.TURN_DESCRIPTION, state_id, 0.5, message)
+        record_llm_usage(PromptType.TURN_DESCRIPTION, state_id, 0.25, message)
+        record_llm_usage(PromptType.GAME_LOSS, state_id, 1.0)
+
+        usage = game_llm_usage[state_id]
+        turn_description_usage = usage.by_prompt_type[
+            PromptType.TURN_DESCRIPTION
+        ]
+        self.assertEqual(turn_description_usage.n_requests, 2)
+        self.assertEqual(turn_description_usage.n_cache_hits, 2)
+        self.assertEqual(turn_description_usage.prompt_tokens, 2000)
+        self.assertEqual(turn_description_usage.completion_tokens, 200)
+        self.assertAlmostEqual(
+            turn_description_usage.cost_usd,
+            2
+            * (
+                600 * settings.llm_prompt_token_cost_usd
+                + 400 * settings.llm_cached_prompt_token_cost_usd
+                + 100 * settings.llm_completion_token_cost_usd
+            ),
+        )
+        self.assertEqual(usage.total.n_requests, 3)
+        self.assertEqual(usage.total.n_errors, 1)
+        self.assertAlmostEqual(usage.total.duration_seconds, 1.75)
+
+    def test_least_recently_used_games_are_dropped(self):
+        """Test that usage is kept for at most llm_usage_max_games games."""
+        state_ids = [uuid.uuid4() for _ in range(3)]
+        with patch.object(settings, "llm_usage_max_games", 2):
+            for state_id in state_ids:
+                record_llm_usage(PromptType.TURN_DESCRIPTION, state_id, 0.1)
+            record_llm_usage(PromptType.TURN_DESCRIPTION, state_ids[1], 0.1)
+
+        self.assertEqual(list(game_llm_usage), [state_ids[2], state_ids[1]])
+
+    def test_usage_is_exposed_as_metrics(self):
+        """Test that LLM usage appears in the metrics registry."""
+        record_llm_usage(PromptType.ACTION_WEIGHT, None, 0.1)
+        self.assertIn(
+            'llm_requests_total{outcome="error",prompt_type="action_weight"}',
+            registry.render(),
+        )
+
+
+class TestLlmBatcher(unittest.IsolatedAsyncioTestCase):
+    """Test cases for LlmBatcher."""
+
+    async def asyncSetUp(self):
+        """Set up an echo model and record the size of every batch."""
+        self.batch_sizes = []
+        self.n_running = self.max_running = 0
+
+        async def echo(messages):
+            self.n_running += 1
+            self.max_running = max(self.max_running, self.n_running)
+            await asyncio.sleep(float(messages[0].content) / 100)
+            self.n_running -= 1
+            return messages[0].content
+
+        self.model = RunnableLambda(echo)
+        send = LlmBatcher._send
+
+        async def recording_send(batcher, model, batch):
+            self.batch_sizes.append(len(batch))
+            await send(batcher, model, batch)
+
+        patcher = patch.object(LlmBatcher, "_send", recording_send)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_concurrent_requests_are_batched(self):
+        """Test that requests within the window share one batch."""
+        batcher = LlmBatcher(
+            window_seconds=0.05, max_batch_size=100, max_concurrency=4
+        )
+
+        outputs = await asyncio.gather(
+            *(
+                batcher.ainvoke(self.model, [HumanMessage(str(i))])
+                for i in range(10)
+            )
+        )
+
+        self.assertEqual(outputs, [str(i) for i in range(10)])
+        self.assertEqual(self.batch_sizes, [10])
+
+    async def test_full_batch_is_sent_early(self):
+        """Test that batches are split at max_batch_size."""
+        batcher = LlmBatcher(
+            window_seconds=10, max_batch_size=4, max_concurrency=4
+        )
+
+        outputs = await asyncio.gather(
+            *(
+                batcher.ainvoke(self.model, [HumanMessage(str(i))])
+                for i in range(8)
+            )
+        )
+
+        self.assertEqual(outputs, [str(i) for i in range(8)])
+        self.assertEqual(self.batch_sizes, [4, 4])
+
+    async def test_requests_resolve_as_their_calls_finish(self):
+        """Test that a fast request does not wait for a slow one."""
+        batcher = LlmBatcher(
+            window_seconds=0.01, max_batch_size=100, max_concurrency=4
+        )
+        slow = asyncio.create_task(
+            batcher.ainvoke(self.model, [HumanMessage("100")])
+        )
+
+        output = await asyncio.wait_for(
+            batcher.ainvoke(self.model, [HumanMessage("0")]), timeout=0.5
+        )
+
+        self.assertEqual(output, "0")
+        self.assertFalse(slow.done())
+        self.assertEqual(self.batch_sizes, [2])
+        slow.cancel()
+
+    async def test_batch_is_sent_with_one_batch_call(self):
+        """Test that a batch reaches the model as one batch call."""
+        batcher = LlmBatcher(
+            window_seconds=0.05, max_batch_size=100, max_concurrency=4
+        )
+
+        with patch.object(
+            RunnableLambda,
+            "abatch_as_completed",
+            autospec=True,
+            side_effect=RunnableLambda.abatch_as_completed,
+        ) as abatch_as_completed:
+            await asyncio.gather(
+                *(
+                    batcher.ainvoke(self.model, [HumanMessage(str(i))])
+                    for i in range(5)
+                )
+            )
+
+        abatch_as_completed.assert_called_once()
+        self.assertEqual(len(abatch_as_completed.call_args.args[1]), 5)
+
+    async def test_concurrency_is_bounded_within_a_batch(self):
+        """Test that max_concurrency bounds the calls of a batch."""
+        batcher = LlmBatcher(
+            window_seconds=0.05, max_batch_size=100, max_concurrency=3
+        )
+
+        await asyncio.gather(
+            *(
+                batcher.ainvoke(self.model, [HumanMessage("1")])
+                for _ in range(8)
+            )
+        )
+
+        self.assertEqual(self.batch_sizes, [8])
+        self.assertEqual(self.max_running, 3)
+
+    async def test_failed_call_fails_only_its_request(self):
+        """Test that an error of one call is raised to its own request."""
+
+        async def fail_on_zero(messages):
+            if messages[0].content == "0":
+                raise ValueError("Test")
+            return messages[0].content
+
+        model = RunnableLambda(fail_on_zero)
+        batcher = LlmBatcher(
+            window_seconds=0.05, max_batch_size=100, max_concurrency=4
+        )
+
+        outputs = await asyncio.gather(
+            batcher.ainvoke(model, [HumanMessage("0")]),
+            batcher.ainvoke(model, [HumanMessage("1")]),
+            return_exceptions=True,
+        )
+
+        self.assertIsInstance(outputs[0], ValueError)
+        self.assertEqual(outputs[1], "1")
+
+
+class TestLlmAdmissionController(unittest.IsolatedAsyncioTestCase):
+    """Test cases for LlmAdmissionController."""
+
+    def setUp(self):
+        """Set up a controller admitting one request at a time."""
+        self.controller = LlmAdmissionController(
+            max_requests_per_second=100,
+            min_requests_per_second=1,
+            burst=1,
+            max_concurrency=1,
+            max_queue_size=1,
+            max_wait_seconds=0.05,
+        )
+
+    async def test_waiting_request_times_out(self):
+        """Test that a request waiting past max_wait_seconds is rejected."""
+        async with self.controller.admit():
+            with self.assertRaises(LlmOverloadedError) as context:
+                async with self.controller.admit():
+                    pass
+
+        self.assertGreaterEqual(context.exception.retry_after_seconds, 1)
+        self.assertEqual(self.controller.n_running, 0)
+        self.assertEqual(self.controller.n_waiting, 0)
+
+    async def test_drain_waits_for_running_requests(self):
+        """Test that drain returns once the running request finishes."""
+        finished = []
+
+        async def run_request():
+            async with self.controller.admit():
+                await asyncio.sleep(0.02)
+                finished.append(True)
+
+        request = asyncio.create_task(run_request())
+        await asyncio.sleep(0)
+        await asyncio.wait_for(self.controller.drain(), 1)
+
+        self.assertEqual(finished, [True])
+        await request
+
+    async def test_requests_are_admitted_in_arrival_order(self):
+        """Test that waiting requests are admitted first in, first out."""
+        controller = LlmAdmissionController(
+            max_requests_per_second=100,
+            min_requests_per_second=1,
+            burst=100,
+            max_concurrency=1,
+            max_queue_size=10,
+            max_wait_seconds=1,
+        )
+        admitted = []
+
+        async def run_request(index):
+            async with controller.admit():
+                admitted.append(index)
+                await asyncio.sleep(0)
+
+        async with controller.admit():
+            requests = [
+                asyncio.create_task(run_request(index)) for index in range(5)
+            ]
+            await asyncio.sleep(0)
+            self.assertEqual(controller.n_waiting, 5)
+
+        await asyncio.gather(*requests)
+        self.assertEqual(admitted, list(range(5)))
+
+    async def test_waiting_request_is_woken_by_refill(self):
+        """Test that a request waiting for a token is admitted on refill."""
+        controller = LlmAdmissionController(
+            max_requests_per_second=20,
+            min_requests_per_second=1,
+            burst=1,
+            max_concurrency=10,
+            max_queue_size=10,
+            max_wait_seconds=1,
+        )
+        async with controller.admit():
+            pass
+        start = asyncio.get_running_loop().time()
+
+        async with controller.admit():
+            waited_seconds = asyncio.get_running_loop().time() - start
+
+        self.assertGreaterEqual(waited_seconds, 0.04)
+        self.assertLess(waited_seconds, 0.5)
+
+    async def test_full_queue_is_rejected_immediately(self):
+        """Test load shedding once max_queue_size requests are waiting."""
+        self.controller.n_waiting = self.controller.max_queue_size
+
+        self.assertTrue(self.controller.is_saturated())
+        with self.assertRaises(LlmOverloadedError):
+            async with self.controller.admit():
+                pass
+
+    def test_rate_adapts_to_provider_rate_limits(self):
+        """Test that the rate is halved on rate limits and then recovers."""
+        self.controller.on_rate_limited()
+        self.controller.on_rate_limited()
+        self.assertEqual(self.controller.requests_per_second, 25)
+
+        for _ in range(100):
+            self.controller.on_success()
+        self.assertEqual(self.controller.requests_per_second, 100)
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Test cases for SingleFlight."""
+
+    async def asyncSetUp(self):
+        """Set up a slow call counting its executions."""
+        self.single_flight = SingleFlight()
+        self.n_calls = 0
+        self.release = asyncio.Event()
+
+        async def call():
+            self.n_calls += 1
+            await self.release.wait()
+            return "result"
+
+        self.call = call
+
+    async def test_identical_calls_share_one_execution(self):
+        """Test that concurrent calls with one key run the call once."""
+        callers = [
+            asyncio.create_task(self.single_flight.do("key", self.call))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        self.assertTrue(self.single_flight.is_in_flight("key"))
+        self.release.set()
+
+        self.assertEqual(await asyncio.gather(*callers), 5 * ["result"])
+        self.assertEqual(self.n_calls, 1)
+        self.assertFalse(self.single_flight.is_in_flight("key"))
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        """Test that the call survives until its last caller is cancelled."""
+        first = asyncio.create_task(self.single_flight.do("key", self.call))
+        second = asyncio.create_task(self.single_flight.do("key", self.call))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.sleep(0)
+        self.assertTrue(self.single_flight.is_in_flight("key"))
+        second.cancel()
+        await asyncio.sleep(0)
+
+        self.assertFalse(self.single_flight.is_in_flight("key"))
+        self.assertEqual(self.n_calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
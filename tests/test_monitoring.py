@@ -0,0 +1,199 @@
+"""Tests for metrics, timing and profiling instrumentation."""
+
+import json
+import tempfile
+import tracemalloc
+import unittest
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+from pydantic import SecretStr
+from runthroughlinehackathor.action_selection.action_list import action_list
+from runthroughlinehackathor.action_selection.random_events_list import (
+    random_events,
+)
+from runthroughlinehackathor.models.gender import Gender
+from runthroughlinehackathor.models.parameters import Parameters
+from runthroughlinehackathor.models.stage import Stage
+from runthroughlinehackathor.models.state import State
+from runthroughlinehackathor.monitoring.memory_accounting import (
+    MemorySampler,
+)
+from runthroughlinehackathor.monitoring.metrics import MetricsRegistry
+from runthroughlinehackathor.monitoring.profiling import RequestProfiler
+from runthroughlinehackathor.monitoring.timing import format_server_timing
+from runthroughlinehackathor.monitoring.timing import start_request_timing
+from runthroughlinehackathor.monitoring.timing import timed
+from runthroughlinehackathor.settings import settings
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for MetricsRegistry rendering."""
+
+    def test_render_counter_and_histogram(self):
+        """Test Prometheus text format of counters and histograms."""
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests")
+        histogram = registry.histogram(
+            "latency_seconds", "Latency", buckets=(0.1, 1.0)
+        )
+        counter.inc(endpoint="/ping")
+        counter.inc(2, endpoint="/ping")
+        histogram.observe(0.5, phase="a")
+
+        rendered = registry.render()
+
+        self.assertIn("# TYPE requests_total counter", rendered)
+        self.assertIn('requests_total{endpoint="/ping"} 3.0', rendered)
+        self.assertIn('latency_seconds_bucket{phase="a",le="0.1"} 0', rendered)
+        self.assertIn('latency_seconds_bucket{phase="a",le="1.0"} 1', rendered)
+        self.assertIn(
+            'latency_seconds_bucket{phase="a",le="+Inf"} 1', rendered
+        )
+        self.assertIn('latency_seconds_count{phase="a"} 1', rendered)
+
+    def test_register_duplicate_name_fails(self):
+        """Test that metric names are unique within a registry."""
+        registry = MetricsRegistry()
+        registry.gauge("games", "Games")
+        with self.assertRaises(ValueError):
+            registry.counter("games", "Games")
+
+
+class TestTiming(unittest.TestCase):
+    """Test cases for request phase timing."""
+
+    def test_timed_phases_are_collected_for_request(self):
+        """Test that repeated phases are summed into Server-Timing."""
+        phase_durations = start_request_timing()
+        with timed("serialization"):
+            pass
+        with timed("serialization"):
+            pass
+
+        self.assertEqual(list(phase_durations), ["serialization"])
+        self.assertRegex(
+            format_server_timing(phase_durations),
+            r"^serialization;dur=\d+\.\d$",
+        )
+
+
+class TestRequestProfiler(unittest.IsolatedAsyncioTestCase):
+    """Test cases for RequestProfiler."""
+
+    def setUp(self):
+        """Set up a profiler writing into a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.profiler = RequestProfiler(
+            enabled=False,
+            admin_key=SecretStr("admin"),
+            directory=Path(self.directory.name),
+            profile_format="speedscope",
+            sampling_interval_seconds=0.001,
+            min_interval_seconds=60,
+            profile_memory=True,
+        )
+
+    def test_profile_requires_admin_key(self):
+        """Test that only requests with the admin key are profiled."""
+        self.assertFalse(self.profiler.should_profile(None))
+        self.assertFalse(self.profiler.should_profile("wrong"))
+        self.assertTrue(self.profiler.should_profile("admin"))
+
+    async def test_profile_is_rate_limited(self):
+        """Test that a second profile within the interval is refused."""
+        async with self.profiler.profile("next-turn"):
+            self.assertFalse(self.profiler.should_profile("admin"))
+        self.assertFalse(self.profiler.should_profile("admin"))
+
+    async def test_profile_writes_speedscope_and_memory_snapshot(self):
+        """Test that a speedscope profile and tracemalloc dump are written."""
+        async with self.profiler.profile("next-turn"):
+            sum(i * i for i in range(200_000))
+
+        directory = Path(self.directory.name)
+        (speedscope_path,) = directory.glob("*.speedscope.json")
+        speedscope = json.loads(speedscope_path.read_text())
+        self.assertEqual(speedscope["profiles"][0]["type"], "sampled")
+        self.assertTrue(speedscope["profiles"][0]["samples"])
+        self.assertEqual(len(list(directory.glob("*.tracemalloc"))), 1)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    async def test_profile_writes_pstats(self):
+        """Test that the pstats format is written with cProfile."""
+        self.profiler.profile_format = "pstats"
+        async with self.profiler.profile("create-new-game"):
+            pass
+
+        self.assertEqual(
+            len(list(Path(self.directory.name).glob("*.pstats"))), 1
+        )
+
+    async def test_memory_is_traced_only_on_request(self):
+        """Test that tracemalloc stays off unless memory is profiled."""
+        self.profiler.profile_memory = False
+        async with self.profiler.profile("next-turn"):
+            self.assertFalse(tracemalloc.is_tracing())
+
+        self.assertEqual(
+            list(Path(self.directory.name).glob("*.tracemalloc")), []
+        )
+
+
+class TestMemorySampler(unittest.IsolatedAsyncioTestCase):
+    """Test cases for MemorySampler."""
+
+    def setUp(self):
+        """Set up one game with two snapshots."""
+        self.state = State(
+            id=uuid.uuid4(),
+            parameters=Parameters(
+                career=50, relations=50, health=50, money=50
+            ),
+            history=[random_events[0], action_list[0]],
+            turn_descriptions=["x" * 1000, "y" * 1000],
+            current_stage=Stage.FIRST,
+            game_turn=1,
+            gender=Gender.MALE,
+            name="Test",
+            goal="Test",
+            big_actions=list(action_list[:3]),
+            small_actions=list(action_list[3:8]),
+            random_event=random_events[0],
+        )
+        self.sampler = MemorySampler(
+            [self.state], [self.state.model_copy(deep=True)] * 2
+        )
+
+    async def test_report_accounts_games_and_snapshots(self):
+        """Test per-game footprint of history, descriptions and snapshots."""
+        report = await self.sampler.report()
+
+        self.assertEqual(report.n_games, 1)
+        self.assertEqual(report.n_snapshots, 2)
+        (footprint,) = report.largest_games
+        self.assertEqual(footprint.state_id, self.state.id)
+        self.assertEqual(footprint.n_snapshots, 2)
+        self.assertGreater(footprint.turn_descriptions_bytes, 2000)
+        self.assertGreater(footprint.snapshots_bytes, 2000)
+        self.assertEqual(report.total_game_bytes, footprint.total_bytes)
+
+    def test_sample_records_rss_and_alerts(self):
+        """Test that samples keep RSS history and report exceeded limits."""
+        with (
+            patch.object(settings, "memory_alert_n_games", 1),
+            patch.object(settings, "memory_alert_n_snapshots", 1),
+        ):
+            sample = self.sampler.sample()
+
+        self.assertEqual(sample.n_games, 1)
+        self.assertEqual(len(sample.alerts), 1)
+        self.assertIn("snapshots", sample.alerts[0])
+        self.assertEqual(len(self.sampler.rss_history), 1)
+        self.assertGreater(self.sampler.rss_history[0].rss_bytes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Tests for the pre-generated narrative library."""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from runthroughlinehackathor.action_selection.action_list import action_list
+from runthroughlinehackathor.action_selection.random_events_list import (
+    random_events,
+)
+from runthroughlinehackathor.models.stage import Stage
+from runthroughlinehackathor.narrative_library.compose_turn_description import (
+    compose_turn_description,
+)
+from runthroughlinehackathor.narrative_library.narrative_library import (
+    fragment_key,
+)
+from runthroughlinehackathor.narrative_library.narrative_library import (
+    load_narrative_library,
+)
+from runthroughlinehackathor.narrative_library.narrative_library import (
+    narrative_library,
+)
+from runthroughlinehackathor.narrative_library.narrative_library import (
+    NarrativeLibrary,
+)
+
+
+class TestComposeTurnDescription(unittest.TestCase):
+    """Test cases for compose_turn_description function."""
+
+    def setUp(self):
+        """Set up a reaction and an action chosen in one turn."""
+        self.reaction = random_events[0].reactions[0]
+        self.action = action_list[0]
+
+    def test_catalog_text_is_used_without_fragments(self):
+        """Test the template fallback to reaction results and descriptions."""
+        with patch.dict(narrative_library.fragments, clear=True):
+            turn_description = compose_turn_description(
+                [self.reaction, self.action], Stage.FIRST
+            )
+
+        self.assertIn(self.reaction.result, turn_description)
+        self.assertIn(self.action.description, turn_description)
+
+    def test_fragments_of_the_stage_are_used(self):
+        """Test that pre-generated fragments of the stage are preferred."""
+        fragments = {
+            fragment_key(self.action): {
+                Stage.FIRST: ["Young fragment."],
+                Stage.SECOND: ["Adult fragment."],
+            }
+        }
+        with patch.dict(narrative_library.fragments, fragments, clear=True):
+            turn_description = compose_turn_description(
+                [self.action], Stage.SECOND
+            )
+
+        self.assertIn("Adult fragment.", turn_description)
+        self.assertNotIn(self.action.description, turn_description)
+
+
+class TestLoadNarrativeLibrary(unittest.TestCase):
+    """Test cases for load_narrative_library function."""
+
+    def test_library_round_trips_through_json(self):
+        """Test that a saved library is loaded with its stages."""
+        library = NarrativeLibrary(
+            fragments={"action:Test": {Stage.THIRD: ["Fragment."]}}
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "narrative_library.json"
+            path.write_text(library.model_dump_json(), encoding="utf-8")
+
+            self.assertEqual(load_narrative_library(path), library)
+
+    def test_missing_library_is_empty(self):
+        """Test that a missing file gives an empty library."""
+        library = load_narrative_library(Path("missing.json"))
+
+        self.assertEqual(library.fragments, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
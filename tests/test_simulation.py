@@ -0,0 +1,100 @@
+"""Tests for headless game simulation."""
+
+import random
+import unittest
+
+from runthroughlinehackathor.action_selection.action_list import action_list
+from runthroughlinehackathor.action_selection.select_actions import (
+    get_valid_actions,
+)
+from runthroughlinehackathor.models.gender import Gender
+from runthroughlinehackathor.models.stage import Stage
+from runthroughlinehackathor.settings import settings
+from runthroughlinehackathor.simulation.simulate_game import simulate_game
+from runthroughlinehackathor.simulation.simulate_game import (
+    simulate_game_batch,
+)
+from runthroughlinehackathor.simulation.simulate_games import simulate_games
+
+
+class TestGetValidActions(unittest.TestCase):
+    """Test cases for get_valid_actions function."""
+
+    def test_excludes_unique_actions_in_history(self):
+        """Test that unique actions already taken are not valid."""
+        unique_action = next(
+            a
+            for a in action_list
+            if a.is_unique and Stage.FIRST in a.allowed_stages
+        )
+        self.assertIn(unique_action, get_valid_actions([], Stage.FIRST))
+        self.assertNotIn(
+            unique_action, get_valid_actions([unique_action], Stage.FIRST)
+        )
+
+    def test_requires_prerequisites(self):
+        """Test that actions are valid only after their prerequisites."""
+        for action in get_valid_actions([], Stage.SECOND):
+            self.assertEqual(action.prerequisite_names, [])
+
+
+class TestSimulateGame(unittest.TestCase):
+    """Test cases for simulate_game function."""
+
+    def test_game_is_played_until_finished(self):
+        """Test that a simulated game ends by age or by loss."""
+        random.seed(0)
+        for gender in Gender:
+            result = simulate_game(gender)
+            state = result.state
+            self.assertTrue(state.is_game_finished)
+            if state.did_user_win:
+                self.assertGreaterEqual(
+                    state.age, settings.end_age[state.gender]
+                )
+            self.assertEqual(len(state.big_actions), settings.n_big_actions)
+            self.assertTrue(result.offered_action_names)
+
+
+class TestSimulateGameBatch(unittest.TestCase):
+    """Test cases for simulate_game_batch function."""
+
+    def test_games_are_played_until_finished(self):
+        """Test that every game played together ends by age or by loss."""
+        random.seed(0)
+        results = simulate_game_batch(list(Gender) * 5)
+        self.assertTrue(results)
+        for result in results:
+            state = result.state
+            self.assertTrue(state.is_game_finished)
+            if state.did_user_win:
+                self.assertGreaterEqual(
+                    state.age, settings.end_age[state.gender]
+                )
+            else:
+                self.assertTrue(
+                    any(v < 0 for v in state.parameters.model_dump().values())
+                )
+
+
+class TestSimulateGames(unittest.TestCase):
+    """Test cases for simulate_games function."""
+
+    def test_statistics_cover_all_games(self):
+        """Test that statistics have one row per played game."""
+        statistics = simulate_games(20, seed=0, chunk_size=7)
+        self.assertEqual(statistics.n_games + statistics.n_failed_games, 20)
+        self.assertEqual(statistics.parameters.shape, (statistics.n_games, 4))
+        self.assertEqual(len(statistics.action_names), len(action_list))
+        self.assertLessEqual(statistics.action_reachability.max(), 1)
+        self.assertIn("loss_rate", statistics.summary())
+
+    def test_seed_makes_sweep_reproducible(self):
+        """Test that the same seed yields the same outcomes."""
+        first = simulate_games(10, seed=1)
+        second = simulate_games(10, seed=1)
+        self.assertTrue((first.parameters == second.parameters).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Tests for the cost of starting a worker."""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from runthroughlinehackathor.run_server import run_server
+from runthroughlinehackathor.settings import Settings
+
+_IMPORT_TIME_BUDGET_SECONDS = 2
+
+_IMPORT_MAIN = """
+import json
+import sys
+from time import perf_counter
+
+start = perf_counter()
+import main
+duration = perf_counter() - start
+
+from runthroughlinehackathor.action_selection.action_list import (
+    load_action_list,
+)
+print(
+    json.dumps(
+        {
+            "duration": duration,
+            "modules": sorted(sys.modules),
+            "n_catalogs_loaded": load_action_list.cache_info().currsize,
+        }
+    )
+)
+"""
+
+
+class TestImportMain(unittest.TestCase):
+    """Test cases for importing the app."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Import main in a fresh interpreter."""
+        result = subprocess.run(
+            [sys.executable, "-c", _IMPORT_MAIN],
+            capture_output=True,
+            check=True,
+            cwd=Path(__file__).parents[1],
+            text=True,
+        )
+        cls.report = json.loads(result.stdout.splitlines()[-1])
+
+    def test_import_time_budget(self):
+        """Test that importing the app stays within the time budget."""
+        self.assertLess(self.report["duration"], _IMPORT_TIME_BUDGET_SECONDS)
+
+    def test_heavy_dependencies_are_not_imported(self):
+        """Test that the LLM client and catalogs are left for warm-up."""
+        self.assertNotIn("langchain_openai", self.report["modules"])
+        self.assertNotIn("openai", self.report["modules"])
+        self.assertEqual(self.report["n_catalogs_loaded"], 0)
+
+
+class TestRunServer(unittest.TestCase):
+    """Test cases for run_server function."""
+
+    def setUp(self):
+        """Keep the environment changed by run_server."""
+        patcher = patch.dict(os.environ)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _run_server(self, server_workers: str):
+        """Run the server with settings read from the environment."""
+        os.environ["SERVER_WORKERS"] = server_workers
+        environment_settings = Settings()
+        with (
+            patch(
+                "runthroughlinehackathor.run_server.settings",
+                environment_settings,
+            ),
+            patch("uvicorn.run") as uvicorn_run,
+            patch("os.cpu_count", return_value=3),
+        ):
+            run_server()
+
+        uvicorn_run.assert_called_once()
+        return environment_settings, uvicorn_run.call_args
+
+    def test_server_is_tuned_from_settings(self):
+        """Test workers per CPU, warm-up and connection limits."""
+        environment_settings, (args, kwargs) = self._run_server("0")
+
+        self.assertEqual(args, ("main:app",))
+        self.assertEqual(kwargs["workers"], 3)
+        self.assertEqual(
+            kwargs["backlog"], environment_settings.server_backlog
+        )
+        self.assertEqual(
+            kwargs["timeout_keep_alive"],
+            environment_settings.server_keep_alive_seconds,
+        )
+        self.assertTrue(environment_settings.warm_up_before_serving)
+        self.assertEqual(os.environ["WARM_UP_BEFORE_SERVING"], "true")
+
+    def test_empty_server_workers_uses_default(self):
+        """Test that an empty SERVER_WORKERS falls back to one worker."""
+        _, (_, kwargs) = self._run_server("")
+
+        self.assertEqual(kwargs["workers"], 1)
@@ -1,8 +1,12 @@
 """Tests for state update logic."""
 
+import asyncio
+import random
 import unittest
 import uuid
+from unittest.mock import patch
 
+from pydantic import ValidationError
 from runthroughlinehackathor.action_selection.action_list import action_list
 from runthroughlinehackathor.action_selection.random_events_list import (
     random_events,
@@ -10,12 +14,46 @@ from runthroughlinehackathor.action_selection.random_events_list import (
 from runthroughlinehackathor.action_selection.random_events_list import (
     reactions,
 )
+from runthroughlinehackathor.action_selection.select_random_event import (
+    select_random_event,
+)
+from runthroughlinehackathor.llm.llm_admission import LlmOverloadedError
+from runthroughlinehackathor.llm.prompt_type import PromptType
 from runthroughlinehackathor.models.gender import Gender
 from runthroughlinehackathor.models.parameters import Parameters
 from runthroughlinehackathor.models.stage import Stage
 from runthroughlinehackathor.models.state import State
 from runthroughlinehackathor.settings import settings
 from runthroughlinehackathor.state_update.apply_action import apply_action
+from runthroughlinehackathor.state_update.apply_turn import (
+    apply_chosen_actions,
+)
+from runthroughlinehackathor.state_update.apply_turn import (
+    detect_stage_transition,
+)
+from runthroughlinehackathor.state_update.apply_turn import is_game_lost
+from runthroughlinehackathor.state_update.apply_turn import (
+    regenerate_parameters,
+)
+from runthroughlinehackathor.state_update.batch_apply_turn import (
+    batch_apply_turn,
+)
+from runthroughlinehackathor.state_update.batch_apply_turn import BatchState
+from runthroughlinehackathor.state_update.batch_apply_turn import (
+    load_catalog_matrix,
+)
+from runthroughlinehackathor.state_update.history_timeline import (
+    history_timeline,
+)
+from runthroughlinehackathor.state_update.narrative_memory import (
+    NarrativeMemory,
+)
+from runthroughlinehackathor.state_update.narrative_worker_pool import (
+    narrative_worker_pool,
+)
+from runthroughlinehackathor.state_update.narrative_worker_pool import (
+    NarrativeStatus,
+)
 from runthroughlinehackathor.state_update.state_increment import StateIncrement
 from runthroughlinehackathor.state_update.update_state import update_state
 
@@ -603,6 +641,557 @@ class TestStateIncrement(unittest.TestCase):
 
         self.assertIsInstance(increment.chosen_actions, tuple)
 
+    def test_state_increment_rejects_unknown_reference(self):
+        """Test that unknown references fail at parse time."""
+        with self.assertRaises(ValidationError):
+            StateIncrement(
+                state_id=uuid.uuid4(),
+                chosen_action_references=["Not an action", -1],
+            )
+
+    def test_verify_offered_rejects_not_offered_reference(self):
+        """Test that only offered actions and reactions are accepted."""
+        random_event = random_events[0]
+        state = State(
+            id=uuid.uuid4(),
+            parameters=Parameters(
+                career=20, relations=20, health=100, money=20
+            ),
+            history=[],
+            turn_descriptions=["Test"],
+            current_stage=Stage.FIRST,
+            game_turn=0,
+            gender=Gender.MALE,
+            name="Test",
+            goal="Test",
+            big_actions=[],
+            small_actions=[action_list[0]],
+            random_event=random_event,
+        )
+        StateIncrement(
+            state_id=state.id,
+            chosen_action_references=[
+                action_list[0].name,
+                random_event.reactions[0].id,
+            ],
+        ).verify_offered(state)
+        with self.assertRaises(ValueError):
+            StateIncrement(
+                state_id=state.id,
+                chosen_action_references=[action_list[1].name],
+            ).verify_offered(state)
+
+
+class TestStageTransition(unittest.IsolatedAsyncioTestCase):
+    """Test cases for stage transitions known ahead of the turn output."""
+
+    def setUp(self):
+        """Set up a state one turn before the second stage."""
+        self.state = State(
+            id=uuid.uuid4(),
+            parameters=Parameters(
+                career=20, relations=20, health=100, money=20
+            ),
+            history=[],
+            turn_descriptions=["Test"],
+            current_stage=Stage.FIRST,
+            game_turn=settings.stage_two_step - 1,
+            gender=Gender.MALE,
+            name="Test",
+            goal="Test",
+            big_actions=[],
+            small_actions=[],
+            random_event=random_events[0],
+        )
+
+    def test_detect_stage_transition_does_not_modify_state(self):
+        """Test that the next transition is detected without side effects."""
+        transition = detect_stage_transition(
+            self.state, self.state.game_turn + 1
+        )
+
+        self.assertEqual(transition.current_stage, Stage.SECOND)
+        self.assertEqual(transition.completed_stage, Stage.FIRST)
+        self.assertFalse(transition.is_game_finished)
+        self.assertEqual(self.state.current_stage, Stage.FIRST)
+
+    async def test_stage_summary_runs_with_turn_description(self):
+        """Test that narrative generations overlap on a stage transition."""
+        in_flight = max_in_flight = 0
+
+        async def fake_invoke_llm(prompt_type, prompt, state_id=None):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return prompt_type.value
+
+        with patch(
+            "runthroughlinehackathor.state_update.update_state.invoke_llm",
+            fake_invoke_llm,
+        ):
+            await update_state(
+                self.state,
+                StateIncrement(
+                    state_id=self.state.id,
+                    chosen_action_references=[action_list[0].name],
+                ),
+            )
+
+        self.assertEqual(max_in_flight, 2)
+        self.assertEqual(self.state.current_stage, Stage.SECOND)
+        self.assertEqual(self.state.stage_summary, "stage_summary")
+        self.assertEqual(self.state.turn_description, "turn_description")
+
+    async def test_state_is_marked_updating_during_turn(self):
+        """Test that the version changes only once the turn is applied."""
+        observed = []
+
+        async def fake_invoke_llm(prompt_type, prompt, state_id=None):
+            observed.append((self.state.is_updating, self.state.version))
+            return prompt_type.value
+
+        with patch(
+            "runthroughlinehackathor.state_update.update_state.invoke_llm",
+            fake_invoke_llm,
+        ):
+            await update_state(
+                self.state,
+                StateIncrement(
+                    state_id=self.state.id,
+                    chosen_action_references=[action_list[0].name],
+                ),
+            )
+
+        self.assertEqual(set(observed), {(True, 0)})
+        self.assertFalse(self.state.is_updating)
+        self.assertEqual(self.state.version, 1)
+
+    async def test_overloaded_stage_summary_falls_back(self):
+        """Test that an overloaded LLM yields the stage summary fallback."""
+
+        async def fake_invoke_llm(prompt_type, prompt, state_id=None):
+            if prompt_type == PromptType.STAGE_SUMMARY:
+                raise LlmOverloadedError(1)
+            return prompt_type.value
+
+        with patch(
+            "runthroughlinehackathor.state_update.update_state.invoke_llm",
+            fake_invoke_llm,
+        ):
+            await update_state(
+                self.state,
+                StateIncrement(
+                    state_id=self.state.id,
+                    chosen_action_references=[action_list[0].name],
+                ),
+            )
+
+        self.assertEqual(
+            self.state.stage_summary,
+            settings.overloaded_stage_summary_narrative,
+        )
+        self.assertEqual(self.state.turn_description, "turn_description")
+
+    async def test_random_event_is_drawn_for_next_stage(self):
+        """Test that the event after a transition fits the new stage."""
+        with patch(
+            "runthroughlinehackathor.state_update.update_state"
+            ".select_random_event",
+            wraps=select_random_event,
+        ) as select_random_event_mock:
+            await update_state(
+                self.state,
+                StateIncrement(
+                    state_id=self.state.id,
+                    chosen_action_references=[action_list[0].name],
+                ),
+            )
+
+        self.assertEqual(
+            select_random_event_mock.call_args.kwargs["current_stage"],
+            Stage.SECOND,
+        )
+
+    async def test_slow_turn_description_is_composed(self):
+        """Test the narrative library fallback when the LLM is too slow."""
+        self.state.game_turn = 0
+
+        async def slow_invoke_llm(prompt_type, prompt, state_id=None):
+            await asyncio.sleep(1)
+            return prompt_type.value
+
+        with (
+            patch(
+                "runthroughlinehackathor.state_update.update_state.invoke_llm",
+                slow_invoke_llm,
+            ),
+            patch.object(settings, "narrative_llm_timeout_seconds", 0.01),
+        ):
+            await update_state(
+                self.state,
+                StateIncrement(
+                    state_id=self.state.id,
+                    chosen_action_references=[action_list[0].name],
+                ),
+            )
+
+        self.assertIn(action_list[0].description, self.state.turn_description)
+
+
+class TestDeferredNarrative(unittest.IsolatedAsyncioTestCase):
+    """Test cases for narrative generation in the background."""
+
+    async def asyncTearDown(self):
+        """Stop the narrative workers of the test event loop."""
+        await narrative_worker_pool.stop()
+
+    async def test_deferred_narrative_is_filled_in_later(self):
+        """Test that the turn returns before its description is generated."""
+        state = State(
+            id=uuid.uuid4(),
+            parameters=Parameters(
+                career=20, relations=20, health=100, money=20
+            ),
+            history=[],
+            turn_descriptions=["Test"],
+            current_stage=Stage.FIRST,
+            game_turn=settings.stage_two_step - 1,
+            gender=Gender.MALE,
+            name="Test",
+            goal="Test",
+            big_actions=[],
+            small_actions=[],
+            random_event=random_events[0],
+        )
+
+        async def fake_invoke_llm(prompt_type, prompt, state_id=None):
+            await asyncio.sleep(0.01)
+            return prompt_type.value
+
+        with patch(
+            "runthroughlinehackathor.state_update.update_state.invoke_llm",
+            fake_invoke_llm,
+        ):
+            await update_state(
+                state,
+                StateIncrement(
+                    state_id=state.id,
+                    chosen_action_references=[action_list[0].name],
+                ),
+                defer_narrative=True,
+            )
+            self.assertTrue(state.is_narrative_pending)
+            self.assertEqual(state.turn_description, "")
+            self.assertEqual(state.current_stage, Stage.SECOND)
+
+            narrative = await narrative_worker_pool.wait(
+                state.id, state.game_turn, timeout=5
+            )
+
+        self.assertEqual(narrative.status, NarrativeStatus.DONE)
+        self.assertEqual(narrative.turn_description, "turn_description")
+        self.assertEqual(narrative.stage_summary, "stage_summary")
+        self.assertFalse(state.is_narrative_pending)
+        self.assertEqual(state.turn_description, "turn_description")
+        self.assertEqual(state.stage_summary, "stage_summary")
+
+    async def test_loss_narrative_is_stored_under_last_turn(self):
+        """Test that a lost game's narrative is polled at its game turn."""
+        losing_action = next(
+            a for a in action_list if a.parameter_change.money < 0
+        )
+        state = State(
+            id=uuid.uuid4(),
+            parameters=Parameters(
+                career=20, relations=20, health=100, money=0
+            ),
+            history=[],
+            turn_descriptions=["Test"],
+            current_stage=Stage.FIRST,
+            game_turn=1,
+            gender=Gender.MALE,
+            name="Test",
+            goal="Test",
+            big_actions=[],
+            small_actions=[],
+            random_event=random_events[0],
+        )
+
+        async def fake_invoke_llm(prompt_type, prompt, state_id=None):
+            await asyncio.sleep(0.01)
+            return prompt_type.value
+
+        with patch(
+            "runthroughlinehackathor.state_update.update_state.invoke_llm",
+            fake_invoke_llm,
+        ):
+            await update_state(
+                state,
+                StateIncrement(
+                    state_id=state.id,
+                    chosen_action_references=[losing_action.name],
+                ),
+                defer_narrative=True,
+            )
+            self.assertTrue(state.is_game_finished)
+            self.assertTrue(state.is_narrative_pending)
+
+            narrative = await narrative_worker_pool.wait(
+                state.id, state.game_turn, timeout=5
+            )
+
+        self.assertEqual(narrative.game_turn, 1)
+        self.assertEqual(narrative.status, NarrativeStatus.DONE)
+        self.assertEqual(narrative.stage_summary, "game_loss")
+        self.assertFalse(state.is_narrative_pending)
+
+    async def test_later_job_of_same_turn_extends_narrative(self):
+        """Test that a second job of the latest turn runs after the first."""
+        state_id = uuid.uuid4()
+        has_later_jobs = []
+
+        async def describe(narrative):
+            await asyncio.sleep(0.01)
+            has_later_jobs.append(
+                narrative_worker_pool.has_later_jobs(state_id)
+            )
+            narrative.turn_description = "turn"
+
+        async def summarize(narrative):
+            has_later_jobs.append(
+                narrative_worker_pool.has_later_jobs(state_id)
+            )
+            narrative.stage_summary = "loss"
+
+        await narrative_worker_pool.submit(state_id, 1, describe)
+        await narrative_worker_pool.submit(state_id, 1, summarize)
+        narrative = await narrative_worker_pool.wait(state_id, 1, timeout=5)
+
+        self.assertEqual(narrative.status, NarrativeStatus.DONE)
+        self.assertEqual(narrative.turn_description, "turn")
+        self.assertEqual(narrative.stage_summary, "loss")
+        self.assertEqual(has_later_jobs, [True, False])
+
+    async def test_only_latest_turn_is_kept(self):
+        """Test that generated narratives of earlier turns are evicted."""
+        state_id = uuid.uuid4()
+
+        async def generate(narrative):
+            narrative.turn_description = str(narrative.game_turn)
+
+        for game_turn in range(1, 4):
+            await narrative_worker_pool.submit(state_id, game_turn, generate)
+            await narrative_worker_pool.drain()
+
+        self.assertEqual(
+            [
+                key
+                for key in narrative_worker_pool.narratives
+                if key[0] == state_id
+            ],
+            [(state_id, 3)],
+        )
+        self.assertIsNone(
+            await narrative_worker_pool.wait(state_id, 2, timeout=0)
+        )
+        narrative = await narrative_worker_pool.wait(state_id, None, timeout=0)
+        self.assertEqual(narrative.turn_description, "3")
+
+
+class TestNarrativeMemory(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the rolling narrative memory."""
+
+    def setUp(self):
+        """Set up a long game and a memory of 100 tokens."""
+        self.state = State(
+            id=uuid.uuid4(),
+            parameters=Parameters(
+                career=20, relations=20, health=100, money=20
+            ),
+            history=[],
+            turn_descriptions=[
+                "Intro",
+                *(f"Turn {i} " + 1000 * "x" for i in range(1, 10)),
+            ],
+            current_stage=Stage.FIRST,
+            game_turn=9,
+            gender=Gender.MALE,
+            name="Test",
+            goal="Test",
+            big_actions=[],
+            small_actions=[],
+            random_event=random_events[0],
+        )
+        self.memory = NarrativeMemory(token_budget=100, characters_per_token=4)
+
+    def test_context_keeps_last_turn_within_budget(self):
+        """Test that the context is bounded and ends with the last turn."""
+        context = self.memory.context(self.state, turn_index=10)
+
+        self.assertLessEqual(len(context), 400)
+        self.assertTrue(self.state.turn_descriptions[9].endswith(context))
+
+    async def test_summary_replaces_older_turns(self):
+        """Test that summarized turns are replaced by their summary."""
+
+        async def fake_invoke_llm(prompt_type, prompt, state_id=None):
+            return "Summary"
+
+        with patch(
+            "runthroughlinehackathor.state_update.narrative_memory.invoke_llm",
+            fake_invoke_llm,
+        ):
+            self.memory.schedule_update(self.state, turn_index=9)
+            await asyncio.sleep(0)
+
+        self.state.turn_descriptions[9] = "Turn 9"
+        self.assertEqual(
+            self.memory.context(self.state, turn_index=10),
+            "Summary\n\nTurn 9",
+        )
+
+    async def test_finished_game_is_forgotten(self):
+        """Test that forget drops the summary and cancels its update."""
+
+        async def fake_invoke_llm(prompt_type, prompt, state_id=None):
+            return "Summary"
+
+        with patch(
+            "runthroughlinehackathor.state_update.narrative_memory.invoke_llm",
+            fake_invoke_llm,
+        ):
+            self.memory.schedule_update(self.state, turn_index=5)
+            await asyncio.sleep(0)
+            self.memory.schedule_update(self.state, turn_index=9)
+            self.memory.forget(self.state.id)
+            await asyncio.sleep(0)
+
+        self.assertEqual(self.memory.memories, {})
+        self.state.is_game_finished = True
+        self.memory.schedule_update(self.state, turn_index=9)
+        self.assertEqual(self.memory._updates, {})
+
+
+class TestHistoryTimeline(unittest.TestCase):
+    """Test cases for the compact history timeline of prompts."""
+
+    def setUp(self):
+        """Set up a history of three turns."""
+        self.history = []
+        for random_event, action in zip(random_events[:3], action_list):
+            self.history += [
+                random_event,
+                random_event.reactions[0],
+                action,
+                action,
+            ]
+
+    def test_one_line_per_turn(self):
+        """Test turn lines with counted actions and summed changes."""
+        lines = history_timeline(self.history).splitlines()
+
+        self.assertEqual(len(lines), 3)
+        random_event = random_events[0]
+        self.assertTrue(lines[0].startswith("Tura 1: "))
+        self.assertIn(random_event.name, lines[0])
+        self.assertIn(random_event.reactions[0].description, lines[0])
+        self.assertIn(f"{action_list[0].name} ×2", lines[0])
+        self.assertNotIn("image_url", lines[0])
+        career_change = (
+            random_event.reactions[0].parameter_change.career
+            + 2 * action_list[0].parameter_change.career
+        )
+        if career_change:
+            self.assertIn(f"kariera {career_change:+d}", lines[0])
+
+    def test_oldest_turns_are_left_out_over_budget(self):
+        """Test that the timeline keeps the latest turns within budget."""
+        last_line = history_timeline(self.history).splitlines()[-1]
+
+        with patch.object(
+            settings,
+            "prompt_history_token_budget",
+            (len(last_line) + 1) / settings.characters_per_token,
+        ):
+            timeline = history_timeline(self.history, first_turn=5)
+
+        self.assertEqual(
+            timeline.splitlines(),
+            [
+                "(2 wcześniejszych tur pominięto)",
+                last_line.replace("Tura 3", "Tura 7"),
+            ],
+        )
+
+
+class TestBatchApplyTurn(unittest.TestCase):
+    """Test cases for the vectorized batch_apply_turn."""
+
+    def test_batch_matches_scalar_path(self):
+        """Test that every game ends like with the scalar turn rules."""
+        rng = random.Random(0)
+        states = [
+            State(
+                id=uuid.uuid4(),
+                parameters=Parameters(
+                    **{
+                        name: rng.randint(0, settings.MAX_PARAMETER_VALUE)
+                        for name in ("career", "relations", "health", "money")
+                    }
+                ),
+                history=[],
+                turn_descriptions=["Test"],
+                current_stage=Stage.FIRST,
+                game_turn=0,
+                gender=Gender.MALE,
+                name="Test",
+                goal="Test",
+                big_actions=[],
+                small_actions=[],
+                random_event=random_events[0],
+                is_game_finished=rng.random() < 0.1,
+            )
+            for _ in range(200)
+        ]
+        references_per_game = [
+            [rng.choice(list(reactions))]
+            + [a.name for a in rng.sample(action_list, rng.randint(0, 6))]
+            for _ in states
+        ]
+        batch_state = BatchState.from_states(states)
+
+        batch_apply_turn(
+            batch_state, load_catalog_matrix().encode(references_per_game)
+        )
+
+        for game, (state, references) in enumerate(
+            zip(states, references_per_game)
+        ):
+            if not state.is_game_finished:
+                spent_time = apply_chosen_actions(
+                    state,
+                    StateIncrement(
+                        state_id=state.id,
+                        chosen_action_references=references,
+                    ).chosen_actions,
+                )
+                if is_game_lost(state):
+                    state.is_game_finished = True
+                    state.did_user_win = False
+                else:
+                    regenerate_parameters(state, spent_time)
+            self.assertEqual(
+                batch_state.get_parameters(game), state.parameters
+            )
+            self.assertEqual(
+                batch_state.is_game_finished[game], state.is_game_finished
+            )
+            self.assertEqual(
+                batch_state.did_user_win[game], state.did_user_win
+            )
+
 
 if __name__ == "__main__":
     unittest.main()